@@ -697,6 +697,75 @@ def _read_int_csv(path: str) -> List[int]:
         return []
 
 
+# 不稳定边检测结果（由 ChiloMutatorFactory.edge_stability 写入）
+INSTABILITY_FILE_NAME = 'instability.json'
+
+# 二进制位图文件（由 ChiloMutatorFactory.bitmap_store 写入），头部之后依次为 sum/cumulative/bool/bucket 四个数组
+BITMAP_BIN_NAME = 'bitmap.bin'
+BITMAP_BIN_MAGIC = b'CHILOBMP'
+BITMAP_BIN_HEADER = '<8sHHIQd'
+BITMAP_BIN_CHANNELS = (('sum', 'Q'), ('cumulative', 'I'), ('bool', 'B'), ('bucket', 'B'))
+
+
+def _read_bitmap_bin(path: str) -> Union[Dict[str, object], None]:
+    """以 mmap 方式读取二进制位图文件，返回 {'map_size', 'hit_count', 'timestamp', 'channels'}。
+    文件不存在或格式不对时返回 None，由调用方回退到文本文件。"""
+    import mmap
+    import struct
+    try:
+        if not path or not os.path.exists(path):
+            return None
+        header_size = struct.calcsize(BITMAP_BIN_HEADER)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, _, map_size, hit_count, timestamp = struct.unpack_from(BITMAP_BIN_HEADER, mm, 0)
+            if magic != BITMAP_BIN_MAGIC or version < 1:   # 新版本只在末尾追加数组，前四个数组的布局不变
+                return None
+            channels: Dict[str, List[int]] = {}
+            offset = header_size
+            view = memoryview(mm)
+            try:
+                for name, fmt in BITMAP_BIN_CHANNELS:
+                    nbytes = struct.calcsize(fmt) * map_size
+                    part = view[offset:offset + nbytes]
+                    channels[name] = part.cast(fmt).tolist()
+                    part.release()
+                    offset += nbytes
+            finally:
+                view.release()
+        return {'map_size': map_size, 'hit_count': hit_count, 'timestamp': timestamp, 'channels': channels}
+    except Exception:
+        return None
+
+
+def _bitmap_bin_preferred(base: str, channels: Tuple[str, ...] = ('sum', 'cumulative', 'bool')) -> bool:
+    """bitmap.bin 与旧版 txt 文件同时存在时（例如切换过 BITMAP_FORMAT）按修改时间选较新的一方。
+    只有 bitmap.bin 时返回 True，没有 bitmap.bin 时返回 False。位图帧与下载接口共用这一规则。"""
+    try:
+        bin_mtime = os.path.getmtime(os.path.join(base, BITMAP_BIN_NAME))
+    except OSError:
+        return False
+    txt_mtimes = []
+    for which in channels:
+        try:
+            txt_mtimes.append(os.path.getmtime(os.path.join(base, f'{which}.txt')))
+        except OSError:
+            pass
+    return not txt_mtimes or bin_mtime >= max(txt_mtimes)
+
+
+def _bitmap_text_bytes(base: str, which: str) -> Union[bytes, None]:
+    """返回某个通道的旧版逗号分隔文本：bitmap.bin 较新时由它即时转换，否则使用 txt 文件。"""
+    if _bitmap_bin_preferred(base, (which,)):
+        data = _read_bitmap_bin(os.path.join(base, BITMAP_BIN_NAME))
+        if data is not None:
+            return (','.join(map(str, data['channels'][which])) + '\n').encode('utf-8')
+    txt_path = os.path.join(base, f'{which}.txt')
+    if not os.path.exists(txt_path):
+        return None
+    with open(txt_path, 'rb') as f:
+        return f.read()
+
+
 def _best_grid(n: int) -> Tuple[int, int]:
     """为长度 n 的一维数组选择接近正方形的网格 (rows, cols)。"""
     if n <= 0:
@@ -740,13 +809,21 @@ def api_bitmap_frame():
                 'bool': [],
             }
         }), 200
-    sum_path = os.path.join(base, 'sum.txt')
-    cum_path = os.path.join(base, 'cumulative.txt')
-    bool_path = os.path.join(base, 'bool.txt')
+    bin_data = _read_bitmap_bin(os.path.join(base, BITMAP_BIN_NAME)) if _bitmap_bin_preferred(base) else None
+    if bin_data is not None:
+        # 新版二进制文件：三个通道来自同一个文件
+        sum_path = cum_path = bool_path = os.path.join(base, BITMAP_BIN_NAME)
+        sum_arr = bin_data['channels']['sum']
+        cum_arr = bin_data['channels']['cumulative']
+        bool_arr = bin_data['channels']['bool']
+    else:
+        sum_path = os.path.join(base, 'sum.txt')
+        cum_path = os.path.join(base, 'cumulative.txt')
+        bool_path = os.path.join(base, 'bool.txt')
 
-    sum_arr = _read_int_csv(sum_path)
-    cum_arr = _read_int_csv(cum_path)
-    bool_arr = _read_int_csv(bool_path)
+        sum_arr = _read_int_csv(sum_path)
+        cum_arr = _read_int_csv(cum_path)
+        bool_arr = _read_int_csv(bool_path)
 
     map_size = max(len(sum_arr), len(cum_arr), len(bool_arr))
     rows, cols = _best_grid(map_size)
@@ -774,6 +851,23 @@ def api_bitmap_frame():
     return resp
 
 
+@app.route('/api/bitmap/instability')
+def api_bitmap_instability():
+    """返回不稳定边检测结果（instability.json，FLAKY.ENABLE 开启时由 fuzzer 写入）。"""
+    base = _load_bitmap_dir()
+    path = os.path.join(base, INSTABILITY_FILE_NAME) if base else ''
+    if not path or not os.path.exists(path):
+        return jsonify({'ok': False, 'error': 'instability.json 不存在（未开启不稳定边检测）'}), 200
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        return jsonify({'ok': False, 'error': f'读取 instability.json 失败：{e}'}), 200
+    data['ok'] = True
+    data['mtime'] = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc).isoformat()
+    return jsonify(data)
+
+
 @app.route('/api/download/bitmap')
 def download_bitmap_single():
     """下载单个 bitmap 文件（sum|cumulative|bool）。"""
@@ -783,31 +877,33 @@ def download_bitmap_single():
     base = _load_bitmap_dir()
     if not base:
         return abort(404, description='bitmap 目录不存在')
-    path = os.path.join(base, f'{which}.txt')
-    if not os.path.exists(path):
+    data = _bitmap_text_bytes(base, which)
+    if data is None:
         return abort(404, description=f'{which}.txt 不存在')
-    return send_file(path, as_attachment=True, download_name=f'{which}.txt')
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=f'{which}.txt')
 
 
 @app.route('/api/download/bitmap/all')
 def download_bitmap_all():
-    """打包下载三种 bitmap 文本为 zip。"""
+    """打包下载三种 bitmap 文本（以及存在时的 bitmap.bin）为 zip。"""
     import zipfile
     base = _load_bitmap_dir()
     if not base:
         return abort(404, description='bitmap 目录不存在')
-    files = [('sum.txt', 'sum.txt'), ('cumulative.txt', 'cumulative.txt'), ('bool.txt', 'bool.txt')]
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for fname, arc in files:
-            p = os.path.join(base, fname)
-            if os.path.exists(p):
-                try:
-                    zf.write(p, arcname=arc)
-                except Exception:
-                    zf.writestr(arc, '')
-            else:
+        for which in ('sum', 'cumulative', 'bool'):
+            arc = f'{which}.txt'
+            try:
+                zf.writestr(arc, _bitmap_text_bytes(base, which) or '')
+            except Exception:
                 zf.writestr(arc, '')
+        bin_path = os.path.join(base, BITMAP_BIN_NAME)
+        if os.path.exists(bin_path):
+            try:
+                zf.write(bin_path, arcname=BITMAP_BIN_NAME)
+            except Exception:
+                pass
     buf.seek(0)
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
     return send_file(buf, as_attachment=True, download_name=f'bitmap_{ts}.zip')
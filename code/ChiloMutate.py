@@ -1,6 +1,10 @@
 import time
+import hashlib
 
 from ChiloMutatorFactory import chilo_factory as cf
+from ChiloMutatorFactory import logger
+from ChiloMutatorFactory import ChiloBitMap
+from ChiloMutatorFactory import queue_feedback
 import threading
 from ChiloMutatorFactory import LLMParser,LLMMutatorGenerater,LLMStructuralMutator,mutator_fixer
 import random as rnd
@@ -12,6 +16,12 @@ last_bitmap_save = time.time()
 is_chilo_fuzzed = False     #避免每次运行都postrun 只chilo的postrun就行了
 left_fuzz_count = 0
 structural_consecutive_count = 0
+pending_main_csv_row = None     #fuzz()中生成的主CSV行，等post_run得到新增边数后再写入
+last_fuzz_output = None     #上一次fuzz()返回的测试用例，用于校准执行（检测不稳定边）
+is_calibration_exec = False     #本次执行是否为校准执行（原样重放上一个测试用例）
+calibration_pending = False     #fuzz_count 为校准执行多分配了一次执行，由批次的第一次 fuzz() 完成
+last_calibration_number = 0     #上一次校准执行的 fuzz_number
+current_queue_filename = None   #queue_get 刚刚放行的队列条目路径，由随后的 fuzz_count 登记其种子编号
 
 def init(seed):
     """
@@ -83,55 +93,55 @@ def fuzz_count(buf):
     global fuzz_count_number
     global left_fuzz_count
     global structural_consecutive_count
+    global current_queue_filename
     fuzz_count_number += 1
     #应该采用队列的设计，先放入工厂的队列中，等待加工
     global chilo_factory
+    if chilo_factory.batch_settle_pending:
+        settle_thompson_batch()
     mutate_time = chilo_factory.fuzz_count_time
-    chilo_factory.main_logger.info("进入fuzz_count~")
-    chilo_factory.main_logger.info("准备将buf中种子加入到待解析队列中~")
-    chilo_factory.add_one_seed_to_parse_list(buf, mutate_time)
-    chilo_factory.main_logger.info("该种子fuzz_count处理完成")
+    chilo_factory.main_logger.info("进入fuzz_count~", extra=logger.HOT)
+    chilo_factory.main_logger.info("准备将buf中种子加入到待解析队列中~", extra=logger.HOT)
+    seed_id = chilo_factory.add_one_seed_to_parse_list(buf, mutate_time)
+    if chilo_factory.seed_saturation is not None and current_queue_filename is not None:
+        chilo_factory.seed_saturation.bind(current_queue_filename, seed_id)   #之后 queue_get 按文件名直接查到种子
+        current_queue_filename = None
+    chilo_factory.main_logger.info("该种子fuzz_count处理完成", extra=logger.HOT)
     # 优先：如果有结构化变异待执行，则直接返回1
-    q_struct = chilo_factory.wait_exec_structural_list
-    with q_struct.mutex:
-        if len(q_struct.queue) > 0:
-            limit = chilo_factory.structural_consecutive_limit
-            if limit > 0 and structural_consecutive_count >= limit:
-                q = chilo_factory.wait_exec_mutator_list
-                with q.mutex:
-                    has_wait_exec = len(q.queue) > 0
-                has_pool = len(chilo_factory.mutator_pool.mutator_list) > 0
-                if has_wait_exec or has_pool:
-                    chilo_factory.main_logger.info(
-                        f"结构化变异已连续选择{structural_consecutive_count}次，且其他策略可用，跳过本次结构化")
-                    # 继续走后续逻辑选择其他策略
-                    pass
-                else:
-                    chilo_factory.next_fuzz_strategy = 0
-                    chilo_factory.main_logger.info("有结构化变异待执行，将执行结构化变异，变异次数1")
-                    left_fuzz_count = 1
-                    structural_consecutive_count += 1
-                    chilo_factory.current_thompson_score = -1
-                    chilo_factory.current_Ai = -1
-                    chilo_factory.current_Bi = -1
-                    chilo_factory.current_Ci = -1
-                    return 1
+    if not chilo_factory.wait_exec_structural_list.empty():
+        limit = chilo_factory.structural_consecutive_limit
+        if limit > 0 and structural_consecutive_count >= limit:
+            has_wait_exec = not chilo_factory.wait_exec_mutator_list.empty()
+            has_pool = len(chilo_factory.mutator_pool.mutator_list) > 0
+            if has_wait_exec or has_pool:
+                chilo_factory.main_logger.info("结构化变异已连续选择%s次，且其他策略可用，跳过本次结构化",
+                                               structural_consecutive_count, extra=logger.HOT)
+                # 继续走后续逻辑选择其他策略
+                pass
             else:
                 chilo_factory.next_fuzz_strategy = 0
-                chilo_factory.main_logger.info("有结构化变异待执行，将执行结构化变异，变异次数1")
-                left_fuzz_count = 1
+                chilo_factory.main_logger.info("有结构化变异待执行，将执行结构化变异，变异次数1", extra=logger.HOT)
                 structural_consecutive_count += 1
                 chilo_factory.current_thompson_score = -1
                 chilo_factory.current_Ai = -1
                 chilo_factory.current_Bi = -1
                 chilo_factory.current_Ci = -1
-                return 1
+                chilo_factory.current_seed_sample = ""
+                return schedule_calibration(1)
+        else:
+            chilo_factory.next_fuzz_strategy = 0
+            chilo_factory.main_logger.info("有结构化变异待执行，将执行结构化变异，变异次数1", extra=logger.HOT)
+            structural_consecutive_count += 1
+            chilo_factory.current_thompson_score = -1
+            chilo_factory.current_Ai = -1
+            chilo_factory.current_Bi = -1
+            chilo_factory.current_Ci = -1
+            chilo_factory.current_seed_sample = ""
+            return schedule_calibration(1)
 
-    # 否则：根据 wait_exec_mutator_list 前缀中连续同一对象实例的个数返回
-    q = chilo_factory.wait_exec_mutator_list
-    with q.mutex:
-        internal = list(q.queue)  # 拷贝当前快照
-    if not internal:
+    # 否则：根据 wait_exec_mutator_list 队首游程的剩余次数返回
+    first_item, consecutive = chilo_factory.wait_exec_mutator_list.peek_run()
+    if first_item is None:
         #到这里判断，变异器池是否为空，如果为空，说明是模糊测试刚启动的状态，则默认先用待执行队列，让fuzz mutate_once去等待待执行队列去
         if len(chilo_factory.mutator_pool.mutator_list) > 0:
             #说明并非刚启动，变异器池已经有东西了
@@ -140,65 +150,116 @@ def fuzz_count(buf):
             if chilo_factory.enable_energy_schedule:
                 # 启用能量调度：使用汤普森采样选择变异器
                 with chilo_factory.mutator_pool_lock:
-                    mutator, score, Ai, Bi, Ci = chilo_factory.mutator_pool.thompson_select_mutator()
+                    mutator, score, Ai, Bi, Ci, seed_sample = chilo_factory.mutator_pool.thompson_select_mutator()
+                if mutator is None:
+                    #变异器池中的变异器都已被隔离，等待新的变异器
+                    chilo_factory.main_logger.warning("变异器池中没有可用的变异器，AFL++暂时跳过")
+                    chilo_factory.next_fuzz_strategy = 0
+                    left_fuzz_count = 0
+                    return 0
                 
                 chilo_factory.mutator_pool.total_select_count += 1 # 增加总选择次数
-                chilo_factory.current_thompson_mutator = mutator
+                chilo_factory.begin_thompson_batch(mutator, fuzz_number + 1) # 记下选中的变异器并重置批次计数
                 chilo_factory.current_thompson_score = score
                 chilo_factory.current_Ai = Ai
                 chilo_factory.current_Bi = Bi
                 chilo_factory.current_Ci = Ci
-                chilo_factory.current_batch_new_edges = 0 # 重置当前批次的新边计数
+                chilo_factory.current_seed_sample = "" if seed_sample is None else seed_sample
                 
                 # 能量调度：基于得分计算能量
                 energy = min(max(int(score * chilo_factory.energy_exchange_rate), chilo_factory.min_energy), chilo_factory.max_energy)
                 
-                chilo_factory.main_logger.info(f"[能量调度] 汤普森采样选中变异器: {mutator.mutator_id}, 得分: {score:.4f}, 能量: {energy}")
+                chilo_factory.main_logger.info("[能量调度] 汤普森采样选中变异器: %s, 得分: %.4f, 能量: %s",
+                                               mutator.mutator_id, score, energy, extra=logger.HOT)
             else:
                 # 禁用能量调度：随机选择变异器，随机能量
                 with chilo_factory.mutator_pool_lock:
                     mutator = chilo_factory.mutator_pool.random_select_mutator()
+                if mutator is None:
+                    chilo_factory.main_logger.warning("变异器池中没有可用的变异器，AFL++暂时跳过")
+                    chilo_factory.next_fuzz_strategy = 0
+                    left_fuzz_count = 0
+                    return 0
                 
                 chilo_factory.mutator_pool.total_select_count += 1 # 增加总选择次数
-                chilo_factory.current_thompson_mutator = mutator
+                chilo_factory.begin_thompson_batch(mutator, fuzz_number + 1) # 记下选中的变异器并重置批次计数
                 chilo_factory.current_thompson_score = 0.0  # 随机模式无得分
                 chilo_factory.current_Ai = 0.0
                 chilo_factory.current_Bi = 0.0
                 chilo_factory.current_Ci = 0.0
-                chilo_factory.current_batch_new_edges = 0 # 重置当前批次的新边计数
+                chilo_factory.current_seed_sample = ""
                 
                 # 随机能量
                 energy = rnd.randint(chilo_factory.random_energy_min, chilo_factory.random_energy_max)
                 
-                chilo_factory.main_logger.info(f"[随机选择] 随机选中变异器: {mutator.mutator_id}, 随机能量: {energy}")
+                chilo_factory.main_logger.info("[随机选择] 随机选中变异器: %s, 随机能量: %s",
+                                               mutator.mutator_id, energy, extra=logger.HOT)
             
-            chilo_factory.main_logger.info(f"无待第一次执行的变异器，将执行变异器池选择，变异次数{energy}")
+            chilo_factory.main_logger.info("无待第一次执行的变异器，将执行变异器池选择，变异次数%s", energy, extra=logger.HOT)
             
             #注意，这里就不能再返回mutatetime了，而是在这里确定变异次数和能量调度
-            left_fuzz_count = energy
+            chilo_factory.prefetch_mutator(mutator, energy)   #后台按能量预渲染该变异器的测试用例
             structural_consecutive_count = 0
             #这里我在想要不要
-            return energy
+            return schedule_calibration(energy)
         else:
             #说明刚启动，需要让mutate_once等一等
             chilo_factory.next_fuzz_strategy = 0
             if chilo_factory.parser_thread_count > 0:
-                chilo_factory.main_logger.info("chilo刚启动，再等一等")
+                chilo_factory.main_logger.info("chilo刚启动，再等一等", extra=logger.HOT)
             left_fuzz_count = 0
             structural_consecutive_count = 0
             return 0    #AFL++暂时跳过，等待一下... 
-    first_item = internal[0]
-    consecutive = 1
-    for item in internal[1:]:
-        if item is first_item:
-            consecutive += 1
-        else:
-            break
     chilo_factory.next_fuzz_strategy = 1
-    chilo_factory.main_logger.info("无结构化，有待第一次执行的变异器，将执行待执行变异器，变异次数{consecutive}")
-    left_fuzz_count = consecutive
+    chilo_factory.main_logger.info("无结构化，有待第一次执行的变异器，将执行待执行变异器，变异次数%s",
+                                   consecutive, extra=logger.HOT)
     structural_consecutive_count = 0
-    return consecutive    #这里就是待执行变异器，需要返回连续的个数
+    chilo_factory.prefetch_mutator(first_item, consecutive)   #后台预渲染待执行变异器的测试用例
+    return schedule_calibration(consecutive)    #这里就是待执行变异器，需要返回连续的个数
+
+def is_calibration_due():
+    """
+    距离上一次校准执行是否已经过了 FLAKY.CALIBRATION_INTERVAL 次执行
+    批次最后一次执行的 post_run 与随后的 fuzz_count 之间 fuzz_number 不变，两处的判断结果一致
+    :return: 下一个批次开始时是否需要校准执行
+    """
+    return (chilo_factory.edge_stability is not None and last_fuzz_output is not None
+            and chilo_factory.calibration_interval > 0
+            and fuzz_number - last_calibration_number >= chilo_factory.calibration_interval)
+
+def schedule_calibration(energy):
+    """
+    确定本批次的执行次数：需要校准时在 energy 之外多分配一次执行，由批次的第一次 fuzz() 重放上一个测试用例，
+    变异器仍然得到 energy 次渲染
+    :param energy: 分配给本批次变异策略的执行次数
+    :return: 返回给 AFL++ 的执行次数
+    """
+    global left_fuzz_count
+    global calibration_pending
+    calibration_pending = is_calibration_due()
+    if calibration_pending:
+        energy += 1
+    left_fuzz_count = energy
+    return energy
+
+def settle_thompson_batch():
+    """
+    结算当前汤普森采样批次
+    bitmap 反馈模式在批次最后一次执行的 post_run 中调用；queue 模式等最后一次执行的条目到达后，在下一次 fuzz_count 中调用
+    :return: 无返回值
+    """
+    chilo_factory.batch_settle_pending = False
+    is_success = chilo_factory.is_batch_success()
+    chilo_factory.settle_mutator_batch(chilo_factory.current_thompson_mutator, is_success,
+                                       chilo_factory.current_batch_reward)
+    if chilo_factory.feedback_mode == 'bitmap':
+        found_label, found = "新边", chilo_factory.current_batch_found_edges
+    else:
+        found_label, found = "新条目", chilo_factory.current_batch_new_entries
+    chilo_factory.main_logger.info("汤普森采样批次结束. 变异器: %s, 本批次奖励: %s, %s: %s, 结果: %s",
+                                   chilo_factory.current_thompson_mutator.mutator_id,
+                                   chilo_factory.current_batch_reward, found_label, found,
+                                   '成功' if is_success else '失败', extra=logger.HOT)
 
 def splice_optout():
     """
@@ -222,8 +283,28 @@ def fuzz(buf, add_buf, max_size):
     global fuzz_count_number
     global is_chilo_fuzzed
     global left_fuzz_count
+    global pending_main_csv_row
+    global last_fuzz_output
+    global is_calibration_exec
+    global calibration_pending
+    global last_calibration_number
     fuzz_number += 1
     is_cut = False
+    edge_stability = chilo_factory.edge_stability
+    is_calibration_exec = calibration_pending
+    calibration_pending = False
+    if is_calibration_exec:
+        #校准执行：原样重放上一个测试用例，两次命中的边不同则说明存在不稳定边，本次不计入任何变异器的奖励
+        #这次执行是 fuzz_count 在能量之外额外分配的，不占用变异器的执行次数
+        chilo_factory.main_logger.info("校准执行，重放上一个测试用例", extra=logger.HOT)
+        last_calibration_number = fuzz_number
+        chilo_factory.current_exec_seed_id, chilo_factory.current_exec_mutator_index = -1, -1
+        if pending_main_csv_row is not None:
+            chilo_factory.write_main_csv(*pending_main_csv_row, new_edges="")
+            pending_main_csv_row = None
+        is_chilo_fuzzed = True
+        left_fuzz_count -= 1
+        return last_fuzz_output
     #思路：
     #其实整个变异的返回值的获取，就是读文件，将文件内容作为返回值即可
     #这里应该启用一次LLM生成的程序，并将程序生成的SQL测试用例作为返回值，这样可以不用记录次数...
@@ -235,10 +316,10 @@ def fuzz(buf, add_buf, max_size):
     #下一步呢，其实变异阶段有两部分，分别是掩码解析和掩码变异... 到这里已经完成了解析，直接变异就好
 
     #这里应该只需要做一件事就行，那就是启动LLM生成的变异程序，并获得一个SQL！
-    chilo_factory.main_logger.info("进入fuzz阶段~")
-    chilo_factory.main_logger.info("准备调用mutator生成")
+    chilo_factory.main_logger.info("进入fuzz阶段~", extra=logger.HOT)
+    chilo_factory.main_logger.info("准备调用mutator生成", extra=logger.HOT)
     mutated_out,is_random, seed_id, mutator_id, is_error_occur, is_from_structural_mutator = chilo_factory.mutate_once()
-    chilo_factory.main_logger.info("变异完成")
+    chilo_factory.main_logger.info("变异完成", extra=logger.HOT)
     # 确保类型正确
     if isinstance(mutated_out, str):
         mutated_out = bytearray(mutated_out, "utf-8", errors="ignore")
@@ -255,12 +336,19 @@ def fuzz(buf, add_buf, max_size):
 
     fuzz_end_time = time.time()
     queue_size = chilo_factory.wait_exec_mutator_list.qsize()
-    chilo_factory.write_main_csv(fuzz_end_time, fuzz_count_number, fuzz_number,
-                                 is_random, fuzz_end_time - fuzz_start_time, now_seed_id, seed_id, mutator_id,
-                                 queue_size, ori_mutate_out_size,
-                                 real_mutate_out_size, is_cut, is_error_occur, is_from_structural_mutator,
-                                 chilo_factory.current_thompson_score, left_fuzz_count,
-                                 chilo_factory.current_Ai, chilo_factory.current_Bi, chilo_factory.current_Ci)
+    if pending_main_csv_row is not None:
+        #上一个测试用例没有经过post_run，新增边数未知
+        chilo_factory.write_main_csv(*pending_main_csv_row, new_edges="")
+    pending_main_csv_row = (fuzz_end_time, fuzz_count_number, fuzz_number,
+                            is_random, fuzz_end_time - fuzz_start_time, now_seed_id, seed_id, mutator_id,
+                            queue_size, ori_mutate_out_size,
+                            real_mutate_out_size, is_cut, is_error_occur, is_from_structural_mutator,
+                            chilo_factory.current_thompson_score, left_fuzz_count,
+                            chilo_factory.current_Ai, chilo_factory.current_Bi, chilo_factory.current_Ci,
+                            chilo_factory.current_seed_sample)
+    if edge_stability is not None:
+        chilo_factory.current_exec_digest = hashlib.blake2b(mutated_out, digest_size=8).digest()
+        last_fuzz_output = mutated_out
     is_chilo_fuzzed = True
     left_fuzz_count -= 1
     return mutated_out
@@ -274,7 +362,10 @@ def post_run():
     global chilo_factory
     global last_bitmap_save
     global fuzz_count_number
+    global fuzz_number
     global is_chilo_fuzzed
+    global pending_main_csv_row
+    global is_calibration_exec
 
     if fuzz_count_number == 0:
         #dry run阶段，跳过postrun
@@ -283,41 +374,105 @@ def post_run():
         #chilo_fuzzed为False 说明刚刚的fuzz run都不是chilo的，应该跳过
         pass
     else:
-        #读取刚刚的fuzz的测试用例的边覆盖位图情况
-        now_bitmap = chilo_factory.coverage_reader.get_coverage_bitmap()    #当前的bitmap
-        new_edges = chilo_factory.bitmap.add_bitmap(now_bitmap)
-        chilo_factory.main_logger.info(f"新增边数量：{new_edges}")
+        #读取刚刚的fuzz的测试用例的边覆盖位图情况（queue 反馈模式下只在抽样的执行中读取）
+        #校准执行和被它重放的那次执行（批次的最后一次执行，且下一个批次需要校准）都要合并位图才能比较
+        is_scanned = chilo_factory.should_scan_trace(
+            fuzz_number, is_calibration_exec or (left_fuzz_count == 0 and is_calibration_due()))
+        #只扫描一次位图：求出的非零下标既用来判断是否命中了边，也直接交给 add_bitmap 合并
+        indices = chilo_factory.coverage_reader.nonzero_indices() if is_scanned else None
+        if not is_scanned:
+            delta = None
+        elif indices.size:
+            now_bitmap = chilo_factory.coverage_reader.get_coverage_bitmap()    #当前的bitmap（常驻的只读视图）
+            strategy = ChiloBitMap.STRATEGY_UNKNOWN if is_calibration_exec else chilo_factory.next_fuzz_strategy
+            delta = chilo_factory.bitmap.add_bitmap(now_bitmap, fuzz_number, chilo_factory.current_exec_seed_id,
+                                                    chilo_factory.current_exec_mutator_index, strategy, indices)
+            if chilo_factory.edge_stability is not None:
+                #同一个测试用例再次执行时比较两次命中的边，翻转的边标记为不稳定
+                newly_unstable = chilo_factory.edge_stability.observe(chilo_factory.current_exec_digest,
+                                                                      chilo_factory.bitmap.last_indices)
+                if newly_unstable:
+                    chilo_factory.main_logger.info("新标记不稳定边：%s，共%s条", newly_unstable,
+                                                   chilo_factory.edge_stability.unstable_count())
+        else:
+            delta = ChiloBitMap.CoverageDelta(0, 0, 0)   #本次执行没有命中任何边（例如目标提前退出），无需合并
+        if delta is not None:
+            chilo_factory.main_logger.info("新增边数量：%s，新增命中次数桶：%s", delta.new_edges, delta.new_buckets,
+                                           extra=logger.HOT)
+        if pending_main_csv_row is not None:
+            chilo_factory.write_main_csv(*pending_main_csv_row, new_edges=delta.new_edges if delta is not None else "")
+            pending_main_csv_row = None
 
         # 汤普森采样反馈逻辑
         if chilo_factory.next_fuzz_strategy == 2 and chilo_factory.current_thompson_mutator:
-            # 累加当前批次的新边数
-            chilo_factory.current_batch_new_edges += new_edges
+            # 校准执行不计入批次
+            if not is_calibration_exec:
+                chilo_factory.current_batch_exec_count += 1
+                if chilo_factory.feedback_mode == 'bitmap':
+                    # 累加当前批次的奖励（按 ENERGY.REWARD_MODE，默认为新边数）
+                    chilo_factory.current_batch_reward += chilo_factory.coverage_reward(delta)
+                    chilo_factory.current_batch_found_edges += delta.new_edges
             
             # 如果是本轮最后一次变异，则进行结算
             # left_fuzz_count 在 fuzz() 函数结束前已经减 1
             # 因此当 post_run 运行时，如果 left_fuzz_count 为 0，说明刚刚结束的是最后一次 fuzz
             if left_fuzz_count == 0:
-                is_success = chilo_factory.current_batch_new_edges > 0
-                chilo_factory.current_thompson_mutator.update_stats(is_success, chilo_factory.current_batch_new_edges)
-                chilo_factory.main_logger.info(f"汤普森采样批次结束. 变异器: {chilo_factory.current_thompson_mutator.mutator_id}, 本批次总新边: {chilo_factory.current_batch_new_edges}, 结果: {'成功' if is_success else '失败'}")
+                if chilo_factory.feedback_mode == 'bitmap':
+                    settle_thompson_batch()
+                else:
+                    # AFL++ 在 post_run 之后才保存本次执行的条目（queue_new_entry），等下一次 fuzz_count 再结算
+                    chilo_factory.batch_settle_pending = True
 
         if time.time() - last_bitmap_save > 5:
             chilo_factory.write_bitmap()
+            chilo_factory.main_logger.info("变异器缓存统计：%s", chilo_factory.mutator_cache.stats())
+            if chilo_factory.prefetcher is not None:
+                chilo_factory.main_logger.info("预渲染缓冲区统计：%s", chilo_factory.prefetcher.stats())
+            chilo_factory.main_logger.info("CSV写入统计：%s", chilo_factory.csv_sink_stats())
+            if chilo_factory.mutator_executor.mode == "isolated":
+                chilo_factory.main_logger.info("变异器执行池统计：%s", chilo_factory.mutator_executor.stats())
+            if chilo_factory.edge_stability is not None:
+                chilo_factory.main_logger.info("不稳定边检测统计：%s", chilo_factory.edge_stability.stats())
+            if chilo_factory.eager_parse_queue is not None:
+                chilo_factory.main_logger.info("提前解析统计：%s", chilo_factory.eager_parse_queue.stats())
+            if chilo_factory.generation_governor is not None:
+                chilo_factory.main_logger.info("变异器生成调控统计：%s", chilo_factory.generation_governor.stats())
+            chilo_factory.main_logger.info("LLM传输层统计：%s", chilo_factory.llm_transport_stats())
+            if chilo_factory.feedback_mode == 'queue':
+                chilo_factory.scan_crashes()
+                chilo_factory.main_logger.info("队列反馈统计：%s", chilo_factory.queue_feedback_stats.stats())
             last_bitmap_save = time.time()
         is_chilo_fuzzed = False
     
 
 #当AFL++停止或结束的时候调用该函数，进行清理
 def deinit():  # optional for Python
+    global pending_main_csv_row
     chilo_factory.main_logger.info("FUZZ结束！祝您早日找到CVE！！")
-    pass
-# def describe(max_description_length):
-#     """
-#     为变异生成一个描述，可选的部分，不启用也ok
-#     :param max_description_length:
-#     :return:
-#     """
-#     return "description_of_current_mutation"
+    if chilo_factory.batch_settle_pending:
+        chilo_factory.scan_crashes()
+        settle_thompson_batch()
+    if pending_main_csv_row is not None:
+        #最后一个测试用例没有等到post_run，新增边数未知
+        chilo_factory.write_main_csv(*pending_main_csv_row, new_edges="")
+        pending_main_csv_row = None
+    chilo_factory.close()
+
+def describe(max_description_length):
+    """
+    AFL++ 保存新条目、崩溃或超时时调用，返回值会追加在文件名末尾
+    queue 反馈模式下返回刚刚那次执行的戳（执行编号、变异器、策略、种子），queue_new_entry 和崩溃扫描据此把奖励记给对应的变异器
+    :param max_description_length: 描述的最大长度
+    :return: 戳；bitmap 反馈模式下、或戳放不下时为 None，AFL++ 按原来的方式命名
+    """
+    if chilo_factory is None or chilo_factory.feedback_mode != 'queue':
+        return None
+    strategy = ChiloBitMap.STRATEGY_UNKNOWN if is_calibration_exec else chilo_factory.next_fuzz_strategy
+    stamp = queue_feedback.format_stamp(fuzz_number, chilo_factory.current_exec_mutator_index, strategy,
+                                        chilo_factory.current_exec_seed_id)
+    if len(stamp) > max_description_length:
+        return None     # 截断的戳可能被解析成另一个执行编号或种子，宁可不加
+    return stamp
 
 # def post_process(buf):
 #     """
@@ -347,18 +502,42 @@ def deinit():  # optional for Python
 # def havoc_mutation_probability():
 #     return probability # int in [0, 100]
 
-#下面的函数是种子选择的函数，
-# def queue_get(filename):
-#     return True
+def queue_get(filename):
+    """
+    AFL++ 选中一个队列条目、准备执行之前调用；启用 SEED_SCHEDULE 时跳过饱和的种子
+    :param filename: 队列条目的路径
+    :return: True 为执行该条目，False 为跳过
+    """
+    global current_queue_filename
+    is_accept = chilo_factory.should_fuzz_queue_entry(filename)
+    if is_accept:
+        current_queue_filename = filename
+    return is_accept
 
 # #下面是用于发送测试用例的函数，在本次设计中采用wrapper设计，不需要该函数
 # def fuzz_send(buf):
 #     pass
 
-# # 有新的种子加入测试用例后会调用这个函数，可以对种子进行处理，但本方法不需要该函数
-# def queue_new_entry(filename_new_queue, filename_orig_queue):
-#
-#     return False
+def queue_new_entry(filename_new_queue, filename_orig_queue):
+    """
+    有新的种子加入队列后调用：启用提前解析时立即登记新条目；queue 反馈模式下按文件名中的戳给产生它的变异器记奖励
+    :param filename_new_queue: 新条目的路径
+    :param filename_orig_queue: 产生它的原始种子的路径
+    :return: False，表示没有修改新条目
+    """
+    seed_id = chilo_factory.register_queue_entry(filename_new_queue)
+    if chilo_factory.seed_saturation is not None:
+        chilo_factory.seed_saturation.bind(filename_new_queue, seed_id)
+    stats = chilo_factory.queue_feedback_stats
+    stats.queue_entries += 1
+    stamp = queue_feedback.parse_stamp(filename_new_queue)
+    if stamp is None:
+        stats.unstamped += 1
+        return False
+    stats.by_strategy[stamp.strategy] = stats.by_strategy.get(stamp.strategy, 0) + 1
+    if chilo_factory.feedback_mode == 'queue':
+        chilo_factory.credit_queue_entry(stamp, 1)
+    return False
 
 # #返回一个字符串，用于描述变异方法的，不需要
 # def introspection():
@@ -1,7 +1,40 @@
 #用于存储全局bitmap的类
 import array
+import math
+import time
+from typing import NamedTuple
+
 import numpy as np
 
+from .ChiloCoverage import nonzero_indices
+
+# AFL++ 的命中次数分桶（count_class_lookup8）：1, 2, 3, 4-7, 8-15, 16-31, 32-127, 128-255 各占一位
+COUNT_CLASS_LOOKUP = np.zeros(256, dtype=np.uint8)
+COUNT_CLASS_LOOKUP[1] = 1
+COUNT_CLASS_LOOKUP[2] = 2
+COUNT_CLASS_LOOKUP[3] = 4
+COUNT_CLASS_LOOKUP[4:8] = 8
+COUNT_CLASS_LOOKUP[8:16] = 16
+COUNT_CLASS_LOOKUP[16:32] = 32
+COUNT_CLASS_LOOKUP[32:128] = 64
+COUNT_CLASS_LOOKUP[128:256] = 128
+
+
+# 发现新边时所用的变异策略，与 ChiloFactory.next_fuzz_strategy 取值一致
+STRATEGY_STRUCTURAL = 0     # 结构化变异
+STRATEGY_WAIT_EXEC = 1      # 待执行变异器（第一次执行）
+STRATEGY_POOL = 2           # 变异器池选择
+STRATEGY_UNKNOWN = 255
+
+
+class CoverageDelta(NamedTuple):
+    """一次执行合并进全局位图后的变化"""
+    new_edges: int      # 第一次被命中的边数量（0->1）
+    new_buckets: int    # 命中次数落入了之前没见过的桶的槽位数量（包含新边）
+    hit_edges: int      # 本次执行命中的边数量
+    rarity: float = 0.0 # 本次执行命中的边的稀有度之和（只在 track_rarity 时计算）
+
+
 class BitMap:
     """
     高效的位图实现，使用 array 模块减少内存开销。
@@ -14,10 +47,14 @@ class BitMap:
     
     对于 mapsize=65536:
     - 原 list 方案: 3 * 65536 * 28 ≈ 5.5 MB
-    - 优化后: 65536*8 + 65536*4 + 65536*1 ≈ 0.85 MB
+    - 优化后: 65536*8 + 65536*4 + 65536*1*2 ≈ 0.92 MB
     """
     
-    def __init__(self, mapsize):
+    def __init__(self, mapsize, track_rarity=False):
+        """
+        :param mapsize: 位图大小
+        :param track_rarity: 是否在合并时计算稀有度奖励（ENERGY.REWARD_MODE 为 rarity 时开启）
+        """
         #维护一个全局的BitMap
         self.map_size = mapsize
         # 使用 array 替代 list 以节省内存
@@ -27,48 +64,113 @@ class BitMap:
         self._sum_bitmap = array.array('Q', [0] * self.map_size)    # 总命中次数
         self._cumulative_bitmap = array.array('I', [0] * self.map_size)    # 测试用例命中次数
         self._bool_bitmap = array.array('B', [0] * self.map_size)    # 是否命中过（0/1）
+        self._bucket_bitmap = array.array('B', [0] * self.map_size)    # 见过的命中次数桶（按位或，AFL 的 virgin map 取反）
         self.hit_count = 0    # _bool_bitmap中为1的边数量
+        self.exec_count = 0   # 最近一次合并的执行编号
+        # 发现时间线：只在边第一次被命中（0->1）时写入，每次执行的额外开销与新边数成正比
+        self.first_exec = np.zeros(self.map_size, dtype=np.uint32)      # 第一次命中时的执行编号，0为未命中
+        self.first_time = np.zeros(self.map_size, dtype=np.uint32)      # 第一次命中时的 Unix 时间（秒）
+        self.discovered_seed = np.full(self.map_size, -1, dtype=np.int32)      # 发现该边的种子编号，-1为未知
+        self.discovered_mutator = np.full(self.map_size, -1, dtype=np.int32)   # 发现该边的变异器 mutator_index，-1为未知或结构化变异
+        self.discovered_strategy = np.full(self.map_size, STRATEGY_UNKNOWN, dtype=np.uint8)  # 发现该边时的变异策略
+        # 稀有度：边 i 的权重为 max(0, log10(已覆盖边数 / (1 + 命中该边的测试用例数))) / sqrt(map_size)
+        # （与 CLCC 的 ZrclMap.calculate_edgeCovPoint 相同，但不做全图重算）。
+        # log10(1 + 命中该边的测试用例数) 只在本次命中的下标上增量更新
+        self.track_rarity = track_rarity
+        self._log_cum = np.zeros(self.map_size, dtype=np.float32) if track_rarity else None
+        self._rarity_norm = math.sqrt(self.map_size)
+        self.unstable_mask = None   # 不稳定边掩码（uint8，1为不稳定），由 EdgeStabilityTracker 提供，这些边不计入新边/新桶/稀有度
+        self.last_indices = np.zeros(0, dtype=np.intp)  # 最近一次合并的执行命中的下标
+        # 直接从 array 创建 NumPy 视图（零拷贝，可写），只创建一次
+        self._sum_arr = np.frombuffer(self._sum_bitmap, dtype=np.uint64)
+        self._cum_arr = np.frombuffer(self._cumulative_bitmap, dtype=np.uint32)
+        self._bool_arr = np.frombuffer(self._bool_bitmap, dtype=np.uint8)
+        self._bucket_arr = np.frombuffer(self._bucket_bitmap, dtype=np.uint8)
         # 最近一次读取的原始位图快照
         self._last_snapshot = None
 
 
-    def add_bitmap(self, bitmap):
+    def add_bitmap(self, bitmap, exec_number=None, seed_id=-1, mutator_index=-1, strategy=STRATEGY_UNKNOWN,
+                   indices=None):
         """
-        添加一个位图：
+        添加一个位图（只在非零槽位上更新）：
         - _sum_bitmap[i] += bitmap[i]
         - 若 bitmap[i] > 0 则 _cumulative_bitmap[i] += 1 （一次测试用例对该槽位的命中次数计为1次）
         - 若 bitmap[i] > 0 且 _bool_bitmap[i] == 0，则将其置为1，并计入新边
-        返回：本次位图带来的新增边数量（0->1的数量）
-        
-        性能优化版本：使用 NumPy 向量化操作，mapsize=200000 时快 30-50 倍
+        - 将 bitmap[i] 按 AFL 的命中次数分桶，与 _bucket_bitmap[i] 中已见过的桶比较，出现新桶则计入新桶
+        - 对新边记录发现时的执行编号、时间、种子、变异器和变异策略
+        - track_rarity 时，用合并前的计数计算本次命中的边的稀有度之和
+        - 设置了 unstable_mask 时，不稳定边只累加计数，不计入新边、新桶和稀有度
+        返回：CoverageDelta(新增边数量, 新增桶的槽位数量, 本次命中的边数量, 稀有度)
+
+        :param exec_number: 本次执行的编号，默认为上一次的编号加一
+        :param seed_id: 本次执行的种子编号
+        :param mutator_index: 本次执行的变异器在变异器池中的下标
+        :param strategy: 本次执行的变异策略（STRATEGY_*）
+        :param indices: 调用方已经求出的非零下标（AFLCoverageReader.nonzero_indices），为 None 时在这里扫描
+
+        性能优化版本：先按 uint64 跳过全零的字找出非零下标，之后的更新只在这些下标上进行，
+        一次SQL执行通常只命中位图的百分之几
         """
         if bitmap is None or len(bitmap) != self.map_size:
             raise ValueError("Bitmap size mismatch")
+        self.exec_count = self.exec_count + 1 if exec_number is None else exec_number
+
+        # 零拷贝转换为 NumPy 数组视图（AFLCoverageReader 直接返回的就是 uint8 数组）
+        data = bitmap if isinstance(bitmap, np.ndarray) else np.frombuffer(bitmap, dtype=np.uint8)
+        if indices is None:
+            indices = nonzero_indices(data)
+        self.last_indices = indices
+        if indices.size == 0:
+            return CoverageDelta(0, 0, 0)
+
+        counts = data[indices]
+        scored, scored_counts = indices, counts     # 参与新边/新桶/稀有度计算的下标
+        if self.unstable_mask is not None:
+            stable = self.unstable_mask[indices] == 0
+            scored, scored_counts = indices[stable], counts[stable]
+
+        rarity = 0.0
+        if self.track_rarity and self.hit_count > 0:
+            weights = math.log10(self.hit_count) - self._log_cum[scored]
+            rarity = float(np.maximum(weights, 0).sum()) / self._rarity_norm
 
-        # 零拷贝转换为 NumPy 数组视图
-        data = np.frombuffer(bitmap, dtype=np.uint8)
-        
-        # 直接从 array 创建 NumPy 视图（零拷贝，可写）
-        sum_arr = np.frombuffer(self._sum_bitmap, dtype=np.uint64)
-        cum_arr = np.frombuffer(self._cumulative_bitmap, dtype=np.uint32)
-        bool_arr = np.frombuffer(self._bool_bitmap, dtype=np.uint8)
-        
-        # 向量化操作：找出非零位置
-        nonzero = data > 0
-        
-        # 向量化更新（只处理非零位置以提高缓存效率）
-        np.add(sum_arr, data, out=sum_arr, where=nonzero, casting='unsafe')
-        np.add(cum_arr, nonzero, out=cum_arr, where=nonzero, casting='unsafe')
-        
-        # 计算新边：非零且之前为0
-        new_edges_mask = nonzero & (bool_arr == 0)
-        new_edges = np.count_nonzero(new_edges_mask)
-        
+        self._sum_arr[indices] += counts
+        self._cum_arr[indices] += 1
+        if self.track_rarity:
+            self._log_cum[indices] = np.log10(self._cum_arr[indices] + 1.0)
+
+        # 新边：之前从未命中过（此时 _bucket_bitmap 也为 0）
+        seen = self._bucket_arr[scored]
+        classified = COUNT_CLASS_LOOKUP[scored_counts]
+        new_bits = classified & ~seen
+        new_bucket_mask = new_bits != 0
+        new_buckets = int(np.count_nonzero(new_bucket_mask))
+        if new_buckets == 0:
+            return CoverageDelta(0, 0, int(indices.size), rarity)
+
+        self._bucket_arr[scored] = seen | classified
+        new_edge_indices = scored[new_bucket_mask & (seen == 0)]
+        new_edges = int(new_edge_indices.size)
         if new_edges > 0:
-            bool_arr[new_edges_mask] = 1
+            self._bool_arr[new_edge_indices] = 1
             self.hit_count += new_edges
+            self.first_exec[new_edge_indices] = self.exec_count
+            self.first_time[new_edge_indices] = int(time.time())
+            self.discovered_seed[new_edge_indices] = seed_id
+            self.discovered_mutator[new_edge_indices] = mutator_index
+            self.discovered_strategy[new_edge_indices] = strategy
+
+        return CoverageDelta(new_edges, new_buckets, int(indices.size), rarity)
+
+    def get_arrays(self):
+        """返回 (总命中次数, 测试用例命中次数, 是否命中, 命中次数桶) 四个 NumPy 视图（零拷贝，不要修改）"""
+        return self._sum_arr, self._cum_arr, self._bool_arr, self._bucket_arr
 
-        return new_edges
+    def get_discovery_arrays(self):
+        """返回 (第一次命中的执行编号, 时间, 种子, 变异器下标, 变异策略) 五个 NumPy 数组（不要修改）"""
+        return (self.first_exec, self.first_time, self.discovered_seed, self.discovered_mutator,
+                self.discovered_strategy)
 
     def get_sum_bitmap(self):
         """返回总命中次数位图（list[int]）"""
@@ -8,15 +8,40 @@ from AFL++'s shared memory, enabling access to edge coverage information.
 import os
 import sys
 import ctypes
-from ctypes import c_void_p, c_int, POINTER, c_uint8, c_char_p
+import hashlib
+from ctypes import c_void_p, c_int, c_uint8, c_char_p
+
+import numpy as np
 
 # Constants
 SHM_ENV_VAR = "__AFL_SHM_ID"
 
 
 # Try to get map size from environment (AFL++ may set this)
+# 未设置时为 None：只导入本模块（例如 ChiloBitMap 使用 nonzero_indices）不需要它，创建 AFLCoverageReader 时才报错
+
+MAP_SIZE = int(os.environ["AFL_MAP_SIZE"]) if os.environ.get("AFL_MAP_SIZE") else None
 
-MAP_SIZE = int(os.environ.get("AFL_MAP_SIZE"))
+
+def nonzero_indices(data):
+    """
+    Get the indices of non-zero entries of a uint8 bitmap; only the non-zero uint64 words are expanded,
+    which is much cheaper than a byte-wise scan for a sparse trace
+
+    Args:
+        data: numpy.ndarray of uint8
+
+    Returns:
+        numpy.ndarray: Sorted indices (intp) of the non-zero entries
+    """
+    word_count = data.size // 8
+    words = np.flatnonzero(data[:word_count * 8].view(np.uint64))
+    candidates = (words[:, None] * 8 + np.arange(8)).ravel()
+    indices = candidates[data[candidates] != 0]
+    if data.size > word_count * 8:
+        tail = np.flatnonzero(data[word_count * 8:]) + word_count * 8
+        indices = np.concatenate((indices, tail))
+    return indices
 
 
 
@@ -24,12 +49,18 @@ class AFLCoverageReader:
     """Reads AFL++ coverage bitmap from shared memory"""
     
     def __init__(self, shm_id_path):
+        if MAP_SIZE is None:
+            raise RuntimeError("AFL_MAP_SIZE is not set; it must match the target's coverage map size")
         self.shm_id = None
         self.map_ptr = None
         self.map_size = MAP_SIZE
         self.shm_id_path = shm_id_path
         self._libc = None
         self._attached = False
+        self.attach_mode = None     # 实际使用的挂载方式："mmap" 或 "shmat"，cleanup 按它选择 munmap/shmdt
+        self._view = None           # 挂载时创建的只读 uint8 视图，之后每次直接返回
+        self._words = None          # 同一块内存按 uint64 解释的视图，用于快速判断是否有非零项
+        self._tail = None           # map_size 不是 8 的倍数时剩余的字节
         self._init_libc()
         # Defer attaching to shared memory until first use
     
@@ -85,9 +116,22 @@ class AFLCoverageReader:
         if shm_id_str.startswith('/'):
             # USEMMAP mode: use shm_open + mmap
             self._attach_shm_mmap(shm_id_str)
+            self.attach_mode = "mmap"
         else:
             # Traditional mode: use shmat
             self._attach_shm_traditional(shm_id_str)
+            self.attach_mode = "shmat"
+        self._create_views()
+
+    def _create_views(self):
+        """在已挂载的共享内存上创建常驻的只读 NumPy 视图（零拷贝）"""
+        array_type = c_uint8 * self.map_size
+        view = np.ctypeslib.as_array(array_type.from_address(self.map_ptr))
+        view.flags.writeable = False
+        word_count = self.map_size // 8
+        self._view = view
+        self._words = view[:word_count * 8].view(np.uint64)
+        self._tail = view[word_count * 8:]
     
     def _attach_shm_mmap(self, shm_path):
         """Attach using mmap (USEMMAP mode)"""
@@ -123,7 +167,7 @@ class AFLCoverageReader:
         # Map the shared memory
         PROT_READ = 0x1
         MAP_SHARED = 0x01
-        MAP_FAILED = c_void_p(-1)
+        MAP_FAILED = c_void_p(-1).value   # restype 为 c_void_p 时返回的是整数
         
         self.map_ptr = self._libc.mmap(
             None, self.map_size, PROT_READ, MAP_SHARED, shm_fd, 0
@@ -155,7 +199,7 @@ class AFLCoverageReader:
         SHM_RDONLY = 0x10000  # Read-only flag
         self.map_ptr = self._libc.shmat(self.shm_id, None, SHM_RDONLY)
         
-        if self.map_ptr == -1 or self.map_ptr is None:
+        if self.map_ptr == c_void_p(-1).value or self.map_ptr is None:
             errno = ctypes.get_errno()
             raise RuntimeError(
                 f"shmat() failed with errno {errno}. "
@@ -164,23 +208,38 @@ class AFLCoverageReader:
     
     def get_coverage_bitmap(self):
         """
-        Get the coverage bitmap as a memoryview object (zero-copy)
+        Get the coverage bitmap as a read-only NumPy uint8 array (zero-copy)
         
         Returns:
-            memoryview: Coverage bitmap view (typically 65536 bytes)
+            numpy.ndarray: Coverage bitmap view (map_size bytes)
             
-        性能优化：返回 memoryview 而不是 bytes，避免 200KB 数据拷贝
+        性能优化：视图在挂载时创建一次，之后每次直接返回，不再重复构造 ctypes 数组类型和 memoryview
         """
         self._ensure_attached()
-        if self.map_ptr is None or self.map_ptr == -1:
+        if self._view is None:
             raise RuntimeError("Shared memory not attached")
+        return self._view
+    
+    def has_any_nonzero(self):
+        """
+        Check whether the current trace hit any edge, scanning 8 bytes per step
         
-        # Create a ctypes array view of the shared memory
-        array_type = c_uint8 * self.map_size
-        bitmap_array = ctypes.cast(self.map_ptr, POINTER(array_type)).contents
+        Returns:
+            bool: True if any entry of the bitmap is non-zero
+        """
+        self._ensure_attached()
+        return bool(self._words.any()) or bool(self._tail.any())
+    
+    def nonzero_indices(self):
+        """
+        Get the indices of non-zero entries; only the non-zero uint64 words are expanded,
+        which is much cheaper than a byte-wise scan for a sparse trace
         
-        # Return memoryview (zero-copy, supports buffer protocol)
-        return memoryview(bitmap_array)
+        Returns:
+            numpy.ndarray: Sorted indices (intp) of the non-zero entries
+        """
+        self._ensure_attached()
+        return nonzero_indices(self._view)
     
     def get_coverage_count(self):
         """
@@ -189,8 +248,7 @@ class AFLCoverageReader:
         Returns:
             int: Number of unique edges covered
         """
-        bitmap = self.get_coverage_bitmap()
-        return sum(1 for b in bitmap if b > 0)
+        return int(np.count_nonzero(self.get_coverage_bitmap()))
     
     def get_coverage_hash(self):
         """
@@ -199,7 +257,6 @@ class AFLCoverageReader:
         Returns:
             int: Hash value of the coverage bitmap
         """
-        import hashlib
         bitmap = self.get_coverage_bitmap()
         return int(hashlib.md5(bitmap).hexdigest()[:8], 16)
     
@@ -208,7 +265,7 @@ class AFLCoverageReader:
         Compare current coverage with previous coverage
         
         Args:
-            previous_bitmap: Previous coverage bitmap (bytes)
+            previous_bitmap: Previous coverage bitmap (bytes-like or NumPy array)
         
         Returns:
             tuple: (new_edges_count, total_edges_count)
@@ -218,24 +275,20 @@ class AFLCoverageReader:
         current = self.get_coverage_bitmap()
         if len(current) != len(previous_bitmap):
             raise ValueError("Bitmap sizes don't match")
+        previous = np.frombuffer(previous_bitmap, dtype=np.uint8)
         
-        new_edges = 0
-        total_edges = 0
-        
-        for i in range(len(current)):
-            if current[i] > 0:
-                total_edges += 1
-                if previous_bitmap[i] == 0:
-                    new_edges += 1
-        
+        hit = current != 0
+        total_edges = int(np.count_nonzero(hit))
+        new_edges = int(np.count_nonzero(hit & (previous == 0)))
         return new_edges, total_edges
     
     def cleanup(self):
         """Detach from shared memory (optional, Python will handle cleanup)"""
         if self.map_ptr and sys.platform != "win32":
+            # 先释放视图，避免在内存解除映射后仍被访问
+            self._view = self._words = self._tail = None
             # For mmap mode, use munmap; for traditional mode, use shmdt
-            shm_id_str = os.environ.get(SHM_ENV_VAR, "")
-            if shm_id_str.startswith('/'):
+            if self.attach_mode == "mmap":
                 # mmap mode: use munmap
                 if sys.platform == "darwin":  # macOS
                     size_t = ctypes.c_ulonglong
@@ -250,6 +303,8 @@ class AFLCoverageReader:
                 self._libc.shmdt.restype = c_int
                 self._libc.shmdt(self.map_ptr)
             self.map_ptr = None
+            self._attached = False
+            self.attach_mode = None
 
 
 # Global instance (lazy initialization)
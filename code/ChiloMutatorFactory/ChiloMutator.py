@@ -8,31 +8,35 @@
 """
 import random
 import math
+import threading
+from collections import deque
 from typing import List
 
+import numpy as np
+
 
 #先定义变异器
 
 class ChiloMutator:
-    def __init__(self, file_path, seed_id, mutator_id, mutator_index, mask_count=0, similarity=0.0):
+    """
+    变异器池中的一个变异器
+    汤普森采样相关的统计量都保存在变异器池的数组中，这里只是按下标读写这些数组的视图
+    """
+    __slots__ = ("pool", "seed_id", "mutator_id", "mutator_index", "file_name")
+
+    def __init__(self, pool, file_path, seed_id, mutator_id, mutator_index):
         """
-        初始化一个变异器池,其中具有一些属性
+        :param pool: 所属的变异器池
+        :param file_path: 变异器文件所在目录
+        :param seed_id: 种子编号
+        :param mutator_id: 变异器编号
+        :param mutator_index: 在变异器池中的下标
         """
+        self.pool = pool
         self.seed_id = seed_id
         self.mutator_id = mutator_id
         self.mutator_index = mutator_index
-        self.mask_count = mask_count # 掩码数量 (用于 Ci 计算)
-        self.similarity = similarity # 重复率 (用于 Ci 计算, 0表示完全不重复, 1表示完全重复)
         self.file_name = f"{file_path}{seed_id}_{mutator_id}.py"
-        self.is_error = False   #是否在最终的FUZZ出现了错误
-        self.last_error_count = 0   #如果出现了最终FUZZ错误则加1...不过好像没啥用
-
-        # 汤普森采样相关属性
-        self.alpha = 1.0    # 成功次数 + 1 (先验)
-        self.beta = 1.0     # 失败次数 + 1 (先验)
-        self.success_count = 0  # 成功次数
-        self.failure_count = 0  # 失败次数
-        self.total_new_edges = 0 # 历史贡献的总新边数量 (用于 Bi 计算)
 
     def update_stats(self, is_success, new_edges):
         """
@@ -40,100 +44,626 @@ class ChiloMutator:
         :param is_success: 本次采样是否成功（覆盖了新边）
         :param new_edges: 本次采样发现的新边数量
         """
-        if is_success:
-            self.success_count += 1
-            self.alpha += 1
-        else:
-            self.failure_count += 1
-            self.beta += 1
-        self.total_new_edges += new_edges
+        self.pool.update_stats(self.mutator_index, is_success, new_edges)
+
+    # 汤普森采样相关属性
+    @property
+    def alpha(self):
+        """奖励模型下的成功次数 + 1 (先验)"""
+        return float(self.pool.posterior(self.mutator_index)[0])
+
+    @property
+    def beta(self):
+        """奖励模型下的失败次数 + 1 (先验)"""
+        return float(self.pool.posterior(self.mutator_index)[1])
+
+    @property
+    def success_count(self):
+        return int(self.pool._success[self.mutator_index])
+
+    @property
+    def failure_count(self):
+        return int(self.pool._failure[self.mutator_index])
+
+    @property
+    def total_new_edges(self):
+        """历史贡献的总新边数量 (用于 Bi 计算)"""
+        return float(self.pool._new_edges[self.mutator_index])
+
+    @property
+    def mask_count(self):
+        """掩码数量 (用于 Ci 计算)"""
+        return int(self.pool._mask[self.mutator_index])
+
+    @property
+    def similarity(self):
+        """重复率 (用于 Ci 计算, 0表示完全不重复, 1表示完全重复)"""
+        return float(self.pool._similarity[self.mutator_index])
+
+    @property
+    def is_error(self):
+        """是否在最终的FUZZ出现了错误"""
+        return bool(self.pool._is_error[self.mutator_index])
+
+    @is_error.setter
+    def is_error(self, value):
+        self.pool.set_flag(self.pool._is_error, self.mutator_index, value)
+
+    @property
+    def last_error_count(self):
+        """如果出现了最终FUZZ错误则加1...不过好像没啥用"""
+        return int(self.pool._error_count[self.mutator_index])
+
+    @last_error_count.setter
+    def last_error_count(self, value):
+        self.pool.set_flag(self.pool._error_count, self.mutator_index, value)
+
+    @property
+    def is_quarantined(self):
+        """是否因超时/内存超限/导致工作进程崩溃而被隔离，被隔离后不再参与选择"""
+        return bool(self.pool._quarantined[self.mutator_index])
+
+    @is_quarantined.setter
+    def is_quarantined(self, value):
+        self.pool.set_quarantined(self.mutator_index, value)
+
+    @property
+    def is_retired(self):
+        """是否已被退役（文件已移入归档），退役后不再参与选择，可以被复活"""
+        return bool(self.pool._retired[self.mutator_index])
+
 
 class ChiloMutatorPool:
-    def __init__(self, file_path):
+    """
+    变异器池
+    所有变异器的统计量按列保存在可增长的 numpy 数组中（struct of arrays），
+    汤普森采样时一次性对全部变异器批量采样并打分
+    同时按种子聚合出一层"种子臂"的后验，用于两级（种子 -> 变异器）选择
+    """
+    INIT_CAPACITY = 1024
+    INIT_ARM_CAPACITY = 256
+
+    def __init__(self, file_path, selection_mode="flat", seed_collapse_threshold=0.02, seed_collapse_min_trials=50,
+                 history_mode="stationary", discount_factor=0.999, window_size=50):
         """
         初始化一个变异器池，用于保存所有变异器
+        :param file_path: 变异器文件所在目录
+        :param selection_mode: flat：对全部变异器打分；hierarchical：先按种子聚合后验选种子，再在该种子的变异器中选择
+        :param seed_collapse_threshold: 种子后验均值低于该值时视为坍缩，不再为其生成新的变异器
+        :param seed_collapse_min_trials: 判定坍缩前该种子至少需要结算的批次数
+        :param history_mode: stationary：累计全部历史；discounted：每结算一个批次，所有变异器的历史统计量乘以 discount_factor；
+                             window：每个变异器只保留最近 window_size 个批次
+        :param discount_factor: discounted 模式的衰减系数
+        :param window_size: window 模式的窗口大小
         """
         self.mutator_list:List[ChiloMutator] = []
         self.next_mutator_index = 0
         self.file_path = file_path
         self.total_select_count = 0 # 变异器池总选择次数 (用于 Bi 计算)
+        self.rng = np.random.default_rng()
+        self.selection_mode = selection_mode
+        self.seed_collapse_threshold = seed_collapse_threshold
+        self.seed_collapse_min_trials = seed_collapse_min_trials
+        self.history_mode = history_mode
+        self.discount_factor = discount_factor
+        self.window_size = window_size
+        self.reward_step = 0        # 已结算的批次总数，discounted 模式下用于惰性衰减
+        self._windows = {}          # window 模式：变异器下标 -> 最近批次的 (是否成功, 新边数)
+
+        self._lock = threading.Lock()   # 保护数组扩容与写入，避免扩容时丢失并发写入的统计量
+        self._capacity = 0
+        # _alpha/_beta/_reward_edges 为奖励模型下的统计量；discounted 模式下只在变异器被结算时衰减到当前批次，
+        # 读取时再按 discount_factor ** (reward_step - _last_step) 补上尚未计入的衰减
+        self._alpha = self._beta = None
+        self._reward_edges = None
+        self._last_step = None
+        self._success = self._failure = None    # 累计的成功/失败次数，不受奖励模型影响
+        self._new_edges = None
+        self._mask = self._similarity = None
+        self._is_error = self._quarantined = None
+        self._error_count = None
+        self._retired = None
+        self._excluded = None       # 被隔离或已退役，不参与选择
+        self._zero_streak = None    # 连续不成功（没有发现新边）的批次数
+        self._excluded_count = 0
+        self._selectable = None     # 可参与选择的变异器下标，在变异器增加/隔离/退役/复活后惰性重建
+        self._retire_reason = {}    # 已退役的变异器下标 -> 退役原因
+        self._efficiency = None     # log((ne + 1)/(su + fa + 1) + 1)，在更新统计量时增量维护
+        self._ci = None             # 潜力因子 Ci，依赖平均掩码数，在变异器数量变化后惰性重算
+        self._mask_sum = 0.0        # 所有变异器掩码数量之和
+        self._ci_dirty = True
+        self._mutator_arm = None    # 变异器所属的种子臂下标
+        self._grow(self.INIT_CAPACITY)
+
+        # 种子臂：每个拥有变异器的种子一个臂，后验为其全部变异器的成功/失败次数之和
+        self._arm_of_seed = {}      # seed_id -> 种子臂下标
+        self._arm_seed_id = []      # 种子臂下标 -> seed_id
+        self._arm_members = []      # 种子臂下标 -> 变异器下标列表
+        self._arm_count = 0
+        self._arm_capacity = 0
+        self._arm_alpha = self._arm_beta = None
+        self._arm_reward_edges = None
+        self._arm_last_step = None
+        self._arm_trials = None     # 种子臂累计结算的批次数
+        self._arm_live = None       # 种子臂中可参与选择（未被隔离、未退役）的变异器个数
+        self._grow_arms(self.INIT_ARM_CAPACITY)
+
+    @staticmethod
+    def _grow_array(old, used, capacity, dtype, fill):
+        new = np.full(capacity, fill, dtype=dtype)
+        if old is not None:
+            new[:used] = old[:used]
+        return new
+
+    def _grow(self, capacity):
+        """将所有变异器数组扩容到 capacity"""
+        def grow(old, dtype, fill):
+            return self._grow_array(old, self._capacity, capacity, dtype, fill)
+        self._alpha = grow(self._alpha, np.float64, 1.0)
+        self._beta = grow(self._beta, np.float64, 1.0)
+        self._reward_edges = grow(self._reward_edges, np.float64, 0.0)
+        self._last_step = grow(self._last_step, np.int64, 0)
+        self._success = grow(self._success, np.int64, 0)
+        self._failure = grow(self._failure, np.int64, 0)
+        self._new_edges = grow(self._new_edges, np.float64, 0.0)
+        self._mask = grow(self._mask, np.float64, 0.0)
+        self._similarity = grow(self._similarity, np.float64, 0.0)
+        self._is_error = grow(self._is_error, np.bool_, False)
+        self._quarantined = grow(self._quarantined, np.bool_, False)
+        self._retired = grow(self._retired, np.bool_, False)
+        self._excluded = grow(self._excluded, np.bool_, False)
+        self._zero_streak = grow(self._zero_streak, np.int64, 0)
+        self._error_count = grow(self._error_count, np.int64, 0)
+        self._efficiency = grow(self._efficiency, np.float64, math.log(2))
+        self._ci = grow(self._ci, np.float64, 0.0)
+        self._mutator_arm = grow(self._mutator_arm, np.int64, 0)
+        self._capacity = capacity
+
+    def _grow_arms(self, capacity):
+        """将所有种子臂数组扩容到 capacity"""
+        def grow(old, dtype, fill):
+            return self._grow_array(old, self._arm_capacity, capacity, dtype, fill)
+        self._arm_alpha = grow(self._arm_alpha, np.float64, 1.0)
+        self._arm_beta = grow(self._arm_beta, np.float64, 1.0)
+        self._arm_reward_edges = grow(self._arm_reward_edges, np.float64, 0.0)
+        self._arm_last_step = grow(self._arm_last_step, np.int64, 0)
+        self._arm_trials = grow(self._arm_trials, np.int64, 0)
+        self._arm_live = grow(self._arm_live, np.int64, 0)
+        self._arm_capacity = capacity
 
     def add_mutator(self, seed_id, mutator_id, mask_count=0, similarity=0.0):
-        self.mutator_list.append(ChiloMutator(self.file_path, seed_id, mutator_id, self.next_mutator_index, mask_count, similarity))
-        self.next_mutator_index += 1
-        return self.next_mutator_index - 1
+        with self._lock:
+            index = self.next_mutator_index
+            if index >= self._capacity:
+                self._grow(self._capacity * 2)
+            self._mask[index] = mask_count
+            self._similarity[index] = similarity
+            self._mask_sum += mask_count
+            self._ci_dirty = True
+            self._selectable = None
+            arm = self._arm_of_seed.get(seed_id)
+            if arm is None:
+                arm = self._arm_count
+                if arm >= self._arm_capacity:
+                    self._grow_arms(self._arm_capacity * 2)
+                self._arm_of_seed[seed_id] = arm
+                self._arm_last_step[arm] = self.reward_step
+                self._arm_seed_id.append(seed_id)
+                self._arm_members.append([])
+                self._arm_count += 1
+            self._mutator_arm[index] = arm
+            self._last_step[index] = self.reward_step
+            self._arm_members[arm].append(index)
+            self._arm_live[arm] += 1
+            self.mutator_list.append(ChiloMutator(self, self.file_path, seed_id, mutator_id, index))
+            self.next_mutator_index += 1
+        return index
+
+    def update_stats(self, index, is_success, new_edges):
+        """
+        更新指定变异器的统计信息
+        :param index: 变异器下标
+        :param is_success: 本次采样是否成功（覆盖了新边）
+        :param new_edges: 本次采样发现的新边数量
+        """
+        success = 1.0 if is_success else 0.0
+        with self._lock:
+            if is_success:
+                self._success[index] += 1
+            else:
+                self._failure[index] += 1
+            self._new_edges[index] += new_edges
+            self._zero_streak[index] = 0 if is_success else self._zero_streak[index] + 1
+            arm = self._mutator_arm[index]
+            self._arm_trials[arm] += 1
 
+            if self.history_mode == "discounted":
+                # 只把本变异器及其种子臂衰减到当前批次，其余变异器在读取时惰性衰减，每个批次 O(1)
+                self.reward_step += 1
+                for alpha, beta, edges, last, i in ((self._alpha, self._beta, self._reward_edges, self._last_step, index),
+                                                    (self._arm_alpha, self._arm_beta, self._arm_reward_edges,
+                                                     self._arm_last_step, arm)):
+                    decay = self.discount_factor ** (self.reward_step - last[i])
+                    alpha[i] = 1 + (alpha[i] - 1) * decay + success
+                    beta[i] = 1 + (beta[i] - 1) * decay + (1 - success)
+                    edges[i] = edges[i] * decay + new_edges
+                    last[i] = self.reward_step
+                return
 
+            d_success, d_failure, d_edges = success, 1 - success, new_edges
+            if self.history_mode == "window":
+                window = self._windows.setdefault(index, deque())
+                window.append((success, new_edges))
+                if len(window) > self.window_size:
+                    old_success, old_edges = window.popleft()   # 移出窗口的批次
+                    d_success -= old_success
+                    d_failure -= 1 - old_success
+                    d_edges -= old_edges
+            self._alpha[index] += d_success
+            self._beta[index] += d_failure
+            self._reward_edges[index] += d_edges
+            trials = self._alpha[index] + self._beta[index] - 2
+            self._efficiency[index] = math.log((self._reward_edges[index] + 1) / (trials + 1) + 1)
+            # 同步更新所属种子臂的聚合后验
+            self._arm_alpha[arm] += d_success
+            self._arm_beta[arm] += d_failure
+            self._arm_reward_edges[arm] += d_edges
+
+    def _effective(self, alpha, beta, edges, last):
+        """
+        读取奖励模型下的后验参数，discounted 模式下补上自上次结算以来尚未计入的衰减
+        :return: (alpha, beta, 新边数)
+        """
+        if self.history_mode != "discounted":
+            return alpha, beta, edges
+        decay = self.discount_factor ** (self.reward_step - last)
+        return 1 + (alpha - 1) * decay, 1 + (beta - 1) * decay, edges * decay
+
+    def posterior(self, index):
+        """
+        读取变异器在奖励模型下的后验参数
+        :param index: 变异器下标（或下标数组）
+        :return: (alpha, beta, 新边数)
+        """
+        return self._effective(self._alpha[index], self._beta[index], self._reward_edges[index], self._last_step[index])
+
+    def _efficiency_of(self, index):
+        """效率项 log((ne + 1)/(su + fa + 1) + 1)，discounted 模式下按衰减后的统计量实时计算"""
+        if self.history_mode != "discounted":
+            return self._efficiency[index]
+        alpha, beta, edges = self.posterior(index)
+        return np.log((edges + 1) / (alpha + beta - 1) + 1)
+
+    def set_flag(self, array, index, value):
+        """在锁保护下写入一个变异器的状态位"""
+        with self._lock:
+            array[index] = value
+
+    def set_quarantined(self, index, value):
+        """
+        设置变异器的隔离状态，并维护所属种子臂中可用变异器的个数
+        :param index: 变异器下标
+        :param value: 是否隔离
+        """
+        with self._lock:
+            self._quarantined[index] = value
+            self._update_excluded(index)
+
+    def _update_excluded(self, index):
+        """隔离或退役状态变化后，维护可选择集合与种子臂中可用变异器的个数（需持有锁）"""
+        excluded = bool(self._quarantined[index] or self._retired[index])
+        if excluded == bool(self._excluded[index]):
+            return
+        self._excluded[index] = excluded
+        self._excluded_count += 1 if excluded else -1
+        self._arm_live[self._mutator_arm[index]] += -1 if excluded else 1
+        self._selectable = None
+
+    def retire(self, index, reason):
+        """
+        退役一个变异器，mutator_index 保持不变，之后不再参与选择
+        :param index: 变异器下标
+        :param reason: 退役原因
+        :return: 是否确实发生了退役
+        """
+        with self._lock:
+            if self._retired[index]:
+                return False
+            self._retired[index] = True
+            self._retire_reason[index] = reason
+            self._update_excluded(index)
+            return True
+
+    def revive(self, index):
+        """
+        复活一个已退役的变异器，保留其历史统计量
+        :param index: 变异器下标
+        :return: 是否确实发生了复活
+        """
+        with self._lock:
+            if not self._retired[index]:
+                return False
+            self._retired[index] = False
+            self._retire_reason.pop(index, None)
+            self._zero_streak[index] = 0
+            self._update_excluded(index)
+            return True
+
+    def retire_reason_of(self, index, zero_edge_batches, max_error_count):
+        """
+        按退役策略检查一个变异器
+        :param index: 变异器下标
+        :param zero_edge_batches: 连续多少个批次没有发现新边则退役，0 表示不检查
+        :param max_error_count: 出错次数达到多少则退役，0 表示不检查
+        :return: 退役原因 error / zero_edge，不需要退役时返回 None
+        """
+        if self._excluded[index]:
+            return None
+        if max_error_count and self._error_count[index] >= max_error_count:
+            return "error"
+        if zero_edge_batches and self._zero_streak[index] >= zero_edge_batches:
+            return "zero_edge"
+        return None
+
+    def over_cap(self, max_active_size):
+        """
+        可参与选择的变异器超过上限时，挑出后验均值最低的若干个（只考虑至少结算过一个批次的）
+        :param max_active_size: 可参与选择的变异器个数上限
+        :return: 需要退役的变异器下标列表
+        """
+        n = self.next_mutator_index
+        excess = n - self._excluded_count - max_active_size
+        if excess <= 0:
+            return []
+        with self._lock:
+            candidates = np.flatnonzero(~self._excluded[:n] & (self._success[:n] + self._failure[:n] > 0))
+            if candidates.size == 0:
+                return []
+            alpha, beta, _ = self.posterior(candidates)
+            means = alpha / (alpha + beta)
+        excess = min(excess, candidates.size)
+        return candidates[np.argpartition(means, excess - 1)[:excess]].tolist()
+
+    def revive_candidate(self):
+        """
+        随机挑选一个可以复活的变异器（因出错退役的不复活）
+        :return: 变异器下标，没有时返回 None
+        """
+        with self._lock:
+            candidates = [index for index, reason in self._retire_reason.items() if reason != "error"]
+        return random.choice(candidates) if candidates else None
+
+    def active_size(self):
+        """
+        :return: 可参与选择的变异器个数
+        """
+        return self.next_mutator_index - self._excluded_count
+
+    def retired_size(self):
+        """
+        :return: 已退役的变异器个数
+        """
+        return len(self._retire_reason)
+
+    def _selectable_indices(self, n):
+        """可参与选择的变异器下标；没有被排除的变异器时直接返回切片，避免拷贝"""
+        if self._excluded_count == 0:
+            return slice(0, n)
+        if self._selectable is None:
+            self._selectable = np.flatnonzero(~self._excluded[:n])
+        return self._selectable
+
+    def is_seed_collapsed(self, seed_id):
+        """
+        判断种子的聚合后验是否已经坍缩（结算了足够多的批次，且后验均值低于阈值）
+        :param seed_id: 种子编号
+        :return: 坍缩返回 True；该种子还没有变异器时返回 False
+        """
+        arm = self._arm_of_seed.get(seed_id)
+        if arm is None:
+            return False
+        alpha, beta, _ = self._effective(self._arm_alpha[arm], self._arm_beta[arm],
+                                         self._arm_reward_edges[arm], self._arm_last_step[arm])
+        return (self._arm_trials[arm] >= self.seed_collapse_min_trials
+                and alpha / (alpha + beta) < self.seed_collapse_threshold)
+
+    def seed_arm_stats(self, seed_id):
+        """
+        读取种子臂在奖励模型下的聚合后验
+        :param seed_id: 种子编号
+        :return: (alpha, beta, 累计结算批次数, 变异器个数)；该种子还没有变异器时返回 None
+        """
+        arm = self._arm_of_seed.get(seed_id)
+        if arm is None:
+            return None
+        alpha, beta, _ = self._effective(self._arm_alpha[arm], self._arm_beta[arm],
+                                         self._arm_reward_edges[arm], self._arm_last_step[arm])
+        return float(alpha), float(beta), int(self._arm_trials[arm]), len(self._arm_members[arm])
+
+    def seed_generation_evidence(self, seed_id):
+        """
+        读取一个种子已有变异器的概况，供变异器生成调控器判断是否值得再生成一个
+        :param seed_id: 种子编号
+        :return: (变异器个数, 后验均值最高的可选变异器下标或 None, 这些变异器累计发现的新边数, 平均重复率)
+        """
+        with self._lock:
+            arm = self._arm_of_seed.get(seed_id)
+            if arm is None:
+                return 0, None, 0.0, 0.0
+            members = np.asarray(self._arm_members[arm], dtype=np.int64)
+            new_edges = float(self._new_edges[members].sum())
+            similarity = float(self._similarity[members].mean())
+            live = members[~self._excluded[members]]
+            best = None
+            if live.size:
+                alpha, beta, _ = self.posterior(live)
+                best = int(live[np.argmax(alpha / (alpha + beta))])
+            return int(members.size), best, new_edges, similarity
 
     def random_select_mutator(self):
         """
         从变异器池中随机选择一个
         :return: 返回的变异器对象
         """
-        if self.next_mutator_index == 0:    #说明还没有变异器呢，要稍微等一会
+        n = self.next_mutator_index
+        if n == 0:    #说明还没有变异器呢，要稍微等一会
             return None
-        else:
-            num = random.randint(0, self.next_mutator_index - 1)
-            return self.mutator_list[num]
+        # 先随机尝试几次，绝大多数情况下直接命中未被隔离的变异器
+        for _ in range(16):
+            index = random.randint(0, n - 1)
+            if not self._excluded[index]:
+                return self.mutator_list[index]
+        candidates = np.flatnonzero(~self._excluded[:n])
+        return self.mutator_list[int(self.rng.choice(candidates))] if candidates.size else None
+
+    def _refresh_ci(self, n):
+        """
+        重算潜力因子 Ci
+        Ci = log((mask_i * (1 - sim_i)) / avg_mask + 1)
+        分子: mask_count * (1 - similarity) = 掩码数 × 多样性，分母: 平均掩码数量 (归一化)
+        """
+        avg_mask_count = self._mask_sum / n
+        denominator_ci = avg_mask_count if avg_mask_count > 1e-9 else 1.0
+        np.log(self._mask[:n] * (1 - self._similarity[:n]) / denominator_ci + 1, out=self._ci[:n])
+        self._ci_dirty = False
 
     def thompson_select_mutator(self):
         """
         使用汤普森采样算法(结合历史因子Bi)从变异器池中选择一个变异器
-        :return: (变异器对象, 采样得分)
-        """
-        if self.next_mutator_index == 0:
-            return None, 0.0
-        
-        best_mutator = None
-        best_score = -1.0
-        best_Ai = 0.0
-        best_Bi = 0.0
-        best_Ci = 0.0
-        
-        N = self.next_mutator_index # 变异器总数
-        t = self.total_select_count # 总选择次数
-        
-        # 计算所有变异器的平均掩码数量 (在循环外计算一次即可)
-        avg_mask_count = sum(m.mask_count for m in self.mutator_list) / len(self.mutator_list)
-        
-        for mutator in self.mutator_list:
-            # 1. 基础汤普森采样 (Ai)
-            sample_val = random.betavariate(mutator.alpha, mutator.beta)
-            
-            # 2. 计算历史因子 (Bi)
-            # Bi = log(t/N + 1) * log((ne + 1)/(su + fa + 1) + 1)
-            # 含义：时间压力 × 效率（每次选择能发现多少新边）
-            # 效率高的变异器 Bi 大，效率低的 Bi 小
-            su = mutator.success_count
-            fa = mutator.failure_count
-            ne = mutator.total_new_edges
-            
-            time_pressure = math.log(t / N + 1)
-            efficiency = math.log((ne + 1) / (su + fa + 1) + 1)
-            
-            Bi = time_pressure * efficiency
-            
-            # 3. 计算潜力因子 (Ci)
-            # Ci = log((mask_i * (1 - sim_i)) / avg_mask + 1)
-            # 分子: mask_count * (1 - similarity) = 掩码数 × 多样性
-            numerator_ci = mutator.mask_count * (1 - mutator.similarity)
-            # 分母: 平均掩码数量 (归一化)
-            denominator_ci = avg_mask_count if avg_mask_count > 1e-9 else 1.0
-            
-            Ci = math.log(numerator_ci / denominator_ci + 1)
-            
-            # 4. 组合分数
-            # S = Ai * (1 + Bi) * (1 + Ci)
-            score = sample_val * (1 + Bi) * (1 + Ci)
-            
-            if score > best_score:
-                best_score = score
-                best_mutator = mutator
-                best_Ai = sample_val
-                best_Bi = Bi
-                best_Ci = Ci
-                
-        return best_mutator, best_score, best_Ai, best_Bi, best_Ci
-                
+        两种模式下返回的 Ai/Bi/Ci 都是选中变异器的三个因子，hierarchical 模式另外返回种子臂的采样值
+        :return: (变异器对象, 采样得分, Ai, Bi, Ci, 种子臂采样值)，flat 模式下种子臂采样值为 None
+        """
+        n = self.next_mutator_index # 变异器总数
+        if n == 0:
+            return None, 0.0, 0.0, 0.0, 0.0, None
+        if self.selection_mode == "hierarchical":
+            return self._hierarchical_select(n)
+        with self._lock:
+            if self._ci_dirty:
+                self._refresh_ci(n)
+            # 只对可参与选择的变异器打分（隔离、退役的不参与）
+            selectable = self._selectable_indices(n)
+            active = n - self._excluded_count
+            if active == 0:     # 所有变异器都已被隔离或退役
+                return None, 0.0, 0.0, 0.0, 0.0, None
+            # 1. 基础汤普森采样 (Ai)，一次性对全部变异器批量采样
+            alpha, beta, _ = self.posterior(selectable)
+            samples = self.rng.beta(alpha, beta)
+            efficiency = self._efficiency_of(selectable)
+            Ci = self._ci[selectable]
+
+        # 2. 计算历史因子 (Bi)
+        # Bi = log(t/N + 1) * log((ne + 1)/(su + fa + 1) + 1)
+        # 含义：时间压力 × 效率（每次选择能发现多少新边）
+        # 效率高的变异器 Bi 大，效率低的 Bi 小
+        time_pressure = math.log(self.total_select_count / active + 1)
+        Bi = time_pressure * efficiency
+
+        # 3. 组合分数
+        # S = Ai * (1 + Bi) * (1 + Ci)
+        scores = samples * (1 + Bi) * (1 + Ci)
+
+        best = int(np.argmax(scores))
+        index = best if isinstance(selectable, slice) else int(selectable[best])
+        return (self.mutator_list[index], float(scores[best]), float(samples[best]), float(Bi[best]), float(Ci[best]),
+                None)
+
+    def _hierarchical_select(self, n):
+        """
+        两级汤普森采样：先按种子臂的聚合后验采样出一个种子，再在该种子的变异器中按 S = Ai * (1 + Bi) * (1 + Ci) 选择
+        同一种子下变异器再多也只占一个臂，选择开销为 O(种子数 + 该种子的变异器数)
+        :param n: 变异器总数
+        :return: (变异器对象, 采样得分, Ai, Bi, Ci, 种子臂采样值)
+        """
+        with self._lock:
+            if self._ci_dirty:
+                self._refresh_ci(n)
+            k = self._arm_count
+            live = self._arm_live[:k] > 0
+            if not live.any():  # 所有变异器都已被隔离或退役
+                return None, 0.0, 0.0, 0.0, 0.0, None
+            active = n - self._excluded_count
+            # 第一级：种子臂
+            arm_alpha, arm_beta, _ = self._effective(self._arm_alpha[:k], self._arm_beta[:k],
+                                                     self._arm_reward_edges[:k], self._arm_last_step[:k])
+            seed_samples = self.rng.beta(arm_alpha, arm_beta)
+            seed_samples[~live] = -1.0
+            arm = int(np.argmax(seed_samples))
+            # 第二级：该种子下的变异器
+            members = np.array(self._arm_members[arm], dtype=np.int64)
+            members = members[~self._excluded[members]]
+            alpha, beta, _ = self.posterior(members)
+            samples = self.rng.beta(alpha, beta)
+            efficiency = self._efficiency_of(members)
+            Ci = self._ci[members]
+
+        time_pressure = math.log(self.total_select_count / active + 1)
+        Bi = time_pressure * efficiency
+        scores = samples * (1 + Bi) * (1 + Ci)
+
+        best = int(np.argmax(scores))
+        return (self.mutator_list[int(members[best])], float(scores[best]), float(samples[best]),
+                float(Bi[best]), float(Ci[best]), float(seed_samples[arm]))
+
 
+class ChiloExecQueue:
+    """
+    待执行变异器队列（游程编码）
+    修复器会把同一个变异器连续发布 fix_mutate_time 次，这里只保存 [变异器, 剩余次数] 的游程，
+    fuzz_count 查看队首游程长度、mutate_once 取出一次、查询队列深度都是 O(1) 的
+    """
+    def __init__(self):
+        self._runs = deque()    # 每一项为 [变异器, 剩余执行次数]
+        self._size = 0          # 所有游程剩余次数之和
+        self._cond = threading.Condition()
+
+    def put(self, mutator, count=1):
+        """
+        发布 count 次该变异器的执行任务，与队尾为同一变异器时合并为一个游程
+        :param mutator: 变异器对象
+        :param count: 执行次数
+        :return: 无返回值
+        """
+        if count <= 0:
+            return
+        with self._cond:
+            if self._runs and self._runs[-1][0] is mutator:
+                self._runs[-1][1] += count
+            else:
+                self._runs.append([mutator, count])
+            self._size += count
+            self._cond.notify_all()
+
+    def get(self):
+        """
+        取出一次队首变异器的执行任务，队列为空时阻塞等待
+        :return: 变异器对象
+        """
+        with self._cond:
+            while not self._runs:
+                self._cond.wait()
+            run = self._runs[0]
+            run[1] -= 1
+            self._size -= 1
+            if run[1] == 0:
+                self._runs.popleft()
+            return run[0]
+
+    def peek_run(self):
+        """
+        查看队首游程
+        :return: (变异器对象, 连续执行次数)，队列为空时返回 (None, 0)
+        """
+        with self._cond:
+            if not self._runs:
+                return None, 0
+            return self._runs[0][0], self._runs[0][1]
+
+    def qsize(self):
+        """
+        :return: 剩余的执行任务总数
+        """
+        return self._size
 
+    def empty(self):
+        return self._size == 0
@@ -663,8 +663,10 @@ def chilo_mutator_generator(my_chilo_factory: ChiloFactory):
         else:
             my_chilo_factory.mutator_generator_logger.warning(
                 f"seed_id：{generate_target['seed_id']}  生成变异器失败，已跳过该种子")
+            my_chilo_factory.finish_seed_work(generate_target['seed_id'])
         my_chilo_factory.mutator_generator_logger.info("-"*10)
         all_end_time = time.time()
         my_chilo_factory.write_mutator_generator_csv(all_end_time, generate_target['seed_id'], all_end_time-all_start_time,
                                                      end_time-start_time, all_up_token, all_down_token, llm_count,
-                                                     llm_error_count, my_chilo_factory.fix_mutator_list.qsize())
\ No newline at end of file
+                                                     llm_error_count, my_chilo_factory.fix_mutator_list.qsize(),
+                                                     my_chilo_factory.llm_tool_mutator_generator.take_call_metrics())
\ No newline at end of file
@@ -252,7 +252,12 @@ def chilo_parser(chilo_factory: ChiloFactory):
                 f"Parser: 种子{seed_id}已压栈 (栈大小:{len(local_stack)}/{MAX_STACK_SIZE})"
             )
         except queue.Empty:
-            pass  # 没有新种子，继续执行
+            # 没有新种子：栈和回流队列也为空、下游有空位时，取一个 AFL++ 新条目提前解析
+            if not local_stack and not reflow_queue and not chilo_factory.wait_mutator_generate_list.full():
+                eager_target = chilo_factory.next_eager_parse_target()
+                if eager_target is not None:
+                    local_stack.append(eager_target)
+                    chilo_factory.parser_logger.info("Parser: 解析器空闲，提前解析新队列条目%s", eager_target['seed_id'])
         
         # === 步骤2: 检查下游队列wait_mutator_generate_list是否已满 ===
         if chilo_factory.wait_mutator_generate_list.full():
@@ -309,7 +314,7 @@ def chilo_parser(chilo_factory: ChiloFactory):
         if chilo_factory.all_seed_list.seed_list[seed_id].is_parsed:
             # 说明已经被解析过了，直接将这个种子加入待变异队列
             chilo_factory.parser_logger.info(f"seed_id:{seed_id} 已经被解析过，正在放入变异器生成队列")
-            chilo_factory.wait_mutator_generate_list.put(parse_target)
+            governor_decision, governor_reason = chilo_factory.route_parsed_seed(parse_target)
             chilo_factory.parser_logger.info(f"seed_id:{seed_id} 放入变异器生成队列成功")
             tmp_seed_is_fuzz_flag_for_csv = 1
         else:
@@ -360,7 +365,7 @@ def chilo_parser(chilo_factory: ChiloFactory):
             # 然后要将这个加入到待变异中
             chilo_factory.parser_logger.info(
                 f"seed_id:{seed_id} 准备加入到变异器待生成队列中")
-            chilo_factory.wait_mutator_generate_list.put(parse_target)
+            governor_decision, governor_reason = chilo_factory.route_parsed_seed(parse_target)
             tmp_seed_is_fuzz_flag_for_csv = 0
             chilo_factory.parser_logger.info(f"seed_id:{seed_id} 放入变异器生成队列成功")
             chilo_factory.parser_logger.info(f"-"*10)
@@ -373,4 +378,6 @@ def chilo_parser(chilo_factory: ChiloFactory):
                                        tmp_seed_is_fuzz_flag_for_csv, llm_usd_time_all, up_token_all, down_token_all,
                                        llm_use_count, llm_format_error_count, all_end_time-all_start_time,
                                        chilo_factory.all_seed_list.seed_list[seed_id].chose_time,
-                                       left_parser_queue_size, evicted_seed_total, mask_count)
\ No newline at end of file
+                                       left_parser_queue_size, evicted_seed_total, mask_count,
+                                       parse_target.get('eager', False), governor_decision, governor_reason,
+                                       chilo_factory.llm_tool_parser.take_call_metrics())
\ No newline at end of file
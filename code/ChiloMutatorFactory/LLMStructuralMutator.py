@@ -450,11 +450,12 @@ Your goal is to make SQL test cases RICHER, more DIVERSE, and more likely to tri
         with open(f"{my_chilo_factory.structural_mutator_path}{structural_count}_{target_seed_id}_{new_seed_id}.txt", "w", encoding="utf-8") as f:
             f.write(after_mutate_testcase)
         my_chilo_factory.structural_mutator_logger.info(f"seed_id：{target_seed_id}，变异后，新的seed_id为：{new_seed_id}，已保存到文件{structural_count}_{target_seed_id}_{new_seed_id}.txt")
-        my_chilo_factory.wait_exec_structural_list.put({"seed_id": new_seed_id, "is_from_structural_mutator": True, "mutate_content": after_mutate_testcase})
+        my_chilo_factory.wait_exec_structural_list.put({"seed_id": new_seed_id, "is_from_structural_mutator": True, "mutate_buf": bytearray(after_mutate_testcase, "utf-8", errors="ignore")})  # 提前编码，fuzz时直接返回
         my_chilo_factory.structural_mutator_logger.info(f"seed_id：{new_seed_id}，已加入等待执行结构化变异队列")
         my_chilo_factory.structural_mutator_logger.info("-" * 10)
         structural_mutate_end_time = time.time()
         my_chilo_factory.write_structural_mutator_csv(structural_mutate_end_time, target_seed_id, new_seed_id, structural_mutate_end_time-structural_mutate_start_time,
-                                                      all_up_token, all_down_token, llm_count, llm_error_count, llm_use_time, my_chilo_factory.structural_mutator_list.qsize())
+                                                      all_up_token, all_down_token, llm_count, llm_error_count, llm_use_time, my_chilo_factory.structural_mutator_list.qsize(),
+                                                      my_chilo_factory.llm_tool_structural_mutator.take_call_metrics())
 
         
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+全局位图的二进制持久化
+
+文件 bitmap.bin 由一个32字节的头部和紧随其后的原始数组组成（小端序）：
+    magic(8s) version(uint16) reserved(uint16) map_size(uint32) hit_count(uint64) timestamp(float64)
+    sum        uint64[map_size]  总命中次数
+    cumulative uint32[map_size]  测试用例命中次数
+    bool       uint8[map_size]   是否命中过（0/1）
+    bucket     uint8[map_size]   见过的命中次数桶
+    以下为版本 2 新增（追加在末尾，只读前四个数组的旧读取方不受影响）：
+    first_exec uint32[map_size]  第一次命中时的执行编号，0为未命中
+    first_time uint32[map_size]  第一次命中时的 Unix 时间（秒）
+    seed       int32[map_size]   发现该边的种子编号
+    mutator    int32[map_size]   发现该边的变异器 mutator_index
+    strategy   uint8[map_size]   发现该边时的变异策略
+map_size 为 4 的倍数时（AFL++ 总是如此）每个数组都按其元素大小对齐，读取方可以直接 mmap 后零拷贝地解释为数组。
+写入时先写临时文件再原子替换，读取方不会读到写了一半的文件。
+
+snapshots.bin 是按时间追加的累计命中位图（cumulative）快照，每条记录只保存与上一条相比变化的槽位：
+    timestamp(float64) exec_number(uint64) hit_count(uint64) changed(uint32) payload_size(uint32)
+    payload = zlib(下标差分 uint32[changed] + 增量 uint32[changed])
+从头依次累加即可还原任意时刻的累计命中位图，用于离线绘制覆盖率随时间变化的曲线。
+快照是相对于本次运行的 BitMap 的增量，不能接在上一次运行的文件后面：启动时已有的非空 snapshots.bin
+按其修改时间改名为 snapshots.<YYYYmmdd_HHMMSS>.bin 保留下来。
+
+需要旧的逗号分隔文本时，在 code 目录下运行：
+python -m ChiloMutatorFactory.bitmap_store <bitmap.bin> [输出目录]
+"""
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+BITMAP_FILE_NAME = "bitmap.bin"
+MAGIC = b"CHILOBMP"
+VERSION = 2
+HEADER = struct.Struct("<8sHHIQd")
+CHANNELS = (("sum", np.dtype("<u8")), ("cumulative", np.dtype("<u4")),
+            ("bool", np.dtype("u1")), ("bucket", np.dtype("u1")),
+            ("first_exec", np.dtype("<u4")), ("first_time", np.dtype("<u4")),
+            ("seed", np.dtype("<i4")), ("mutator", np.dtype("<i4")), ("strategy", np.dtype("u1")))
+VERSION_CHANNEL_COUNT = {1: 4, 2: 9}    # 各版本文件中的数组个数
+TEXT_CHANNELS = ("sum", "cumulative", "bool")   # 旧版文本格式只有这三种
+
+
+def write_bitmap_file(path, bitmap, timestamp=None):
+    """
+    将 BitMap 的全部数组以二进制格式原子写入文件
+    :param path: 目标文件路径
+    :param bitmap: ChiloBitMap.BitMap 对象
+    :param timestamp: 写入时间戳，默认为当前时间
+    :return: 无返回值
+    """
+    arrays = bitmap.get_arrays() + bitmap.get_discovery_arrays()
+    header = HEADER.pack(MAGIC, VERSION, 0, bitmap.map_size, bitmap.hit_count,
+                         time.time() if timestamp is None else timestamp)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for (_, dtype), arr in zip(CHANNELS, arrays):
+            f.write(memoryview(arr.astype(dtype, copy=False)))
+    os.replace(tmp_path, path)
+
+
+def read_bitmap_file(path):
+    """
+    以只读 memmap 的方式打开位图文件（零拷贝）
+    :param path: 位图文件路径
+    :return: (头部字典, {通道名: 只读 NumPy 数组})
+    """
+    with open(path, "rb") as f:
+        magic, version, _, map_size, hit_count, timestamp = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} 不是位图文件")
+    if version not in VERSION_CHANNEL_COUNT:
+        raise ValueError(f"不支持的位图文件版本：{version}")
+    header = {"version": version, "map_size": map_size, "hit_count": hit_count, "timestamp": timestamp}
+    channels = {}
+    offset = HEADER.size
+    for name, dtype in CHANNELS[:VERSION_CHANNEL_COUNT[version]]:
+        channels[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(map_size,))
+        offset += dtype.itemsize * map_size
+    return header, channels
+
+
+class SnapshotWriter:
+    """
+    累计命中位图的增量快照写入器（追加写 snapshots.bin）
+    """
+    RECORD = struct.Struct("<dQQII")
+
+    def __init__(self, path):
+        """
+        :param path: 快照文件路径，已存在且非空时先改名保留上一次运行的快照，再创建新文件（与新的 BitMap 对应）
+        """
+        self.path = path
+        self._previous = None
+        self.snapshot_count = 0
+        self.rotated_path = rotate_snapshot_file(path)
+        with open(path, "wb"):
+            pass
+
+    def write(self, bitmap, timestamp=None):
+        """
+        追加一条快照，只保存与上一条快照相比变化的槽位
+        :param bitmap: ChiloBitMap.BitMap 对象
+        :param timestamp: 快照时间戳，默认为当前时间
+        :return: 本条快照中变化的槽位个数
+        """
+        cumulative = bitmap.get_arrays()[1]
+        if self._previous is None:
+            self._previous = np.zeros_like(cumulative)
+        changed = np.flatnonzero(cumulative != self._previous).astype(np.uint32)
+        increments = (cumulative[changed] - self._previous[changed]).astype(np.uint32)
+        gaps = np.diff(changed, prepend=np.uint32(0)).astype(np.uint32)   # 下标差分后更易压缩
+        payload = zlib.compress(gaps.astype("<u4").tobytes() + increments.astype("<u4").tobytes())
+        record = self.RECORD.pack(time.time() if timestamp is None else timestamp, bitmap.exec_count,
+                                  bitmap.hit_count, changed.size, len(payload))
+        with open(self.path, "ab") as f:
+            f.write(record)
+            f.write(payload)
+        self._previous[changed] = cumulative[changed]
+        self.snapshot_count += 1
+        return int(changed.size)
+
+
+def rotate_snapshot_file(path):
+    """
+    把已有的非空快照文件按其修改时间改名，例如 snapshots.bin -> snapshots.20240101_120000.bin
+    :param path: 快照文件路径
+    :return: 改名后的路径，文件不存在或为空时为 None
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if st.st_size == 0:
+        return None
+    root, ext = os.path.splitext(path)
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(st.st_mtime))
+    rotated = f"{root}.{stamp}{ext}"
+    suffix = 1
+    while os.path.exists(rotated):
+        rotated = f"{root}.{stamp}_{suffix}{ext}"
+        suffix += 1
+    os.replace(path, rotated)
+    return rotated
+
+
+def read_snapshots(path, map_size):
+    """
+    依次还原每条快照时刻的累计命中位图
+    :param path: 快照文件路径
+    :param map_size: 位图大小
+    :return: 生成器，每次产出 ({timestamp, exec_number, hit_count, changed}, 累计命中位图的副本)
+    """
+    cumulative = np.zeros(map_size, dtype=np.uint32)
+    with open(path, "rb") as f:
+        while True:
+            raw = f.read(SnapshotWriter.RECORD.size)
+            if len(raw) < SnapshotWriter.RECORD.size:
+                return
+            timestamp, exec_number, hit_count, changed, payload_size = SnapshotWriter.RECORD.unpack(raw)
+            payload = zlib.decompress(f.read(payload_size))
+            gaps = np.frombuffer(payload, dtype="<u4", count=changed)
+            increments = np.frombuffer(payload, dtype="<u4", count=changed, offset=4 * changed)
+            cumulative[np.cumsum(gaps, dtype=np.uint64).astype(np.intp)] += increments
+            yield ({"timestamp": timestamp, "exec_number": exec_number, "hit_count": hit_count,
+                    "changed": changed}, cumulative.copy())
+
+
+def export_text(path, output_dir):
+    """
+    将二进制位图文件转换为旧版的 sum.txt / cumulative.txt / bool.txt
+    :param path: 位图文件路径
+    :param output_dir: 文本文件输出目录
+    :return: 写出的文件路径列表
+    """
+    _, channels = read_bitmap_file(path)
+    os.makedirs(output_dir, exist_ok=True)
+    out_paths = []
+    for name in TEXT_CHANNELS:
+        out_path = os.path.join(output_dir, f"{name}.txt")
+        tmp_path = f"{out_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(",".join(map(str, channels[name].tolist())))
+            f.write("\n")
+        os.replace(tmp_path, out_path)
+        out_paths.append(out_path)
+    return out_paths
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("用法：python -m ChiloMutatorFactory.bitmap_store <bitmap.bin> [输出目录]")
+        sys.exit(1)
+    bin_path = sys.argv[1]
+    for text_path in export_text(bin_path, sys.argv[2] if len(sys.argv) == 3 else os.path.dirname(bin_path)):
+        print(text_path)
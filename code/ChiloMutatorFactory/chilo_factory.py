@@ -4,20 +4,33 @@ chillo的工厂！
 主要定义了FUZZ过程中需要用到的一系列API函数，并封装好~
 """
 import csv
-import importlib.util
+import logging
 import queue
 import os
 import time
 import threading
-import contextlib
 
 import yaml
 from . import ChiloBitMap
 from . import llm_tool
+from . import llm_transport
+from . import llm_cache
+from . import llm_trace
 from . import seed
 from . import ChiloMutator
 from . import logger
 from . import ChiloCoverage
+from . import mutator_cache
+from . import mutator_prefetch
+from . import mutator_executor
+from . import mutator_archive
+from . import telemetry
+from . import bitmap_store
+from . import edge_stability
+from . import queue_feedback
+from . import eager_parse
+from . import seed_schedule
+from . import generation_governor
 
 class ChiloFactory:
     """
@@ -37,7 +50,16 @@ class ChiloFactory:
         self.current_Ai = 0.0                # 当前选中变异器的Ai
         self.current_Bi = 0.0                # 当前选中变异器的Bi
         self.current_Ci = 0.0                # 当前选中变异器的Ci
-        self.current_batch_new_edges = 0     # 当前汤普森采样批次的新边计数
+        self.current_seed_sample = ""        # hierarchical 模式下选中种子臂的采样值，其余情况为空
+        self.current_batch_reward = 0        # 当前汤普森采样批次的奖励（按 ENERGY.REWARD_MODE，默认为新边数）
+        self.current_batch_found_edges = 0   # 当前汤普森采样批次真正发现的新边数（bitmap 反馈模式）
+        self.current_batch_new_entries = 0   # 当前汤普森采样批次记入的 AFL++ 新条目与崩溃数（queue 反馈模式）
+        self.current_batch_exec_count = 0    # 当前汤普森采样批次已执行的次数
+        self.current_exec_seed_id = -1       # 本次执行（mutate_once）实际使用的种子编号，用于新边归因
+        self.current_exec_mutator_index = -1 # 本次执行实际使用的变异器下标，结构化变异为 -1
+        self.current_exec_digest = None      # 本次执行的测试用例摘要，用于不稳定边检测
+        self.current_batch_start_exec = 0    # 当前汤普森采样批次第一次执行的编号，更早的条目不记入本批次
+        self.batch_settle_pending = False    # queue 反馈模式下批次已执行完、等最后一次执行的条目到达后再结算
 
         with open(self.config_file_path, "r", encoding="utf-8") as f:   #读配置文件
             config = yaml.safe_load(f)
@@ -55,7 +77,6 @@ class ChiloFactory:
         # 添加线程锁以保证线程安全
         self.mutator_id_lock = threading.Lock()  # 保护 mutator_id 分配
         self.mutator_pool_lock = threading.Lock()  # 保护 mutator_pool 操作
-        self.csv_lock = threading.Lock()  # 保护 CSV 文件写入
         self.parser_evicted_seed_lock = threading.Lock()  # 保护 parser 淘汰计数
 
         self.main_log_path = config['LOG']['MAIN_LOG_PATH']   #主日志
@@ -84,7 +105,7 @@ class ChiloFactory:
 
         self.wait_parse_list = queue.Queue()   #等待SQL解析的队列
         self.wait_mutator_generate_list = queue.Queue(maxsize=self.mutator_generator_queue_max_size)    #等待变异器生成的队列
-        self.wait_exec_mutator_list = queue.Queue() #等待执行的队列
+        self.wait_exec_mutator_list = ChiloMutator.ChiloExecQueue() #等待执行的队列（按 [变异器, 剩余次数] 游程保存）
         self.structural_mutator_list = queue.LifoQueue()    #等待结构性变异的栈（后进先出，优先处理最新种子）
         # 变异器修复队列使用有界队列，便于在上游进行背压判断
         self.fix_mutator_queue_max_size = config['OTHERS']['FIX_MUTATOR_QUEUE_MAX_SIZE']
@@ -96,14 +117,84 @@ class ChiloFactory:
         self.structural_mutator_path = config['FILE_PATH']['STRUCTURAL_MUTATE_PATH']   #结构化变异的文件路径
         self.mutator_fix_tmp_path = config['FILE_PATH']['MUTATOR_FIX_TMP_PATH']
         self.bitmap_path = config['FILE_PATH']['BITMAP']
+        # binary：只写二进制的 bitmap.bin；text：只写旧版的三个逗号分隔文本；both：两种都写
+        self.bitmap_format = config['OTHERS'].get('BITMAP_FORMAT', 'binary')
+        if self.bitmap_format not in ('binary', 'text', 'both'):
+            raise ValueError("配置项 OTHERS.BITMAP_FORMAT 必须为 binary、text 或 both")
+        self.snapshot_interval = config['OTHERS'].get('SNAPSHOT_INTERVAL', 300)  # 每隔多少秒追加一条累计位图增量快照，0为不保存
+        if not isinstance(self.snapshot_interval, (int, float)) or self.snapshot_interval < 0:
+            raise ValueError("配置项 OTHERS.SNAPSHOT_INTERVAL 必须为大于等于 0 的数")
         self.shm_id_path = config['FILE_PATH']['SHMID']
         self.cve_cases_path = config['FILE_PATH'].get('CVE_CASES_PATH', '../../cve_cases/')  # CVE案例文件夹路径
+        # 变异器编译后字节码的落盘目录，默认与生成的变异器目录同级（不能放在变异器目录内，否则重启时该目录非空）
+        self.mutator_bytecode_path = config['FILE_PATH'].get(
+            'MUTATOR_BYTECODE_PATH',
+            os.path.join(os.path.dirname(os.path.normpath(self.generated_mutator_path)), 'mutator_bytecode'))
+        # 退役变异器的归档目录，默认与生成的变异器目录同级
+        self.mutator_archive_path = config['FILE_PATH'].get(
+            'MUTATOR_ARCHIVE_PATH',
+            os.path.join(os.path.dirname(os.path.normpath(self.generated_mutator_path)), 'mutator_archive'))
+        # LLM 回复缓存文件，默认与生成的变异器目录同级，重启后继续使用
+        self.llm_cache_path = config['FILE_PATH'].get(
+            'LLM_CACHE_PATH',
+            os.path.join(os.path.dirname(os.path.normpath(self.generated_mutator_path)), 'llm_cache', 'responses.sqlite3'))
+        # LLM 调用录制/回放的 trace 文件，默认与生成的变异器目录同级
+        self.llm_trace_path = config['FILE_PATH'].get(
+            'LLM_TRACE_PATH',
+            os.path.join(os.path.dirname(os.path.normpath(self.generated_mutator_path)), 'llm_trace', 'trace.jsonl'))
 
-        self.mutator_pool = ChiloMutator.ChiloMutatorPool(self.generated_mutator_path)  #一个变异器池
         self.all_seed_list = seed.AFLSeedList() #收到的所有seed的列表
 
         self.parser_evicted_seed_count = 0  # 全局统计被淘汰的种子数量
 
+        # AFL++ 新队列条目的提前解析：queue_new_entry 登记新条目，解析器空闲时按新颖度提前解析
+        eager_config = config.get('EAGER_PARSE', {})
+        self.enable_eager_parse = eager_config.get('ENABLE', False)
+        self.eager_parse_max_pending = eager_config.get('MAX_PENDING', 1024)  # 最多排队等待提前解析的条目数
+        if not isinstance(self.eager_parse_max_pending, int) or self.eager_parse_max_pending <= 0:
+            raise ValueError("配置项 EAGER_PARSE.MAX_PENDING 必须为大于 0 的整数")
+        self.eager_parse_queue = None
+        if self.enable_eager_parse:
+            self.eager_parse_queue = eager_parse.EagerParseQueue(self.eager_parse_max_pending)
+
+        # queue_get 钩子：按种子饱和度跳过（或按概率跳过）AFL++ 选中的种子
+        schedule_config = config.get('SEED_SCHEDULE', {})
+        self.enable_seed_schedule = schedule_config.get('ENABLE', False)
+        self.seed_schedule_mode = schedule_config.get('MODE', 'weighted')  # skip：饱和度达到阈值时跳过；weighted：以饱和度为概率跳过
+        if self.seed_schedule_mode not in ('skip', 'weighted'):
+            raise ValueError("配置项 SEED_SCHEDULE.MODE 必须为 skip 或 weighted")
+        self.seed_skip_threshold = schedule_config.get('SKIP_THRESHOLD', 0.8)  # skip 模式下饱和度达到该值则跳过
+        if not isinstance(self.seed_skip_threshold, (int, float)) or not 0 < self.seed_skip_threshold <= 1:
+            raise ValueError("配置项 SEED_SCHEDULE.SKIP_THRESHOLD 必须为 (0, 1] 之间的数")
+        self.seed_max_skip_prob = schedule_config.get('MAX_SKIP_PROB', 0.95)  # 跳过的最大概率，饱和的种子偶尔仍会被执行
+        if not isinstance(self.seed_max_skip_prob, (int, float)) or not 0 <= self.seed_max_skip_prob <= 1:
+            raise ValueError("配置项 SEED_SCHEDULE.MAX_SKIP_PROB 必须为 [0, 1] 之间的数")
+        # 变异器生成调控：限制每个种子的变异器生成次数，没有收益证据时复用已有的变异器
+        governor_config = config.get('GOVERNOR', {})
+        self.enable_generation_governor = governor_config.get('ENABLE', False)
+        self.max_mutators_per_seed = governor_config.get('MAX_MUTATORS_PER_SEED', 8)  # 每个种子最多生成多少次变异器
+        if not isinstance(self.max_mutators_per_seed, int) or self.max_mutators_per_seed <= 0:
+            raise ValueError("配置项 GOVERNOR.MAX_MUTATORS_PER_SEED 必须为大于 0 的整数")
+        self.governor_similarity_threshold = governor_config.get('SIMILARITY_THRESHOLD', 0.3)  # 平均重复率低于该值时继续生成
+        if not isinstance(self.governor_similarity_threshold, (int, float)) or not 0 <= self.governor_similarity_threshold <= 1:
+            raise ValueError("配置项 GOVERNOR.SIMILARITY_THRESHOLD 必须为 [0, 1] 之间的数")
+        self.governor_retry_interval = governor_config.get('RETRY_INTERVAL', 300)  # 上一次生成多少秒后仍未得到变异器则允许重试
+        if not isinstance(self.governor_retry_interval, (int, float)) or self.governor_retry_interval < 0:
+            raise ValueError("配置项 GOVERNOR.RETRY_INTERVAL 必须为大于等于 0 的数")
+        self.generation_governor = None
+        if self.enable_generation_governor:
+            self.generation_governor = generation_governor.GenerationGovernor(
+                self.max_mutators_per_seed, self.governor_similarity_threshold, self.governor_retry_interval)
+
+        self.seed_saturation = None
+        if self.enable_seed_schedule:
+            self.seed_saturation = seed_schedule.SeedSaturationIndex(
+                schedule_config.get('MIN_TRIALS', 20),        # 后验证据权重的半饱和批次数
+                schedule_config.get('SUCCESS_REF', 0.1),      # 后验均值达到该值视为完全不饱和
+                schedule_config.get('RECENT_DECAY', 0.99),    # 最近奖励每结算一个批次的衰减系数
+                schedule_config.get('RECENT_SCALE', 10.0),    # 最近奖励的尺度
+                schedule_config.get('PENDING_SCALE', 4.0))    # 正在流水线中的任务数的尺度
+
 
         self.fix_mutator_try_time = config['OTHERS']['FIX_MUTATOR_TRY_TIME']
         self.semantic_fix_max_time = config['OTHERS']['SEMANTIC_FIX_MAX_TIME']
@@ -131,6 +222,204 @@ class ChiloFactory:
         self.energy_exchange_rate = energy_config.get('ENERGY_EXCHANGE_RATE', 1)  # 能量兑换率
         self.random_energy_min = energy_config.get('RANDOM_ENERGY_MIN', 50)  # 随机能量最小值
         self.random_energy_max = energy_config.get('RANDOM_ENERGY_MAX', 200)  # 随机能量最大值
+        self.selection_mode = energy_config.get('SELECTION_MODE', 'flat')  # flat：对全部变异器打分；hierarchical：先选种子再选变异器
+        if self.selection_mode not in ('flat', 'hierarchical'):
+            raise ValueError("配置项 ENERGY.SELECTION_MODE 必须为 flat 或 hierarchical")
+        self.seed_collapse_threshold = energy_config.get('SEED_COLLAPSE_THRESHOLD', 0.02)  # 种子后验均值低于该值视为坍缩
+        if not isinstance(self.seed_collapse_threshold, (int, float)) or not 0 <= self.seed_collapse_threshold <= 1:
+            raise ValueError("配置项 ENERGY.SEED_COLLAPSE_THRESHOLD 必须为 0 到 1 之间的数")
+        self.seed_collapse_min_trials = energy_config.get('SEED_COLLAPSE_MIN_TRIALS', 50)  # 判定坍缩前至少结算的批次数
+        if not isinstance(self.seed_collapse_min_trials, int) or self.seed_collapse_min_trials <= 0:
+            raise ValueError("配置项 ENERGY.SEED_COLLAPSE_MIN_TRIALS 必须为大于 0 的整数")
+        if 'REWARD_MODEL' in energy_config:   # 与 ENERGY.REWARD_MODE 只差一个字母，已改名
+            raise ValueError("配置项 ENERGY.REWARD_MODEL 已改名为 ENERGY.HISTORY_MODE")
+        self.history_mode = energy_config.get('HISTORY_MODE', 'stationary')  # stationary：累计全部历史；discounted：折扣；window：滑动窗口
+        if self.history_mode not in ('stationary', 'discounted', 'window'):
+            raise ValueError("配置项 ENERGY.HISTORY_MODE 必须为 stationary、discounted 或 window")
+        self.discount_factor = energy_config.get('DISCOUNT_FACTOR', 0.999)  # discounted 模式下每结算一个批次的衰减系数
+        if not isinstance(self.discount_factor, (int, float)) or not 0 < self.discount_factor <= 1:
+            raise ValueError("配置项 ENERGY.DISCOUNT_FACTOR 必须为 (0, 1] 之间的数")
+        self.window_size = energy_config.get('WINDOW_SIZE', 50)  # window 模式下每个变异器保留的最近批次数
+        if not isinstance(self.window_size, int) or self.window_size <= 0:
+            raise ValueError("配置项 ENERGY.WINDOW_SIZE 必须为大于 0 的整数")
+        # edges：新边数作为奖励；buckets：新命中次数桶数（包含新边）作为奖励；rarity：命中边的稀有度之和作为奖励
+        self.reward_mode = energy_config.get('REWARD_MODE', 'edges')
+        if self.reward_mode not in ('edges', 'buckets', 'rarity'):
+            raise ValueError("配置项 ENERGY.REWARD_MODE 必须为 edges、buckets 或 rarity")
+        # rarity 模式下，批次的平均每次稀有度与该基线比较判定成功，基线按该比例向每个批次的平均值移动
+        self.rarity_baseline_rate = energy_config.get('RARITY_BASELINE_RATE', 0.05)
+        if not isinstance(self.rarity_baseline_rate, (int, float)) or not 0 < self.rarity_baseline_rate <= 1:
+            raise ValueError("配置项 ENERGY.RARITY_BASELINE_RATE 必须为 (0, 1] 之间的数")
+        self.rarity_baseline = None     # 每次执行的稀有度基线，第一个批次结算时初始化
+        # bitmap：每次执行后在 post_run 中合并共享内存位图算奖励；queue：只在 AFL++ 保存新条目（或崩溃）时给对应变异器记奖励
+        self.feedback_mode = energy_config.get('FEEDBACK_MODE', 'bitmap')
+        if self.feedback_mode not in ('bitmap', 'queue'):
+            raise ValueError("配置项 ENERGY.FEEDBACK_MODE 必须为 bitmap 或 queue")
+        if self.feedback_mode == 'queue' and self.reward_mode == 'rarity':
+            raise ValueError("配置项 ENERGY.REWARD_MODE 为 rarity 时 ENERGY.FEEDBACK_MODE 必须为 bitmap")
+        # queue 模式下每隔多少次执行仍合并一次共享内存位图（维持 bitmap.bin 和覆盖率曲线），0为从不合并
+        self.feedback_sample_interval = energy_config.get('FEEDBACK_SAMPLE_INTERVAL', 100)
+        if not isinstance(self.feedback_sample_interval, int) or self.feedback_sample_interval < 0:
+            raise ValueError("配置项 ENERGY.FEEDBACK_SAMPLE_INTERVAL 必须为大于等于 0 的整数")
+        self.crash_reward = energy_config.get('CRASH_REWARD', 10)  # queue 模式下一个崩溃折合的奖励（一个新条目为 1）
+        if not isinstance(self.crash_reward, (int, float)) or self.crash_reward < 0:
+            raise ValueError("配置项 ENERGY.CRASH_REWARD 必须为大于等于 0 的数")
+        self.queue_feedback_stats = queue_feedback.QueueFeedbackStats()
+        self.crash_scanner = None       # queue 模式下扫描 crashes 目录
+        if self.feedback_mode == 'queue':
+            self.crash_scanner = queue_feedback.CrashScanner(os.path.join(self.afl_output_dir, "default", "crashes"))
+
+        # 不稳定边检测：相同测试用例再次执行时命中的边发生翻转，则不再把这些边计入奖励
+        flaky_config = config.get('FLAKY', {})
+        self.enable_flaky_detection = flaky_config.get('ENABLE', False)
+        self.calibration_interval = flaky_config.get('CALIBRATION_INTERVAL', 1000)  # 至少每隔多少次fuzz在批次开始时重放一次上一个测试用例，0为只被动比较重复输出
+        if not isinstance(self.calibration_interval, int) or self.calibration_interval < 0:
+            raise ValueError("配置项 FLAKY.CALIBRATION_INTERVAL 必须为大于等于 0 的整数")
+        self.flaky_history_size = flaky_config.get('HISTORY_SIZE', 256)  # 记住最近多少个测试用例的命中下标
+        if not isinstance(self.flaky_history_size, int) or self.flaky_history_size <= 0:
+            raise ValueError("配置项 FLAKY.HISTORY_SIZE 必须为大于 0 的整数")
+        self.flaky_min_toggles = flaky_config.get('MIN_TOGGLES', 2)  # 一条边翻转多少次后标记为不稳定
+        if not isinstance(self.flaky_min_toggles, int) or self.flaky_min_toggles <= 0:
+            raise ValueError("配置项 FLAKY.MIN_TOGGLES 必须为大于 0 的整数")
+        self.mutator_pool = ChiloMutator.ChiloMutatorPool(self.generated_mutator_path, self.selection_mode,
+                                                          self.seed_collapse_threshold,
+                                                          self.seed_collapse_min_trials, self.history_mode,
+                                                          self.discount_factor, self.window_size)  #一个变异器池
+
+        # 变异器执行配置
+        exec_config = config.get('MUTATOR_EXEC', {})
+        self.mutator_cache_size = exec_config.get('CACHE_SIZE', 256)  # 内存中缓存的变异器模块个数
+        if not isinstance(self.mutator_cache_size, int) or self.mutator_cache_size <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.CACHE_SIZE 必须为大于 0 的整数")
+        self.enable_prefetch = exec_config.get('ENABLE_PREFETCH', True)  # 是否在后台预渲染变异结果
+        self.prefetch_max_size = exec_config.get('PREFETCH_MAX_SIZE', 256)  # 预渲染环形缓冲区最大容量
+        if not isinstance(self.prefetch_max_size, int) or self.prefetch_max_size <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.PREFETCH_MAX_SIZE 必须为大于 0 的整数")
+        self.mutator_exec_mode = exec_config.get('MODE', 'inprocess')  # inprocess：进程内执行；isolated：在工作进程池中隔离执行
+        if self.mutator_exec_mode not in ('inprocess', 'isolated'):
+            raise ValueError("配置项 MUTATOR_EXEC.MODE 必须为 inprocess 或 isolated")
+        self.mutator_worker_count = exec_config.get('WORKER_COUNT', 2)  # 隔离执行的工作进程个数
+        if not isinstance(self.mutator_worker_count, int) or self.mutator_worker_count <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.WORKER_COUNT 必须为大于 0 的整数")
+        self.mutator_call_timeout = exec_config.get('CALL_TIMEOUT', 1.0)  # 单次 mutate() 的墙钟超时（秒）
+        if not isinstance(self.mutator_call_timeout, (int, float)) or self.mutator_call_timeout <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.CALL_TIMEOUT 必须为大于 0 的数")
+        self.mutator_memory_limit_mb = exec_config.get('MEMORY_LIMIT_MB', 512)  # 每个工作进程额外可用的内存（MB），0为不限制
+        if not isinstance(self.mutator_memory_limit_mb, int) or self.mutator_memory_limit_mb < 0:
+            raise ValueError("配置项 MUTATOR_EXEC.MEMORY_LIMIT_MB 必须为大于等于 0 的整数")
+        self.mutator_batch_size = exec_config.get('BATCH_SIZE', 32)  # 预渲染时一次请求渲染的个数
+        if not isinstance(self.mutator_batch_size, int) or self.mutator_batch_size <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.BATCH_SIZE 必须为大于 0 的整数")
+        self.mutator_error_max_retry = exec_config.get('ERROR_MAX_RETRY', 5)  # 变异器出错时最多改选几次其他变异器
+        if not isinstance(self.mutator_error_max_retry, int) or self.mutator_error_max_retry <= 0:
+            raise ValueError("配置项 MUTATOR_EXEC.ERROR_MAX_RETRY 必须为大于 0 的整数")
+
+        # 变异器池退役配置
+        retire_config = config.get('POOL_RETIRE', {})
+        self.enable_pool_retire = retire_config.get('ENABLE', False)  # 是否启用变异器退役
+        self.retire_zero_edge_batches = retire_config.get('ZERO_EDGE_BATCHES', 20)  # 连续多少个批次没有新边则退役，0为不检查
+        if not isinstance(self.retire_zero_edge_batches, int) or self.retire_zero_edge_batches < 0:
+            raise ValueError("配置项 POOL_RETIRE.ZERO_EDGE_BATCHES 必须为大于等于 0 的整数")
+        self.retire_max_error_count = retire_config.get('MAX_ERROR_COUNT', 5)  # 出错多少次则退役，0为不检查
+        if not isinstance(self.retire_max_error_count, int) or self.retire_max_error_count < 0:
+            raise ValueError("配置项 POOL_RETIRE.MAX_ERROR_COUNT 必须为大于等于 0 的整数")
+        self.max_active_pool_size = retire_config.get('MAX_ACTIVE_SIZE', 5000)  # 可参与选择的变异器个数上限，0为不限制
+        if not isinstance(self.max_active_pool_size, int) or self.max_active_pool_size < 0:
+            raise ValueError("配置项 POOL_RETIRE.MAX_ACTIVE_SIZE 必须为大于等于 0 的整数")
+        self.revive_interval = retire_config.get('REVIVE_INTERVAL', 1000)  # 每结算多少个批次复活一个退役的变异器，0为不复活
+        if not isinstance(self.revive_interval, int) or self.revive_interval < 0:
+            raise ValueError("配置项 POOL_RETIRE.REVIVE_INTERVAL 必须为大于等于 0 的整数")
+        self.settled_batch_count = 0    # 已结算的变异器池批次数
+
+        # LLM 传输层配置：每个端点（BASE_URL + API_KEY）共享连接池、限流、退避和熔断
+        transport_config = config.get('LLM_TRANSPORT', {})
+        self.llm_max_connections = transport_config.get('MAX_CONNECTIONS', 8)  # 每个端点的连接池大小（同时进行的请求数）
+        if not isinstance(self.llm_max_connections, int) or self.llm_max_connections <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.MAX_CONNECTIONS 必须为大于 0 的整数")
+        self.llm_request_timeout = transport_config.get('REQUEST_TIMEOUT', 300)  # 单个请求的超时时间（秒）
+        if not isinstance(self.llm_request_timeout, (int, float)) or self.llm_request_timeout <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.REQUEST_TIMEOUT 必须为大于 0 的数")
+        self.llm_connect_timeout = transport_config.get('CONNECT_TIMEOUT', 10)  # 建立连接的超时时间（秒）
+        if not isinstance(self.llm_connect_timeout, (int, float)) or self.llm_connect_timeout <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.CONNECT_TIMEOUT 必须为大于 0 的数")
+        self.llm_requests_per_minute = transport_config.get('REQUESTS_PER_MINUTE', 0)  # 每个端点每分钟请求数上限，0为不限
+        if not isinstance(self.llm_requests_per_minute, (int, float)) or self.llm_requests_per_minute < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.REQUESTS_PER_MINUTE 必须为大于等于 0 的数")
+        self.llm_tokens_per_minute = transport_config.get('TOKENS_PER_MINUTE', 0)  # 每个端点每分钟 token 数上限，0为不限
+        if not isinstance(self.llm_tokens_per_minute, (int, float)) or self.llm_tokens_per_minute < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.TOKENS_PER_MINUTE 必须为大于等于 0 的数")
+        self.llm_completion_token_estimate = transport_config.get('COMPLETION_TOKEN_ESTIMATE', 1024)  # 预扣 token 时对补全 token 数的估计
+        if not isinstance(self.llm_completion_token_estimate, int) or self.llm_completion_token_estimate < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.COMPLETION_TOKEN_ESTIMATE 必须为大于等于 0 的整数")
+        self.llm_max_attempts = transport_config.get('MAX_ATTEMPTS', 0)  # 可重试错误（429/5xx/超时/连接）的最多尝试次数，0为一直重试
+        if not isinstance(self.llm_max_attempts, int) or self.llm_max_attempts < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.MAX_ATTEMPTS 必须为大于等于 0 的整数")
+        self.llm_bad_request_max_attempts = transport_config.get('BAD_REQUEST_MAX_ATTEMPTS', 2)  # 请求错误（其余 4xx）的最多尝试次数
+        if not isinstance(self.llm_bad_request_max_attempts, int) or self.llm_bad_request_max_attempts <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.BAD_REQUEST_MAX_ATTEMPTS 必须为大于 0 的整数")
+        self.llm_backoff_base = transport_config.get('BACKOFF_BASE', 1.0)  # 退避基准时间（秒）
+        if not isinstance(self.llm_backoff_base, (int, float)) or self.llm_backoff_base <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.BACKOFF_BASE 必须为大于 0 的数")
+        self.llm_backoff_max = transport_config.get('BACKOFF_MAX', 60.0)  # 单次退避的上限（秒）
+        if not isinstance(self.llm_backoff_max, (int, float)) or self.llm_backoff_max < self.llm_backoff_base:
+            raise ValueError("配置项 LLM_TRANSPORT.BACKOFF_MAX 必须为不小于 BACKOFF_BASE 的数")
+        self.llm_breaker_failure_threshold = transport_config.get('BREAKER_FAILURE_THRESHOLD', 5)  # 连续失败多少次熔断，0为不熔断
+        if not isinstance(self.llm_breaker_failure_threshold, int) or self.llm_breaker_failure_threshold < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.BREAKER_FAILURE_THRESHOLD 必须为大于等于 0 的整数")
+        self.llm_breaker_cooldown = transport_config.get('BREAKER_COOLDOWN', 30.0)  # 熔断的冷却时间（秒）
+        if not isinstance(self.llm_breaker_cooldown, (int, float)) or self.llm_breaker_cooldown <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.BREAKER_COOLDOWN 必须为大于 0 的数")
+        self.llm_breaker_max_cooldown = transport_config.get('BREAKER_MAX_COOLDOWN', 300.0)  # 探测失败时冷却时间加倍的上限（秒）
+        if not isinstance(self.llm_breaker_max_cooldown, (int, float)) or self.llm_breaker_max_cooldown < self.llm_breaker_cooldown:
+            raise ValueError("配置项 LLM_TRANSPORT.BREAKER_MAX_COOLDOWN 必须为不小于 BREAKER_COOLDOWN 的数")
+        self.llm_hedge_enable = transport_config.get('HEDGE_ENABLE', False)  # 调用超过最近耗时分位数时向另一个端点发出对冲请求
+        self.llm_hedge_percentile = transport_config.get('HEDGE_PERCENTILE', 0.9)  # 对冲时间取最近调用耗时的哪个分位数
+        if not isinstance(self.llm_hedge_percentile, (int, float)) or not 0 < self.llm_hedge_percentile < 1:
+            raise ValueError("配置项 LLM_TRANSPORT.HEDGE_PERCENTILE 必须为 (0, 1) 之间的数")
+        self.llm_hedge_min_samples = transport_config.get('HEDGE_MIN_SAMPLES', 20)  # 每个阶段至少有多少次调用耗时后才开始对冲
+        if not isinstance(self.llm_hedge_min_samples, int) or self.llm_hedge_min_samples <= 0:
+            raise ValueError("配置项 LLM_TRANSPORT.HEDGE_MIN_SAMPLES 必须为大于 0 的整数")
+        self.llm_hedge_window = transport_config.get('HEDGE_WINDOW', 200)  # 保留最近多少次调用的耗时
+        if not isinstance(self.llm_hedge_window, int) or self.llm_hedge_window < self.llm_hedge_min_samples:
+            raise ValueError("配置项 LLM_TRANSPORT.HEDGE_WINDOW 必须为不小于 HEDGE_MIN_SAMPLES 的整数")
+        self.llm_hedge_min_delay = transport_config.get('HEDGE_MIN_DELAY', 5.0)  # 对冲时间的下限（秒）
+        if not isinstance(self.llm_hedge_min_delay, (int, float)) or self.llm_hedge_min_delay < 0:
+            raise ValueError("配置项 LLM_TRANSPORT.HEDGE_MIN_DELAY 必须为大于等于 0 的数")
+        self.llm_stream = transport_config.get('STREAM', False)  # 流式请求，第一个完整代码块结束后立即结束
+        self.llm_stream_include_usage = transport_config.get('STREAM_INCLUDE_USAGE', True)  # 流式请求是否要求返回用量
+        self.llm_transports = {}        # (BASE_URL, API_KEY) -> LLMTransport
+
+        # LLM 回复缓存：按 hash(模型, 系统提示词, 提示词) 缓存包含代码块的回复，各阶段在 LLM.<阶段>.CACHE_MODE 中选择使用方式
+        cache_config = config.get('LLM_CACHE', {})
+        self.enable_llm_cache = cache_config.get('ENABLE', False)
+        self.llm_cache_max_size_mb = cache_config.get('MAX_SIZE_MB', 256)  # 缓存内容的总大小上限（MB）
+        if not isinstance(self.llm_cache_max_size_mb, (int, float)) or self.llm_cache_max_size_mb <= 0:
+            raise ValueError("配置项 LLM_CACHE.MAX_SIZE_MB 必须为大于 0 的数")
+        self.llm_cache_read_only = cache_config.get('READ_ONLY', False)  # 只读：不写入新回复，用于可复现的基准测试
+        self.llm_cache = None
+        if self.enable_llm_cache:
+            self.llm_cache = llm_cache.LLMResponseCache(self.llm_cache_path, int(self.llm_cache_max_size_mb * 1024 * 1024),
+                                                        self.llm_cache_read_only)
+
+        # LLM 调用录制/回放：record 把每次成功的调用写入 trace，replay 不访问网络、从 trace 中回放（用于离线基准测试）
+        trace_config = config.get('LLM_TRACE', {})
+        self.llm_trace_mode = trace_config.get('MODE', 'off')
+        if self.llm_trace_mode not in ('off', 'record', 'replay'):
+            raise ValueError("配置项 LLM_TRACE.MODE 必须为 off、record 或 replay")
+        self.llm_replay_latency = trace_config.get('REPLAY_LATENCY', 'recorded')  # recorded / none / 固定秒数
+        if self.llm_replay_latency not in ('recorded', 'none') and (
+                not isinstance(self.llm_replay_latency, (int, float)) or self.llm_replay_latency < 0):
+            raise ValueError("配置项 LLM_TRACE.REPLAY_LATENCY 必须为 recorded、none 或大于等于 0 的数")
+        self.llm_replay_latency_scale = trace_config.get('LATENCY_SCALE', 1.0)  # recorded 模式下耗时的系数
+        if not isinstance(self.llm_replay_latency_scale, (int, float)) or self.llm_replay_latency_scale < 0:
+            raise ValueError("配置项 LLM_TRACE.LATENCY_SCALE 必须为大于等于 0 的数")
+        self.llm_trace_recorder = None
+        self.llm_trace_replayer = None
+        if self.llm_trace_mode == 'record':
+            self.llm_trace_recorder = llm_trace.TraceRecorder(self.llm_trace_path)
+        elif self.llm_trace_mode == 'replay':
+            self.llm_trace_replayer = llm_trace.TraceReplayer(self.llm_trace_path, self.llm_replay_latency,
+                                                              self.llm_replay_latency_scale)
 
         #下面是CSV文件
         self.mutator_fixer_csv_path = config['CSV']['MUTATOR_FIXER_CSV_PATH']
@@ -138,50 +427,93 @@ class ChiloFactory:
         self.parser_csv_path = config['CSV']['PARSER_CSV_PATH']
         self.main_csv_path = config['CSV']['MAIN_CSV_PATH']
         self.mutator_generator_csv_path = config['CSV']['MUTATOR_GENERATOR_CSV_PATH']
+        self.pool_csv_path = config['CSV'].get('POOL_CSV_PATH',
+                                               os.path.join(os.path.dirname(self.main_csv_path), 'pool.csv'))
+        self.queue_get_csv_path = config['CSV'].get('QUEUE_GET_CSV_PATH',
+                                                    os.path.join(os.path.dirname(self.main_csv_path), 'queue_get.csv'))
+
+        # CSV后台批量写入配置
+        telemetry_config = config.get('TELEMETRY', {})
+        self.csv_flush_rows = telemetry_config.get('FLUSH_ROWS', 256)  # 积累多少行立即写入
+        if not isinstance(self.csv_flush_rows, int) or self.csv_flush_rows <= 0:
+            raise ValueError("配置项 TELEMETRY.FLUSH_ROWS 必须为大于 0 的整数")
+        self.csv_flush_interval = telemetry_config.get('FLUSH_INTERVAL', 1.0)  # 最长多久写入一次（秒）
+        if not isinstance(self.csv_flush_interval, (int, float)) or self.csv_flush_interval <= 0:
+            raise ValueError("配置项 TELEMETRY.FLUSH_INTERVAL 必须为大于 0 的数")
+        self.csv_max_queue = telemetry_config.get('MAX_QUEUE', 100000)  # 每个CSV待写入队列的最大行数，超过后丢弃
+        if not isinstance(self.csv_max_queue, int) or self.csv_max_queue <= 0:
+            raise ValueError("配置项 TELEMETRY.MAX_QUEUE 必须为大于 0 的整数")
 
         self.init_file_path()  # 初始化所有文件路径
 
-        self.main_logger = logger.setup_thread_logger("MainMutator", self.main_log_path)
-        self.parser_logger = logger.setup_thread_logger("Parser", self.parser_log_path)
-        self.mutator_generator_logger = logger.setup_thread_logger("MutatorGenerator", self.mutator_generator_log_path)
-        self.structural_mutator_logger = logger.setup_thread_logger("StructuralMutator", self.structural_mutator_log_path)
-        self.mutator_fixer_logger = logger.setup_thread_logger("MutatorFixer", self.mutator_fixer_log_path)
-        self.llm_logger = logger.setup_thread_logger("LLM", self.llm_log_path)
-
-        # 为三个不同的任务创建独立的LLM工具实例
-        self.llm_tool_parser = llm_tool.LLMTool(
-            config['LLM']['LLM_PARSER']['API_KEY'], 
-            config['LLM']['LLM_PARSER']['MODEL'],
-            config['LLM']['LLM_PARSER']['BASE_URL'], 
-            self.llm_logger
-        )
-        
-        self.llm_tool_mutator_generator = llm_tool.LLMTool(
-            config['LLM']['LLM_MUTATOR_GENERATOR']['API_KEY'], 
-            config['LLM']['LLM_MUTATOR_GENERATOR']['MODEL'],
-            config['LLM']['LLM_MUTATOR_GENERATOR']['BASE_URL'], 
-            self.llm_logger
-        )
-        
-        self.llm_tool_structural_mutator = llm_tool.LLMTool(
-            config['LLM']['LLM_STRUCTURAL_MUTATOR']['API_KEY'], 
-            config['LLM']['LLM_STRUCTURAL_MUTATOR']['MODEL'],
-            config['LLM']['LLM_STRUCTURAL_MUTATOR']['BASE_URL'], 
-            self.llm_logger
-        )
-        
+        # 日志配置（不放在 LOG 中，ChiloDisco 会把 LOG 下的每一项都当作日志路径）
+        self.logging_config = config.get('LOGGING', {})
+
+        self.main_logger = self.open_logger("MainMutator", self.main_log_path)
+        self.parser_logger = self.open_logger("Parser", self.parser_log_path)
+        self.mutator_generator_logger = self.open_logger("MutatorGenerator", self.mutator_generator_log_path)
+        self.structural_mutator_logger = self.open_logger("StructuralMutator", self.structural_mutator_log_path)
+        self.mutator_fixer_logger = self.open_logger("MutatorFixer", self.mutator_fixer_log_path)
+        self.llm_logger = self.open_logger("LLM", self.llm_log_path)
+
+        # 每个CSV一个后台批量写入器（表头已在 init_file_path 中写好）
+        self.main_csv_sink = self.open_csv_sink(self.main_csv_path)
+        self.parser_csv_sink = self.open_csv_sink(self.parser_csv_path)
+        self.mutator_generator_csv_sink = self.open_csv_sink(self.mutator_generator_csv_path)
+        self.mutator_fixer_csv_sink = self.open_csv_sink(self.mutator_fixer_csv_path)
+        self.structural_mutator_csv_sink = self.open_csv_sink(self.structural_mutator_csv_path)
+        self.pool_csv_sink = self.open_csv_sink(self.pool_csv_path)
+        self.csv_sinks = [self.main_csv_sink, self.parser_csv_sink, self.mutator_generator_csv_sink,
+                          self.mutator_fixer_csv_sink, self.structural_mutator_csv_sink, self.pool_csv_sink]
+        self.queue_get_csv_sink = None  # 只在启用 SEED_SCHEDULE 时记录 queue_get 的决定
+        if self.enable_seed_schedule:
+            self.queue_get_csv_sink = self.open_csv_sink(self.queue_get_csv_path)
+            self.csv_sinks.append(self.queue_get_csv_sink)
+
+        # 为不同的任务创建独立的LLM工具实例，使用同一端点的实例共享一个传输层
+        # 解析结果没有必要多样，默认总是使用回复缓存；生成类阶段需要多样性，默认不使用
+        self.llm_tool_parser = self.open_llm_tool(config['LLM']['LLM_PARSER'], "parser", "sql", llm_cache.ALWAYS)
+        self.llm_tool_mutator_generator = self.open_llm_tool(config['LLM']['LLM_MUTATOR_GENERATOR'],
+                                                             "mutator_generator", "python", llm_cache.OFF)
+        self.llm_tool_structural_mutator = self.open_llm_tool(config['LLM']['LLM_STRUCTURAL_MUTATOR'],
+                                                              "structural_mutator", "sql", llm_cache.OFF)
         # Fixer使用的LLM工具
-        self.llm_tool_fixer = llm_tool.LLMTool(
-            config['LLM']['LLM_FIXER']['API_KEY'],
-            config['LLM']['LLM_FIXER']['MODEL'],
-            config['LLM']['LLM_FIXER']['BASE_URL'],
-            self.llm_logger
-        )
+        self.llm_tool_fixer = self.open_llm_tool(config['LLM']['LLM_FIXER'], "fixer", "python", llm_cache.OFF)
 
         # 初始化 AFL++ 覆盖率读取器
         self.coverage_reader = ChiloCoverage.AFLCoverageReader(self.shm_id_path)
 
-        self.bitmap = ChiloBitMap.BitMap(self.coverage_reader.map_size) #总mapsize图
+        self.bitmap = ChiloBitMap.BitMap(self.coverage_reader.map_size, self.reward_mode == 'rarity') #总mapsize图
+        self.snapshot_writer = None     # 累计位图的增量快照（snapshots.bin）
+        if self.snapshot_interval > 0:
+            self.snapshot_writer = bitmap_store.SnapshotWriter(os.path.join(self.bitmap_path, "snapshots.bin"))
+        self.last_snapshot_time = time.time()
+        self.edge_stability = None      # 不稳定边检测器，FLAKY.ENABLE 为 false 时不创建
+        if self.enable_flaky_detection:
+            self.edge_stability = edge_stability.EdgeStabilityTracker(
+                self.coverage_reader.map_size, self.flaky_history_size, self.flaky_min_toggles,
+                os.path.join(self.bitmap_path, edge_stability.INSTABILITY_FILE_NAME))
+            self.bitmap.unstable_mask = self.edge_stability.unstable_mask
+
+        # 已加载变异器的LRU缓存，避免每次fuzz都重新import变异器文件
+        self.mutator_cache = mutator_cache.MutatorCache(self.mutator_cache_size, self.mutator_bytecode_path)
+        # 变异器执行后端，isolated 模式下死循环/内存爆炸的变异器不会拖垮AFL++进程
+        if self.mutator_exec_mode == 'isolated':
+            self.mutator_executor = mutator_executor.IsolatedMutatorExecutor(
+                self.mutator_worker_count, self.mutator_call_timeout, self.mutator_memory_limit_mb,
+                self.mutator_cache_size, self.mutator_bytecode_path, self.main_logger)
+        else:
+            self.mutator_executor = mutator_executor.InProcessMutatorExecutor(self.mutator_cache)
+        # 预渲染缓冲区，fuzz_count 选定变异器后在后台提前生成测试用例
+        self.prefetcher = None
+        if self.enable_prefetch:
+            self.prefetcher = mutator_prefetch.MutatorPrefetcher(self.render_mutator_batch, self.prefetch_max_size,
+                                                                 self.mutator_batch_size, self.main_logger,
+                                                                 self.record_mutator_error)
+        # 退役变异器的归档
+        self.mutator_archive = None
+        if self.enable_pool_retire:
+            self.mutator_archive = mutator_archive.MutatorArchive(self.mutator_archive_path)
 
     def init_file_path(self):
         """
@@ -229,6 +561,7 @@ class ChiloFactory:
         structural_mutator_csv_dir =  os.path.dirname(self.structural_mutator_csv_path)
         parser_csv_dir =  os.path.dirname(self.parser_csv_path)
         mutator_generator_csv_dir =  os.path.dirname(self.mutator_generator_csv_path)
+        pool_csv_dir =  os.path.dirname(self.pool_csv_path)
         bitmap_dir =  os.path.dirname(self.bitmap_path)
         os.makedirs(main_log_dir, exist_ok=True)  # 不存在就自动创建
         os.makedirs(parser_log_dir, exist_ok=True)  # 不存在就自动创建
@@ -242,6 +575,7 @@ class ChiloFactory:
         os.makedirs(parser_csv_dir, exist_ok=True)
         os.makedirs(main_csv_dir, exist_ok=True)
         os.makedirs(mutator_generator_csv_dir, exist_ok=True)
+        os.makedirs(pool_csv_dir, exist_ok=True)
         os.makedirs(bitmap_dir, exist_ok=True)
 
         with open(self.parser_csv_path, mode='a', newline='', encoding='utf-8') as f:
@@ -250,7 +584,8 @@ class ChiloFactory:
                              "need_mutate_count", "is_parsed", "LLM_use_time",
                              "up_token", "down_token", "LLM_count", "LLM_format_error_count",
                              "all_use_time", "select_count","left_parser_queue_count", "evicted_seed_total",
-                             "mask_count"])
+                             "mask_count", "is_eager", "eager_hit_rate", "governor_decision", "governor_reason",
+                             "saved_tokens"] + llm_transport.CSV_COLUMNS)
         with open(self.mutator_fixer_csv_path, mode='a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(["real_time", "relative_time", "seed_id", "mutator_id",
@@ -263,14 +598,14 @@ class ChiloFactory:
                              "semantic_error_llm_use_time",
                              "semantic_error_llm_count","semantic_llm_format_error",
                              "semantic_up_token", "semantic_down_token","left_fix_queue_count", "at_last_is_all_correct",
-                             "mask_count", "similarity", "unique_count", "total_count"])
+                             "mask_count", "similarity", "unique_count", "total_count"] + llm_transport.CSV_COLUMNS)
 
         with open(self.structural_mutator_csv_path, mode='a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(["real_time", "relative_time", "seed_id", "new_seed_id",
                              "all_use_time", "llm_up_token", "llm_down_token", "llm_count",
                              "llm_format_error_count", "llm_use_time",
-                             "left_structural_mutate_queue_count"])
+                             "left_structural_mutate_queue_count"] + llm_transport.CSV_COLUMNS)
 
         with open(self.main_csv_path, mode='a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
@@ -279,12 +614,23 @@ class ChiloFactory:
                              "real_fuzz_seed_id", "real_mutator_id","left_wait_exec_queue_count",
                              "ori_mutate_out_size", "real_mutate_out_size", "is_cut",
                               "is_error_occur", "is_from_structural_mutator",
-                             "thompson_score", "left_fuzz_count", "Ai", "Bi", "Ci"])
+                             "thompson_score", "left_fuzz_count", "Ai", "Bi", "Ci", "seed_sample", "new_edges"])
         with open(self.mutator_generator_csv_path, mode='a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(["real_time", "relative_time", "seed_id", "use_all_time", "llm_use_time",
                              "llm_up_token", "llm_down_token", "llm_count",
-                             "llm_error_count", "left_mutator_generate_queue_count"])
+                             "llm_error_count", "left_mutator_generate_queue_count"] + llm_transport.CSV_COLUMNS)
+        with open(self.pool_csv_path, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["real_time", "relative_time", "event", "reason", "mutator_index",
+                             "seed_id", "mutator_id", "success_count", "failure_count", "total_new_edges",
+                             "error_count", "active_pool_size", "retired_pool_size"])
+        if self.enable_seed_schedule:
+            os.makedirs(os.path.dirname(self.queue_get_csv_path), exist_ok=True)
+            with open(self.queue_get_csv_path, mode='a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(["real_time", "relative_time", "queue_entry", "seed_id", "saturation",
+                                 "posterior_mean", "trials", "recent_reward", "pending", "decision"])
                              
     def record_parser_eviction(self):
         """
@@ -301,10 +647,155 @@ class ChiloFactory:
         with self.parser_evicted_seed_lock:
             return self.parser_evicted_seed_count
 
+    def open_logger(self, stage_name, log_path):
+        """
+        按 LOGGING 配置创建某个阶段的日志对象，LOGGING.STAGES.<阶段名> 中的配置项覆盖全局配置
+        :param stage_name: 阶段名（MainMutator/Parser/MutatorGenerator/StructuralMutator/MutatorFixer/LLM）
+        :param log_path: 日志文件路径
+        :return: logger 对象
+        """
+        stage_config = dict(self.logging_config)
+        stage_config.update(self.logging_config.get('STAGES', {}).get(stage_name, {}))
+        prefix = f"LOGGING.STAGES.{stage_name}" if stage_name in self.logging_config.get('STAGES', {}) else "LOGGING"
+
+        level = stage_config.get('LEVEL', 'INFO')  # 日志级别
+        if not isinstance(level, str) or not isinstance(logging.getLevelName(level.upper()), int):
+            raise ValueError(f"配置项 {prefix}.LEVEL 必须为 DEBUG/INFO/WARNING/ERROR/CRITICAL 之一")
+        sample_rate = stage_config.get('SAMPLE_RATE', 1)  # 每次执行都会打印的日志每多少条保留 1 条，1为不采样
+        if not isinstance(sample_rate, int) or sample_rate <= 0:
+            raise ValueError(f"配置项 {prefix}.SAMPLE_RATE 必须为大于 0 的整数")
+        max_bytes = stage_config.get('MAX_BYTES', 0)  # 单个日志文件最大字节数，超过后轮转，0为不轮转
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise ValueError(f"配置项 {prefix}.MAX_BYTES 必须为大于等于 0 的整数")
+        backup_count = stage_config.get('BACKUP_COUNT', 5)  # 轮转后保留的历史日志个数
+        if not isinstance(backup_count, int) or backup_count <= 0:
+            raise ValueError(f"配置项 {prefix}.BACKUP_COUNT 必须为大于 0 的整数")
+        compress = stage_config.get('COMPRESS', True)  # 历史日志是否用 gzip 压缩
+
+        return logger.setup_thread_logger(stage_name, log_path, level.upper(), sample_rate,
+                                          max_bytes, backup_count, compress)
+
+    def open_csv_sink(self, csv_path):
+        """
+        为一个CSV文件创建后台批量写入器
+        :param csv_path: CSV文件路径
+        :return: CsvSink 对象
+        """
+        return telemetry.CsvSink(csv_path, self.csv_flush_rows, self.csv_flush_interval, self.csv_max_queue,
+                                 self.main_logger)
+
+    def open_llm_tool(self, stage_config, stage, stream_language, default_cache_mode):
+        """
+        创建一个阶段的LLM工具
+        :param stage_config: LLM 配置中该阶段的一项（API_KEY、MODEL、BASE_URL）；
+                             也可以给出 ENDPOINTS 列表，每一项为 BASE_URL、API_KEY、MODEL（默认同该阶段）、WEIGHT（默认 1）
+        :param stage: 阶段名，录制/回放 trace 时使用
+        :param stream_language: 该阶段从回复中提取的代码块语言（sql / python），流式模式下该代码块结束后立即结束请求
+        :param default_cache_mode: 该阶段未配置 CACHE_MODE 时的回复缓存使用方式
+        :return: LLMTool
+        """
+        cache_mode = stage_config.get('CACHE_MODE', default_cache_mode)  # always / sample / off
+        if cache_mode not in llm_cache.MODES:
+            raise ValueError("配置项 LLM.*.CACHE_MODE 必须为 always、sample 或 off")
+        cache_sample_rate = stage_config.get('CACHE_SAMPLE_RATE', 0.2)  # sample 方式下使用缓存中回复的概率
+        if not isinstance(cache_sample_rate, (int, float)) or not 0 <= cache_sample_rate <= 1:
+            raise ValueError("配置项 LLM.*.CACHE_SAMPLE_RATE 必须为 [0, 1] 之间的数")
+        endpoint_configs = stage_config.get('ENDPOINTS') or [stage_config]
+        endpoints = []
+        for endpoint_config in endpoint_configs:
+            weight = endpoint_config.get('WEIGHT', 1)
+            if not isinstance(weight, (int, float)) or weight <= 0:
+                raise ValueError("配置项 LLM.*.ENDPOINTS[].WEIGHT 必须为大于 0 的数")
+            model = endpoint_config.get('MODEL', stage_config.get('MODEL'))
+            if not isinstance(model, str) or not model:
+                raise ValueError(f"配置项 LLM.*.ENDPOINTS[].MODEL 未配置（阶段 {stage} 也没有配置 MODEL）")
+            endpoints.append(llm_tool.LLMEndpoint(
+                self.open_llm_transport(endpoint_config['BASE_URL'], endpoint_config['API_KEY']), model, weight))
+        hedge_policy = None
+        if self.llm_hedge_enable:
+            hedge_policy = llm_tool.HedgePolicy(self.llm_hedge_percentile, self.llm_hedge_min_samples,
+                                                self.llm_hedge_window, self.llm_hedge_min_delay)
+        first = endpoint_configs[0]
+        return llm_tool.LLMTool(first['API_KEY'], endpoints[0].model, first['BASE_URL'], self.llm_logger,
+                                endpoints=endpoints, hedge_policy=hedge_policy, stream_language=stream_language,
+                                cache=self.llm_cache, cache_mode=cache_mode, cache_sample_rate=cache_sample_rate,
+                                stage=stage, trace_recorder=self.llm_trace_recorder,
+                                trace_replayer=self.llm_trace_replayer)
+
+    def open_llm_transport(self, base_url, api_key):
+        """
+        同一端点（BASE_URL + API_KEY）只创建一个传输层，由使用它的所有阶段共享
+        :param base_url: 端点的 BASE_URL
+        :param api_key: 端点的 API_KEY
+        :return: LLMTransport
+        """
+        endpoint = (base_url, api_key)
+        transport = self.llm_transports.get(endpoint)
+        if transport is None:
+            transport = llm_transport.LLMTransport(
+                base_url, api_key, self.llm_logger,
+                max_connections=self.llm_max_connections,
+                request_timeout=self.llm_request_timeout,
+                connect_timeout=self.llm_connect_timeout,
+                requests_per_minute=self.llm_requests_per_minute,
+                tokens_per_minute=self.llm_tokens_per_minute,
+                completion_token_estimate=self.llm_completion_token_estimate,
+                max_attempts=self.llm_max_attempts,
+                bad_request_max_attempts=self.llm_bad_request_max_attempts,
+                backoff_base=self.llm_backoff_base,
+                backoff_max=self.llm_backoff_max,
+                breaker_failure_threshold=self.llm_breaker_failure_threshold,
+                breaker_cooldown=self.llm_breaker_cooldown,
+                breaker_max_cooldown=self.llm_breaker_max_cooldown,
+                stream=self.llm_stream,
+                stream_include_usage=self.llm_stream_include_usage)
+            self.llm_transports[endpoint] = transport
+        return transport
+
+    def llm_transport_stats(self):
+        """
+        :return: 各LLM端点传输层的计数器（键为 BASE_URL 加 API_KEY 的末 4 位，同一 BASE_URL 的不同 API_KEY 分开统计），
+                 启用对冲时还有各阶段的对冲计数器
+        """
+        stats = {f"{base_url} (API_KEY ...{str(api_key)[-4:]})": transport.stats()
+                 for (base_url, api_key), transport in self.llm_transports.items()}
+        if self.llm_hedge_enable:
+            stats["hedge"] = {"parser": self.llm_tool_parser.hedge_stats(),
+                              "mutator_generator": self.llm_tool_mutator_generator.hedge_stats(),
+                              "structural_mutator": self.llm_tool_structural_mutator.hedge_stats(),
+                              "fixer": self.llm_tool_fixer.hedge_stats()}
+        if self.llm_cache is not None:
+            stats["cache"] = self.llm_cache.stats()
+        if self.llm_trace_replayer is not None:
+            stats["replay"] = self.llm_trace_replayer.stats()
+        return stats
+
+    def csv_sink_stats(self):
+        """
+        :return: 各CSV写入器的计数器，键为CSV文件名
+        """
+        return {os.path.basename(sink.path): sink.stats() for sink in self.csv_sinks}
+
+    def close(self):
+        """
+        FUZZ结束时调用：写完所有CSV队列和日志队列中剩余的数据并关闭变异器执行后端
+        :return: 无返回值
+        """
+        for sink in self.csv_sinks:
+            sink.close()
+        self.mutator_executor.close()
+        for transport in self.llm_transports.values():
+            transport.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+        if self.llm_trace_recorder is not None:
+            self.llm_trace_recorder.close()
+        logger.shutdown_loggers()
+
 
     def write_mutator_generator_csv(self, real_time, seed_id,
                                     use_all_time, llm_use_time, llm_up_token, llm_down_token,
-                                    llm_count, llm_error_count, left_mutator_generate_queue_count):
+                                    llm_count, llm_error_count, left_mutator_generate_queue_count, llm_metrics=None):
         """
         向变异器生成器CSV中插入一行
         :param real_time: 输入插入时的真实时间
@@ -316,21 +807,22 @@ class ChiloFactory:
         :param llm_count: LLM调用次数
         :param llm_error_count: LLM出错次数
         :param left_mutator_generate_queue_count: 待生成变异器队列个数
+        :param llm_metrics: 本次LLM调用的排队/服务/退避时间（LLMTool.take_call_metrics 的返回值）
         :return: 无
         """
-        with self.csv_lock:  # 加锁保护CSV写入
-            with open(self.mutator_generator_csv_path, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([real_time, real_time-self.start_time,
-                                 seed_id, use_all_time,
-                                 llm_use_time, llm_up_token, llm_down_token,
-                                 llm_count, llm_error_count, left_mutator_generate_queue_count])
+        if self.generation_governor is not None:
+            self.generation_governor.record_tokens(llm_up_token + llm_down_token, True)
+        self.mutator_generator_csv_sink.write([real_time, real_time-self.start_time,
+                                               seed_id, use_all_time,
+                                               llm_use_time, llm_up_token, llm_down_token,
+                                               llm_count, llm_error_count, left_mutator_generate_queue_count]
+                                              + self._llm_metrics_fields(llm_metrics))
 
     def write_main_csv(self, real_time, fuzz_count_seed_number,
                        fuzz_seed_number, is_by_ramdom,fuzz_use_time, now_seed_id,
                        real_fuzz_seed_id, real_mutator_id,left_wait_exec_queue_count, ori_mutate_out_size,
                        real_mutate_out_size, is_cut, is_error_occur, is_from_structural_mutator,
-                       thompson_score=0.0, left_fuzz_count=0, Ai=0.0, Bi=0.0, Ci=0.0):
+                       thompson_score=0.0, left_fuzz_count=0, Ai=0.0, Bi=0.0, Ci=0.0, seed_sample="", new_edges=0):
         """
         向主CSV里面写入一行
         :param real_time: 插入的真实时间
@@ -352,22 +844,54 @@ class ChiloFactory:
         :param Ai: Thompson Sampling值
         :param Bi: 历史效率因子
         :param Ci: 变异潜力因子
+        :param seed_sample: hierarchical 模式下种子臂的采样值，其余情况为空
+        :param new_edges: 该测试用例执行后新增的边数量（用于离线回放奖励模型）
         :return:
         """
-        with self.csv_lock:  # 加锁保护CSV写入
-            with open(self.main_csv_path, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([real_time, real_time-self.start_time , fuzz_count_seed_number,
-                                 fuzz_seed_number, is_by_ramdom, fuzz_use_time,
-                                 now_seed_id, real_fuzz_seed_id, real_mutator_id, left_wait_exec_queue_count,
-                                 ori_mutate_out_size,
-                                 real_mutate_out_size, is_cut, is_error_occur, is_from_structural_mutator,
-                                 thompson_score, left_fuzz_count, Ai, Bi, Ci])
+        self.main_csv_sink.write([real_time, real_time-self.start_time , fuzz_count_seed_number,
+                                  fuzz_seed_number, is_by_ramdom, fuzz_use_time,
+                                  now_seed_id, real_fuzz_seed_id, real_mutator_id, left_wait_exec_queue_count,
+                                  ori_mutate_out_size,
+                                  real_mutate_out_size, is_cut, is_error_occur, is_from_structural_mutator,
+                                  thompson_score, left_fuzz_count, Ai, Bi, Ci, seed_sample, new_edges])
+
+    def write_pool_csv(self, real_time, event, reason, mutator):
+        """
+        向变异器池CSV中写入一行退役/复活事件
+        :param real_time: 事件发生的真实时间
+        :param event: retire 或 revive
+        :param reason: 原因（error / zero_edge / cap / interval）
+        :param mutator: 变异器对象
+        :return: 无返回值
+        """
+        self.pool_csv_sink.write([real_time, real_time - self.start_time, event, reason, mutator.mutator_index,
+                                  mutator.seed_id, mutator.mutator_id, mutator.success_count, mutator.failure_count,
+                                  mutator.total_new_edges, mutator.last_error_count,
+                                  self.mutator_pool.active_size(), self.mutator_pool.retired_size()])
+
+    def write_queue_get_csv(self, real_time, filename, seed_id, saturation, posterior_mean, trials,
+                            recent_reward, pending, decision):
+        """
+        向 queue_get CSV 中写入一行种子选择决定
+        :param real_time: 当前真实时间
+        :param filename: AFL++ 队列条目的路径（只记录文件名）
+        :param seed_id: 种子编号，未登记过的条目为 -1
+        :param saturation: 饱和度
+        :param posterior_mean: 种子臂的后验均值
+        :param trials: 种子臂累计结算的批次数
+        :param recent_reward: 衰减后的最近奖励
+        :param pending: 待处理的流水线工作数
+        :param decision: accept / skip / unknown（未登记过的条目总是执行）
+        :return: 无返回值
+        """
+        self.queue_get_csv_sink.write([real_time, real_time - self.start_time, os.path.basename(filename), seed_id,
+                                       saturation, posterior_mean, trials, recent_reward, pending, decision])
 
     def write_parser_csv(self, real_time, seed_id, need_mutate_count, is_parsed, llm_time,
                          up_token, down_token,  llm_count,
                          llm_format_error_count, all_time, select_count,
-                         left_parser_queue_count, evicted_seed_total, mask_count):
+                         left_parser_queue_count, evicted_seed_total, mask_count, is_eager=False,
+                         governor_decision="", governor_reason="", llm_metrics=None):
         """
         向parser的csv中写入一行
         :param left_parser_queue_count: 队列中排队的个数
@@ -384,15 +908,20 @@ class ChiloFactory:
         :param select_count: 当前种子被选中的次数
         :param evicted_seed_total: 全局累计被淘汰的种子数量
         :param mask_count: 掩码数量
+        :param is_eager: 本次是否为提前解析（AFL++ 还没有选中该种子）
+        :param governor_decision: 变异器生成调控器的决定（generate / reuse / wait），未启用时为空
+        :param governor_reason: 做出该决定的原因
+        :param llm_metrics: 本次LLM调用的排队/服务/退避时间（LLMTool.take_call_metrics 的返回值）
         :return: 无
         """
-        with self.csv_lock:  # 加锁保护CSV写入
-            with open(self.parser_csv_path, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([real_time, real_time - self.start_time, seed_id,
-                                 need_mutate_count, is_parsed, llm_time, up_token,
-                                 down_token,llm_count, llm_format_error_count, all_time, select_count,
-                                 left_parser_queue_count, evicted_seed_total, mask_count])
+        eager_hit_rate = self.eager_parse_queue.hit_rate() if self.eager_parse_queue is not None else ""
+        saved_tokens = self.generation_governor.saved_tokens() if self.generation_governor is not None else ""
+        self.parser_csv_sink.write([real_time, real_time - self.start_time, seed_id,
+                                    need_mutate_count, is_parsed, llm_time, up_token,
+                                    down_token,llm_count, llm_format_error_count, all_time, select_count,
+                                    left_parser_queue_count, evicted_seed_total, mask_count,
+                                    int(is_eager), eager_hit_rate, governor_decision, governor_reason, saved_tokens]
+                                   + self._llm_metrics_fields(llm_metrics))
 
     def write_mutator_fixer_csv(self,real_time, seed_id,  all_use_time, mutator_id, need_mutate_count,
                                 all_llm_count, syntax_use_time, syntax_error_count, syntax_format_error_time,
@@ -402,7 +931,8 @@ class ChiloFactory:
                                 semantic_error_count,semantic_error_llm_use_time,
                                 semantic_error_llm_count,
                                 semantic_llm_format_error,semantic_up_token, semantic_down_token,left_fix_queue_count,
-                                at_last_is_all_correct, mask_count, similarity, unique_count, total_count):
+                                at_last_is_all_correct, mask_count, similarity, unique_count, total_count,
+                                llm_metrics=None):
         """
         向mutator_fixer的csv中写入一行
         :param need_mutate_count: 需要进行变异的次数
@@ -434,16 +964,18 @@ class ChiloFactory:
         :param similarity: 重复率
         :param unique_count: 不重复结果数量
         :param total_count: 总运行次数
+        :param llm_metrics: 本次LLM调用的排队/服务/退避时间（LLMTool.take_call_metrics 的返回值）
         :return:
         """
-        with self.csv_lock:  # 加锁保护CSV写入
-            with open(self.mutator_fixer_csv_path, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([real_time, real_time-self.start_time, seed_id, mutator_id, need_mutate_count, all_use_time,  all_llm_count, syntax_use_time,syntax_error_count, syntax_format_error_time,syntax_llm_use_time,syntax_llm_count,syntax_up_token, syntax_down_token,sematic_use_time, semantic_mask_error_count, semantic_random_error_count, semantic_return_type_error_count, semantic_error_count, semantic_error_llm_use_time,semantic_error_llm_count,semantic_llm_format_error,semantic_up_token, semantic_down_token,left_fix_queue_count,at_last_is_all_correct, mask_count, similarity, unique_count, total_count])
+        if self.generation_governor is not None:
+            self.generation_governor.record_tokens(syntax_up_token + syntax_down_token
+                                                   + semantic_up_token + semantic_down_token, False)
+        self.mutator_fixer_csv_sink.write([real_time, real_time-self.start_time, seed_id, mutator_id, need_mutate_count, all_use_time,  all_llm_count, syntax_use_time,syntax_error_count, syntax_format_error_time,syntax_llm_use_time,syntax_llm_count,syntax_up_token, syntax_down_token,sematic_use_time, semantic_mask_error_count, semantic_random_error_count, semantic_return_type_error_count, semantic_error_count, semantic_error_llm_use_time,semantic_error_llm_count,semantic_llm_format_error,semantic_up_token, semantic_down_token,left_fix_queue_count,at_last_is_all_correct, mask_count, similarity, unique_count, total_count] + self._llm_metrics_fields(llm_metrics))
 
     def write_structural_mutator_csv(self, real_time, seed_id, new_seed_id,
                                      all_use_time, llm_up_token, llm_down_token, llm_count,
-                                     llm_format_error_count, llm_use_time,left_structural_mutate_queue_count):
+                                     llm_format_error_count, llm_use_time,left_structural_mutate_queue_count,
+                                     llm_metrics=None):
         """
         向structural_mutator写入一行
         :param real_time: 数据插入时间
@@ -456,39 +988,163 @@ class ChiloFactory:
         :param llm_format_error_count: LLM生成格式错误
         :param llm_use_time: LLM调用所用时间
         :param left_structural_mutate_queue_count: 等待结构化变异的队列剩余个数
+        :param llm_metrics: 本次LLM调用的排队/服务/退避时间（LLMTool.take_call_metrics 的返回值）
         :return:
         """
-        with self.csv_lock:  # 加锁保护CSV写入
-            with open(self.structural_mutator_csv_path, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([real_time, real_time-self.start_time, seed_id,
-                                 new_seed_id, all_use_time, llm_up_token, llm_down_token,
-                                 llm_count, llm_format_error_count, llm_use_time,
-                                 left_structural_mutate_queue_count])
+        self.structural_mutator_csv_sink.write([real_time, real_time-self.start_time, seed_id,
+                                                new_seed_id, all_use_time, llm_up_token, llm_down_token,
+                                                llm_count, llm_format_error_count, llm_use_time,
+                                                left_structural_mutate_queue_count]
+                                               + self._llm_metrics_fields(llm_metrics))
+
+    @staticmethod
+    def _llm_metrics_fields(llm_metrics):
+        """
+        :param llm_metrics: LLMCallMetrics，为 None 时各列留空
+        :return: 各阶段CSV末尾的LLM时间拆分列
+        """
+        if llm_metrics is None:
+            return [""] * len(llm_transport.CSV_COLUMNS)
+        return llm_metrics.csv_fields()
+
+    def coverage_reward(self, delta):
+        """
+        按 ENERGY.REWARD_MODE 将一次执行的覆盖率变化换算为变异器的奖励
+        :param delta: BitMap.add_bitmap 返回的 CoverageDelta
+        :return: 奖励（非负整数），大于 0 视为本次执行有收获
+        """
+        if self.reward_mode == 'buckets':
+            return delta.new_buckets
+        if self.reward_mode == 'rarity':
+            return delta.rarity
+        return delta.new_edges
+
+    def is_batch_success(self):
+        """
+        判定当前汤普森采样批次是否成功（在批次最后一次执行后调用）
+        edges/buckets 以及 queue 反馈模式：奖励大于 0；
+        rarity：发现了新边，或平均每次执行的稀有度高于所有批次的滑动基线（之后更新基线）
+        :return: 是否成功
+        """
+        if self.reward_mode != 'rarity' or self.feedback_mode == 'queue':
+            return self.current_batch_reward > 0
+        mean_rarity = self.current_batch_reward / max(self.current_batch_exec_count, 1)
+        if self.rarity_baseline is None:
+            self.rarity_baseline = mean_rarity
+            return self.current_batch_found_edges > 0
+        is_success = self.current_batch_found_edges > 0 or mean_rarity > self.rarity_baseline
+        self.rarity_baseline += self.rarity_baseline_rate * (mean_rarity - self.rarity_baseline)
+        return is_success
+
+    def should_scan_trace(self, exec_number, is_calibration=False):
+        """
+        本次执行后是否需要读取并合并共享内存位图
+        bitmap 反馈模式每次都需要；queue 模式只在抽样的执行、以及不稳定边检测的校准执行前后需要
+        :param exec_number: 本次执行的编号
+        :param is_calibration: 本次执行是否为校准执行，或是随后会被校准执行重放的那次执行
+        :return: 是否需要合并
+        """
+        if self.feedback_mode == 'bitmap' or is_calibration:
+            return True
+        return bool(self.feedback_sample_interval) and exec_number % self.feedback_sample_interval == 0
+
+    def begin_thompson_batch(self, mutator, start_exec):
+        """
+        开始一个汤普森采样批次：记下选中的变异器，清空批次计数
+        :param mutator: 选中的变异器
+        :param start_exec: 本批次第一次执行的编号，更早的条目不记入本批次
+        :return: 无返回值
+        """
+        self.current_thompson_mutator = mutator
+        self.current_batch_reward = 0
+        self.current_batch_found_edges = 0
+        self.current_batch_new_entries = 0
+        self.current_batch_exec_count = 0
+        self.current_batch_start_exec = start_exec
+
+    def credit_queue_entry(self, stamp, reward, is_crash=False):
+        """
+        queue 反馈模式下，把 AFL++ 保存的一个条目（或崩溃）的奖励记给产生它的变异器
+        属于当前批次（含执行完但尚未结算的批次）的记入批次奖励；
+        崩溃扫描有延迟，属于已结算批次的崩溃单独按一个成功的批次结算（同样经过退役/复活策略）
+        :param stamp: 条目文件名中解析出的 QueueStamp
+        :param reward: 奖励
+        :param is_crash: 是否为崩溃
+        :return: 是否记入了某个变异器
+        """
+        mutator = self.current_thompson_mutator
+        if (stamp.strategy == ChiloBitMap.STRATEGY_POOL and mutator is not None
+                and stamp.mutator_index == mutator.mutator_index
+                and stamp.exec_number >= self.current_batch_start_exec):
+            self.current_batch_reward += reward
+            self.current_batch_new_entries += 1
+            self.queue_feedback_stats.credited += 1
+            return True
+        if is_crash and stamp.strategy == ChiloBitMap.STRATEGY_POOL:
+            with self.mutator_pool_lock:
+                late_mutator = None
+                if 0 <= stamp.mutator_index < len(self.mutator_pool.mutator_list):
+                    late_mutator = self.mutator_pool.mutator_list[stamp.mutator_index]
+            if late_mutator is not None:
+                self.settle_mutator_batch(late_mutator, True, reward)
+                self.queue_feedback_stats.late_crashes += 1
+                return True
+        self.queue_feedback_stats.stale += 1
+        return False
+
+    def scan_crashes(self):
+        """
+        扫描 crashes 目录中新出现的带戳崩溃，记入对应的变异器
+        :return: 本次扫描到的带戳崩溃数
+        """
+        if self.crash_scanner is None:
+            return 0
+        count = 0
+        for name in self.crash_scanner.scan():
+            stamp = queue_feedback.parse_stamp(name)
+            if stamp is None:
+                continue
+            count += 1
+            self.queue_feedback_stats.crashes += 1
+            self.credit_queue_entry(stamp, self.crash_reward, is_crash=True)
+            self.main_logger.info("发现带戳的崩溃：%s，变异器下标：%s", name, stamp.mutator_index)
+        return count
 
     def write_bitmap(self):
         """
         以覆盖式的方式，向bitmap文件写入当前的bitmap
-        从self.bitmap中得到当前的三种bitmap并写入
+        按 OTHERS.BITMAP_FORMAT 写入二进制的 bitmap.bin（默认）和/或旧版的三个文本文件
         """
         base_dir = self.bitmap_path
 
-        def _atomic_write_text_array(path, arr):
-            tmp_path = f"{path}.tmp"
-            # 写入为逗号分隔的整型文本，末尾换行
-            with open(tmp_path, "w", encoding="utf-8") as f:
-                f.write(",".join(str(int(v)) for v in arr))
-                f.write("\n")
-            # 原子替换，避免读到中间状态
-            os.replace(tmp_path, path)
+        if self.bitmap_format in ('binary', 'both'):
+            bitmap_store.write_bitmap_file(os.path.join(base_dir, bitmap_store.BITMAP_FILE_NAME), self.bitmap)
 
-        sum_arr = self.bitmap.get_sum_bitmap()
-        cum_arr = self.bitmap.get_cumulative_bitmap()
-        bool_arr = self.bitmap.get_bool_bitmap()
+        if self.bitmap_format in ('text', 'both'):
+            def _atomic_write_text_array(path, arr):
+                tmp_path = f"{path}.tmp"
+                # 写入为逗号分隔的整型文本，末尾换行
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(",".join(map(str, arr.tolist())))
+                    f.write("\n")
+                # 原子替换，避免读到中间状态
+                os.replace(tmp_path, path)
 
-        _atomic_write_text_array(os.path.join(base_dir, "sum.txt"), sum_arr)
-        _atomic_write_text_array(os.path.join(base_dir, "cumulative.txt"), cum_arr)
-        _atomic_write_text_array(os.path.join(base_dir, "bool.txt"), bool_arr)
+            sum_arr, cum_arr, bool_arr, _ = self.bitmap.get_arrays()
+
+            _atomic_write_text_array(os.path.join(base_dir, "sum.txt"), sum_arr)
+            _atomic_write_text_array(os.path.join(base_dir, "cumulative.txt"), cum_arr)
+            _atomic_write_text_array(os.path.join(base_dir, "bool.txt"), bool_arr)
+
+        if self.snapshot_writer is not None and time.time() - self.last_snapshot_time >= self.snapshot_interval:
+            changed = self.snapshot_writer.write(self.bitmap)
+            self.last_snapshot_time = time.time()
+            if hasattr(self, "main_logger"):
+                self.main_logger.info("已追加第%s条累计位图快照，变化的槽位：%s",
+                                      self.snapshot_writer.snapshot_count, changed)
+
+        if self.edge_stability is not None:
+            self.edge_stability.save(os.path.join(base_dir, edge_stability.INSTABILITY_FILE_NAME))
 
         if hasattr(self, "main_logger"):
             self.main_logger.info("三种bitmap已存储")
@@ -499,31 +1155,257 @@ class ChiloFactory:
         添加一个种子到待解析列表中
         :param mutate_time: 要变异的次数
         :param seed_buf: 要加入的种子的buf
-        :return: 无返回值
+        :return: 该种子的编号
         """
 
         #先将一个种子加入到总列表中，顺便看看是否重复
         is_already_in_list, seed_id = self.all_seed_list.add_seed_to_list(seed_buf)
-        self.main_logger.info(f"已将该种子加入到总队列中，该种子的是否为新种子：{is_already_in_list}，该种子编号为：{seed_id}")
+        self.main_logger.info("已将该种子加入到总队列中，该种子的是否为新种子：%s，该种子编号为：%s",
+                              is_already_in_list, seed_id, extra=logger.HOT)
         self.all_seed_list.add_one_seed_chose_time_by_index(seed_id) #添加一次被选择次数
-        self.main_logger.info(
-            f"种子编号：{seed_id} 被选择次数：{self.all_seed_list.seed_list[seed_id].chose_time}")
+        self.main_logger.info("种子编号：%s 被选择次数：%s",
+                              seed_id, self.all_seed_list.seed_list[seed_id].chose_time, extra=logger.HOT)
+        now_seed = self.all_seed_list.seed_list[seed_id]
+        if self.eager_parse_queue is not None and now_seed.is_eager and now_seed.chose_time == 1:
+            #提前登记的条目第一次被选中：已经解析完成即为命中
+            self.eager_parse_queue.record_first_selection(now_seed.is_parsed)
 
         if self.structural_mutator_thread_count > 0:
             if self.all_seed_list.seed_list[seed_id].chose_time % self.times_to_structural_mutator == 0:
                 
-                    self.main_logger.info(f"种子编号：{seed_id} 达到结构化变异标准，进行结构化变异")
+                    self.main_logger.info("种子编号：%s 达到结构化变异标准，进行结构化变异", seed_id, extra=logger.HOT)
                     #说明进行一次结构性变异
                     self.structural_mutator_list.put({"seed_id":seed_id , "mutate_time":mutate_time})
-                    self.main_logger.info(f"种子编号：{seed_id} 已放入结构化变异队列等待变异，变异次数为{mutate_time}")
+                    self.main_logger.info("种子编号：%s 已放入结构化变异队列等待变异，变异次数为%s", seed_id, mutate_time,
+                                           extra=logger.HOT)
         else:
-            self.main_logger.warning(f"结构化变异器线程数为0，跳过结构化变异")
+            self.main_logger.warning("结构化变异器线程数为0，跳过结构化变异")
+
+        if self.selection_mode == 'hierarchical' and self.mutator_pool.is_seed_collapsed(seed_id):
+            #该种子的变异器整体已经证明无效，不再为其解析和生成新的变异器
+            self.main_logger.info("种子编号：%s 的后验已坍缩，跳过解析与变异器生成", seed_id, extra=logger.HOT)
+            return seed_id
 
-        self.main_logger.info(f"种子编号：{seed_id} 准备进入解析队列")
+        self.main_logger.info("种子编号：%s 准备进入解析队列", seed_id, extra=logger.HOT)
+        self.begin_seed_work(seed_id)
         #然后直接加入到待parse中
         self.wait_parse_list.put({"seed_id":seed_id , "mutate_time":mutate_time})
-        self.main_logger.info(f"种子编号：{seed_id} 已进入解析队列，变异次数为：{mutate_time}")
-        return 0
+        self.main_logger.info("种子编号：%s 已进入解析队列，变异次数为：%s", seed_id, mutate_time, extra=logger.HOT)
+        return seed_id
+
+    def route_parsed_seed(self, parse_target):
+        """
+        解析完成后决定该次选中是生成新的变异器，还是复用该种子已有的变异器
+        未启用 GOVERNOR 时总是放入变异器生成队列
+        :param parse_target: 解析任务（seed_id、mutate_time）
+        :return: (决定, 原因)，未启用时为 ("", "")
+        """
+        if self.generation_governor is None:
+            self.wait_mutator_generate_list.put(parse_target)
+            return "", ""
+        seed_id = parse_target['seed_id']
+        evidence = self.mutator_pool.seed_generation_evidence(seed_id)
+        decision, reason = self.generation_governor.decide(seed_id, evidence, time.time())
+        if decision == generation_governor.GENERATE:
+            self.wait_mutator_generate_list.put(parse_target)
+        else:
+            if decision == generation_governor.REUSE:
+                mutator = self.mutator_pool.mutator_list[evidence[1]]
+                self.wait_exec_mutator_list.put(mutator, parse_target['mutate_time'])
+            self.finish_seed_work(seed_id)   #不生成，该任务到此结束
+        self.parser_logger.info("seed_id:%s 变异器生成调控：%s（%s）", seed_id, decision, reason)
+        return decision, reason
+
+    def begin_seed_work(self, seed_id):
+        """
+        该种子的一个任务进入解析/生成/修复流水线，供种子饱和度统计正在进行的工作
+        :param seed_id: 种子编号
+        :return: 无返回值
+        """
+        if self.seed_saturation is not None:
+            self.seed_saturation.begin_work(seed_id)
+
+    def finish_seed_work(self, seed_id):
+        """
+        该种子的一个任务离开流水线（复用已有变异器、生成失败或修复结束）
+        :param seed_id: 种子编号
+        :return: 无返回值
+        """
+        if self.seed_saturation is not None:
+            self.seed_saturation.finish_work(seed_id)
+
+    def should_fuzz_queue_entry(self, filename):
+        """
+        queue_get 钩子：按文件名查到种子编号，根据其饱和度决定是否执行 AFL++ 选中的这个条目
+        :param filename: AFL++ 队列条目的路径
+        :return: True 为执行，False 为跳过
+        """
+        if self.seed_saturation is None:
+            return True
+        real_time = time.time()
+        seed_id = self.seed_saturation.seed_of(filename)
+        if seed_id < 0:
+            #还没有被 fuzz_count 处理过（或未提前登记）的条目，总是执行，由 fuzz_count 登记文件名
+            self.write_queue_get_csv(real_time, filename, -1, "", "", "", "", "", "unknown")
+            return True
+        seed = self.all_seed_list.seed_list[seed_id]
+        saturation, mean, trials, recent, pending = self.seed_saturation.saturation(
+            seed, self.mutator_pool.seed_arm_stats(seed_id))
+        is_skip = seed_schedule.decide(saturation, self.seed_schedule_mode, self.seed_skip_threshold,
+                                       self.seed_max_skip_prob)
+        self.write_queue_get_csv(real_time, filename, seed_id, round(saturation, 4), round(mean, 4), trials,
+                                 round(recent, 4), pending, "skip" if is_skip else "accept")
+        return not is_skip
+
+    def register_queue_entry(self, filename):
+        """
+        AFL++ 保存新队列条目后立即登记进总种子列表，并按新颖度放入提前解析队列
+        :param filename: 新条目的路径
+        :return: 种子编号，未启用提前解析、读取失败或该内容已登记过时为 -1
+        """
+        if self.eager_parse_queue is None:
+            return -1
+        try:
+            with open(filename, "rb") as f:
+                seed_buf = f.read()
+        except OSError as e:
+            self.main_logger.warning("读取新队列条目失败：%s，%s", filename, e)
+            return -1
+        is_already_in_list, seed_id = self.all_seed_list.add_seed_to_list(seed_buf)
+        if is_already_in_list:
+            return -1
+        self.all_seed_list.seed_list[seed_id].is_eager = True
+        self.eager_parse_queue.put(seed_id, eager_parse.novelty_of(os.path.basename(filename), len(seed_buf)))
+        return seed_id
+
+    def next_eager_parse_target(self):
+        """
+        解析器空闲时调用，取出最值得提前解析的条目
+        :return: 解析任务（与 wait_parse_list 中的任务格式相同，另带 eager 标记），没有时为 None
+        """
+        if self.eager_parse_queue is None:
+            return None
+        seed_list = self.all_seed_list.seed_list
+        seed_id = self.eager_parse_queue.pop(
+            lambda sid: seed_list[sid].chose_time == 0 and not seed_list[sid].is_parsed)
+        if seed_id is None:
+            return None
+        self.begin_seed_work(seed_id)
+        return {"seed_id": seed_id, "mutate_time": self.fuzz_count_time, "eager": True}
+
+    def prefetch_mutator(self, mutator, count):
+        """
+        通知预渲染缓冲区：接下来将连续执行 count 次该变异器
+        :param mutator: fuzz_count 选中的变异器
+        :param count: 执行次数（能量）
+        :return: 无返回值
+        """
+        if self.prefetcher is not None and mutator is not None:
+            self.prefetcher.schedule(mutator, count)
+
+    def settle_mutator_batch(self, mutator, is_success, new_edges):
+        """
+        结算变异器池的一个批次：更新变异器统计量，并执行退役/复活策略
+        在 post_run 中、批次最后一次执行之后调用，此时该变异器不会再被预渲染或执行
+        :param mutator: 本批次的变异器
+        :param is_success: 本批次是否成功（见 is_batch_success）
+        :param new_edges: 本批次的奖励（按 ENERGY.REWARD_MODE，默认为新边数）
+        :return: 无返回值
+        """
+        mutator.update_stats(is_success, new_edges)
+        if self.seed_saturation is not None:
+            self.seed_saturation.record_batch(mutator.seed_id, new_edges)
+        if not self.enable_pool_retire:
+            return
+        self.settled_batch_count += 1
+        reason = self.mutator_pool.retire_reason_of(mutator.mutator_index, self.retire_zero_edge_batches,
+                                                    self.retire_max_error_count)
+        if reason is not None:
+            self.retire_mutator(mutator, reason)
+        if self.max_active_pool_size:
+            for index in self.mutator_pool.over_cap(self.max_active_pool_size):
+                self.retire_mutator(self.mutator_pool.mutator_list[index], "cap")
+        if self.revive_interval and self.settled_batch_count % self.revive_interval == 0:
+            index = self.mutator_pool.revive_candidate()
+            if index is not None:
+                self.revive_mutator(self.mutator_pool.mutator_list[index], "interval")
+
+    def retire_mutator(self, mutator, reason):
+        """
+        退役一个变异器：不再参与选择，文件移入归档，mutator_index 保持不变
+        :param mutator: 变异器对象
+        :param reason: 退役原因
+        :return: 无返回值
+        """
+        if not self.mutator_pool.retire(mutator.mutator_index, reason):
+            return
+        self.mutator_archive.archive(mutator.file_name)
+        self.mutator_executor.invalidate(mutator.file_name)
+        self.write_pool_csv(time.time(), "retire", reason, mutator)
+        self.main_logger.info("变异器退役，原因：%s，种子id:%s，变异器编号：%s，可选变异器数：%s", reason,
+                              mutator.seed_id, mutator.mutator_id, self.mutator_pool.active_size())
+
+    def revive_mutator(self, mutator, reason):
+        """
+        从归档中复活一个变异器
+        :param mutator: 变异器对象
+        :param reason: 复活原因
+        :return: 无返回值
+        """
+        if not self.mutator_archive.restore(mutator.file_name):
+            self.main_logger.warning("归档中找不到变异器文件 %s，无法复活", mutator.file_name)
+            return
+        if self.mutator_pool.revive(mutator.mutator_index):
+            self.write_pool_csv(time.time(), "revive", reason, mutator)
+            self.main_logger.info("变异器复活，种子id:%s，变异器编号：%s", mutator.seed_id, mutator.mutator_id)
+
+    def render_mutator(self, mutator):
+        """
+        调用一次变异器并将结果编码为 bytearray，出错时抛出异常
+        :param mutator: 变异器对象
+        :return: 编码后的测试用例
+        """
+        return self.render_mutator_batch(mutator, 1)[0]
+
+    def render_mutator_batch(self, mutator, count):
+        """
+        连续调用 count 次变异器并将结果编码为 bytearray，出错时抛出异常
+        :param mutator: 变异器对象
+        :param count: 调用次数
+        :return: 编码后的测试用例列表
+        """
+        results = self.mutator_executor.call_mutate_batch(mutator.file_name, count)
+        return [self._encode_mutate_result(mutator, mutate_testcase) for mutate_testcase in results]
+
+    def record_mutator_error(self, mutator, error):
+        """
+        记录一次变异器调用失败：超时、内存超限或导致工作进程崩溃的变异器被隔离，其余错误累计到一定次数后退役
+        同步调用与预渲染线程（只在致命错误时调用）共用
+        :param mutator: 变异器对象
+        :param error: 调用时抛出的异常
+        :return: 无返回值
+        """
+        self.mutator_pool.mutator_list[mutator.mutator_index].is_error = True
+        self.mutator_pool.mutator_list[mutator.mutator_index].last_error_count += 1
+        if isinstance(error, mutator_executor.MutatorExecutionError) and error.is_fatal:
+            #超时、内存超限或导致工作进程崩溃，隔离该变异器
+            self.mutator_pool.mutator_list[mutator.mutator_index].is_quarantined = True
+            self.main_logger.warning("变异器 种子id:%s，变异器编号为：%s 已被隔离",
+                                     mutator.seed_id, mutator.mutator_id)
+        elif self.enable_pool_retire and self.mutator_pool.retire_reason_of(
+                mutator.mutator_index, 0, self.retire_max_error_count) == "error":
+            self.retire_mutator(mutator, "error")
+
+    def _encode_mutate_result(self, mutator, mutate_testcase):
+        """将 mutate() 的返回值编码为 bytearray"""
+        # 检查变异结果是否为有效字符串，防止 TypeError: encoding without a string argument
+        if mutate_testcase is None:
+            self.main_logger.error("变异器返回了 None，种子id:%s，变异器编号:%s", mutator.seed_id, mutator.mutator_id)
+            mutate_testcase = ""  # 使用空字符串作为fallback
+        elif not isinstance(mutate_testcase, str):
+            self.main_logger.warning("变异器返回了非字符串类型 %s，尝试转换", type(mutate_testcase))
+            mutate_testcase = str(mutate_testcase)
+        return bytearray(mutate_testcase, "utf-8", errors="ignore")
 
     def mutate_once(self):
         """
@@ -540,21 +1422,24 @@ class ChiloFactory:
         match self.next_fuzz_strategy:
             case 0:
                 #结构化变异
-                self.main_logger.info(f"next_fuzz_strategy: {self.next_fuzz_strategy} 从结构化变异队列中取出一个变异好的测试用例")
+                self.main_logger.info("next_fuzz_strategy: %s 从结构化变异队列中取出一个变异好的测试用例",
+                                      self.next_fuzz_strategy, extra=logger.HOT)
                 mutator = self.wait_exec_structural_list.get()
                 is_from_structural_mutator = True
                 is_by_random = None
 
             case 1:
                 #待执行变异器
-                self.main_logger.info(f"next_fuzz_strategy: {self.next_fuzz_strategy} 从待执行变异器队列中取出一个变异器")
+                self.main_logger.info("next_fuzz_strategy: %s 从待执行变异器队列中取出一个变异器",
+                                      self.next_fuzz_strategy, extra=logger.HOT)
                 is_from_structural_mutator = False
                 mutator = self.wait_exec_mutator_list.get()
                 is_by_random = False
                 
             case 2:
                 #变异器池
-                self.main_logger.info(f"next_fuzz_strategy: {self.next_fuzz_strategy} 使用汤普森采样选中的变异器")
+                self.main_logger.info("next_fuzz_strategy: %s 使用汤普森采样选中的变异器",
+                                      self.next_fuzz_strategy, extra=logger.HOT)
                 is_from_structural_mutator = False
                 is_by_random = True
                 # mutator = self.mutator_pool.random_select_mutator()
@@ -565,62 +1450,55 @@ class ChiloFactory:
         assert mutator is not None
         if is_from_structural_mutator:
             #说明是从结构化变异队列中取出的
-            self.main_logger.info(f"从结构化变异队列中取出的变异好的测试用例，种子id：{mutator['seed_id']}")
-            return bytearray(mutator['mutate_content'], "utf-8", errors="ignore"), False,\
-             mutator['seed_id'], None, None, is_from_structural_mutator
+            self.main_logger.info("从结构化变异队列中取出的变异好的测试用例，种子id：%s", mutator['seed_id'], extra=logger.HOT)
+            self.current_exec_seed_id, self.current_exec_mutator_index = mutator['seed_id'], -1
+            return mutator['mutate_buf'], False, mutator['seed_id'], None, None, is_from_structural_mutator
         
-        self.main_logger.info(f"变异器任务加载完毕，变异的目标种子id:{mutator.seed_id}，变异器编号为：{mutator.mutator_id}")
-        #下一步就要根据mutator去加载模块，并调用启动了
-        def call_mutate_from_file(filepath):
-            """动态加载指定的Python文件并调用 mutate() 函数"""
-            filepath = os.path.abspath(filepath)
-            module_name = os.path.splitext(os.path.basename(filepath))[0]  # 例如 mu_1_1
-
-            spec = importlib.util.spec_from_file_location(module_name, filepath)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)  # 执行文件内容，加载为模块对象
-
-            if hasattr(module, "mutate"):
-                # 使用 contextlib 屏蔽 stdout 和 stderr，防止变异器中的 print 干扰 AFL++ 界面
-                with open(os.devnull, "w") as fnull:
-                    with contextlib.redirect_stdout(fnull), contextlib.redirect_stderr(fnull):
-                        return module.mutate()  # 调用 mutate 函数并返回结果
-            else:
-                raise AttributeError(f"错误码：1203 {filepath} 中未找到 mutate() 函数")
-
+        self.main_logger.info("变异器任务加载完毕，变异的目标种子id:%s，变异器编号为：%s",
+                              mutator.seed_id, mutator.mutator_id, extra=logger.HOT)
+        #优先从预渲染缓冲区中取出结果，缓冲区下溢时再同步加载模块（命中缓存时不再重新加载）并调用
         is_mutator_error_occur = False
-        while True:
-            self.main_logger.info(
-                f"正在等待调用 变异的目标种子id:{mutator.seed_id}，变异器编号为：{mutator.mutator_id}")
+        mutate_buf = None
+        last_seed_id, last_mutator_id = mutator.seed_id, mutator.mutator_id
+        if mutator.is_quarantined or mutator.is_retired:
+            #已被隔离或退役的变异器（例如待执行队列中残留的任务）不再调用，直接改选
+            is_mutator_error_occur = mutator.is_quarantined
+            mutator = self.mutator_pool.random_select_mutator()
+        elif self.prefetcher is not None:
+            mutate_buf = self.prefetcher.pop(mutator)
+        retry_count = 0
+        while mutate_buf is None:
+            if mutator is None or retry_count > self.mutator_error_max_retry:
+                #池中已经没有可用的变异器，返回空用例，避免在fuzz中无限重试
+                self.main_logger.error("没有可用的变异器，本次返回空测试用例")
+                self.current_exec_seed_id, self.current_exec_mutator_index = -1, -1
+                return bytearray(), is_by_random, last_seed_id, last_mutator_id, True, is_from_structural_mutator
+            self.main_logger.info("正在等待调用 变异的目标种子id:%s，变异器编号为：%s",
+                                  mutator.seed_id, mutator.mutator_id, extra=logger.HOT)
+            last_seed_id, last_mutator_id = mutator.seed_id, mutator.mutator_id
             try:
-                mutate_testcase = call_mutate_from_file(mutator.file_name)
-                break
-            except:
+                mutate_buf = self.render_mutator(mutator)
+            except Exception as e:
                 #这里出现问题，那是致命的！将会导致fuzz直接停止
                 #一旦出现问题，那我们就需要立即处理，随机选择其他的变异器
-                self.main_logger.error(
-                    f"调用的目标种子id:{mutator.seed_id}，变异器编号为：{mutator.mutator_id} 出现错误，正在随机挑选其他变异器")
+                self.main_logger.error("调用的目标种子id:%s，变异器编号为：%s 出现错误，正在随机挑选其他变异器：%s",
+                                       mutator.seed_id, mutator.mutator_id, e)
                 is_mutator_error_occur = True
-                self.mutator_pool.mutator_list[mutator.mutator_index].is_error = True
-                self.mutator_pool.mutator_list[mutator.mutator_index].last_error_count += 1
+                retry_count += 1
+                self.record_mutator_error(mutator, e)
                 #然后随机选择一个
                 mutator = self.mutator_pool.random_select_mutator()
-                self.main_logger.warning(
-                    f"随机挑选的新的调用的目标种子id:{mutator.seed_id}，变异器编号为：{mutator.mutator_id}")
+                if mutator is not None:
+                    self.main_logger.warning("随机挑选的新的调用的目标种子id:%s，变异器编号为：%s",
+                                             mutator.seed_id, mutator.mutator_id)
 
         self.all_seed_list.seed_list[mutator.seed_id].mutate_time += 1
-        self.main_logger.info(
-            f"调用变异完成，为该种子的第{self.all_seed_list.seed_list[mutator.seed_id].mutate_time}次变异 变异的目标种子id:{mutator.seed_id}，变异器编号为：{mutator.mutator_id}")
-        
-        # 检查变异结果是否为有效字符串，防止 TypeError: encoding without a string argument
-        if mutate_testcase is None:
-            self.main_logger.error(f"变异器返回了 None，种子id:{mutator.seed_id}，变异器编号:{mutator.mutator_id}")
-            mutate_testcase = ""  # 使用空字符串作为fallback
-        elif not isinstance(mutate_testcase, str):
-            self.main_logger.warning(f"变异器返回了非字符串类型 {type(mutate_testcase)}，尝试转换")
-            mutate_testcase = str(mutate_testcase)
-        
-        return bytearray(mutate_testcase, "utf-8", errors="ignore"), is_by_random, mutator.seed_id, mutator.mutator_id, is_mutator_error_occur, is_from_structural_mutator
+        self.current_exec_seed_id, self.current_exec_mutator_index = mutator.seed_id, mutator.mutator_index
+        self.main_logger.info("调用变异完成，为该种子的第%s次变异 变异的目标种子id:%s，变异器编号为：%s",
+                              self.all_seed_list.seed_list[mutator.seed_id].mutate_time,
+                              mutator.seed_id, mutator.mutator_id, extra=logger.HOT)
+
+        return mutate_buf, is_by_random, mutator.seed_id, mutator.mutator_id, is_mutator_error_occur, is_from_structural_mutator
 
 
 
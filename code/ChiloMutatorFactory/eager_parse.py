@@ -0,0 +1,111 @@
+"""
+AFL++ 新队列条目的提前解析
+
+原来只有 AFL++ 在 fuzz_count 中选中某个种子时才把它送进 解析 -> 生成变异器 -> 修复 的流水线，
+新条目前几次被选中时流水线还是空的。queue_new_entry() 收到新条目后立即把它登记进 AFLSeedList，
+并按新颖度放入这里的优先队列；解析器空闲（上游没有任务、下游生成队列有空位）时从中取出最可能被选中的条目提前解析，
+AFL++ 真正选中它时解析结果（以及随之生成的变异器）已经在等待了。
+
+新颖度：文件名带 +cov（AFL++ 发现了新边，而不只是新的命中次数桶）的优先，其次是更短的条目（AFL++ 偏好更小的输入，解析也更便宜），
+最后按登记顺序（越新越优先）。
+"""
+import heapq
+import itertools
+import threading
+
+
+def novelty_of(filename, size):
+    """
+    计算新条目的优先级（越小越先解析）
+    :param filename: AFL++ 新条目的文件名
+    :param size: 条目的字节数
+    :return: 可比较的优先级元组
+    """
+    return (0 if "+cov" in filename else 1, size)
+
+
+class EagerParseQueue:
+    """
+    提前解析的有界优先队列，AFL++ 主线程放入，解析器线程取出
+    """
+    def __init__(self, max_pending):
+        """
+        :param max_pending: 最多排队的条目数，满了之后新条目不再提前解析
+        """
+        self.max_pending = max_pending
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        self.registered_count = 0   # 放入队列的条目数
+        self.dropped_count = 0      # 队列已满被丢弃的条目数
+        self.parsed_count = 0       # 被解析器提前取出解析的条目数
+        self.skipped_count = 0      # 取出时已经被 AFL++ 选中过（走了正常流程）的条目数
+        self.hit_count = 0          # AFL++ 第一次选中时已经提前解析完成的条目数
+        self.miss_count = 0         # AFL++ 第一次选中时还没有提前解析完成的条目数
+
+    def put(self, seed_id, priority):
+        """
+        :param seed_id: 已登记进 AFLSeedList 的种子编号
+        :param priority: novelty_of 计算的优先级
+        :return: 是否放入
+        """
+        with self._lock:
+            if len(self._heap) >= self.max_pending:
+                self.dropped_count += 1
+                return False
+            # 计数器取负：同优先级时越新的条目越先解析
+            heapq.heappush(self._heap, (priority, -next(self._counter), seed_id))
+            self.registered_count += 1
+            return True
+
+    def pop(self, is_wanted):
+        """
+        取出优先级最高、仍然需要提前解析的条目
+        :param is_wanted: 输入种子编号，返回该种子是否仍需提前解析（没有被 AFL++ 选中过，也没有解析过）
+        :return: 种子编号，队列为空时为 None
+        """
+        with self._lock:
+            while self._heap:
+                _, _, seed_id = heapq.heappop(self._heap)
+                if is_wanted(seed_id):
+                    self.parsed_count += 1
+                    return seed_id
+                self.skipped_count += 1
+            return None
+
+    def record_first_selection(self, is_parsed):
+        """
+        AFL++ 第一次选中一个提前登记的条目时调用
+        :param is_parsed: 此时该条目是否已经解析完成
+        :return: 无返回值
+        """
+        with self._lock:
+            if is_parsed:
+                self.hit_count += 1
+            else:
+                self.miss_count += 1
+
+    def hit_rate(self):
+        """
+        :return: 提前解析的命中率（AFL++ 第一次选中时已解析完成的比例），还没有选中过任何条目时为 0
+        """
+        total = self.hit_count + self.miss_count
+        return self.hit_count / total if total else 0.0
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        with self._lock:
+            pending = len(self._heap)
+        return {
+            "pending": pending,
+            "registered": self.registered_count,
+            "dropped": self.dropped_count,
+            "parsed": self.parsed_count,
+            "skipped": self.skipped_count,
+            "hit": self.hit_count,
+            "miss": self.miss_count,
+            "hit_rate": round(self.hit_rate(), 4),
+        }
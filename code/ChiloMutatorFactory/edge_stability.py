@@ -0,0 +1,116 @@
+"""
+不稳定边（flaky edge）检测
+
+DBMS 目标中的后台线程、内存分配器、定时器等会产生与输入无关的边，这些边会被 BitMap.add_bitmap 当成新边，
+错误地奖励恰好在执行的变异器。这里记录最近执行过的测试用例的命中下标，同一个测试用例再次执行
+（变异器产生了重复的输出，或 fuzz 中按间隔主动重放上一个测试用例）时比较两次的命中下标，
+两次结果不同的边记一次翻转，翻转次数达到阈值的边标记为不稳定，之后不再计入新边、新桶和稀有度奖励。
+
+每次比较只涉及两次执行命中的下标（np.setxor1d），与位图大小无关，可以在 post_run 中直接调用。
+"""
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+INSTABILITY_FILE_NAME = "instability.json"
+
+
+class EdgeStabilityTracker:
+    """
+    基于相同输入多次执行的不稳定边检测器
+    """
+    def __init__(self, map_size, history_size=256, min_toggles=2, state_path=None):
+        """
+        :param map_size: 位图大小
+        :param history_size: 记住最近多少个不同测试用例的命中下标
+        :param min_toggles: 一条边翻转多少次后被标记为不稳定
+        :param state_path: instability.json 的路径，存在且位图大小一致时加载其中的不稳定边
+        """
+        self.map_size = map_size
+        self.history_size = history_size
+        self.min_toggles = min_toggles
+        self.unstable_mask = np.zeros(map_size, dtype=np.uint8)    # 1 为不稳定边，交给 BitMap 屏蔽
+        self._toggles = np.zeros(map_size, dtype=np.uint32)        # 每条边的翻转次数
+        self._recent = OrderedDict()    # 测试用例摘要 -> 第一次执行时的命中下标
+        self.compare_count = 0          # 相同输入的比较次数
+        self.mismatch_count = 0         # 命中下标不同的比较次数
+        self.loaded_count = 0           # 从上一次运行继承的不稳定边数
+        if state_path is not None and os.path.exists(state_path):
+            self._load(state_path)
+
+    def _load(self, state_path):
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("map_size") != self.map_size:
+            return
+        indices = np.asarray(state.get("unstable_edges", []), dtype=np.intp)
+        self.unstable_mask[indices] = 1
+        self.loaded_count = int(indices.size)
+
+    def observe(self, digest, indices):
+        """
+        记录一次执行：该测试用例之前执行过时比较两次的命中下标
+        :param digest: 测试用例内容的摘要
+        :param indices: 本次执行命中的下标（升序、不重复）
+        :return: 本次新标记为不稳定的边数
+        """
+        previous = self._recent.get(digest)
+        if previous is None:
+            self._recent[digest] = indices
+            if len(self._recent) > self.history_size:
+                self._recent.popitem(last=False)
+            return 0
+        self._recent.move_to_end(digest)
+        self.compare_count += 1
+        toggled = np.setxor1d(previous, indices, assume_unique=True)
+        if toggled.size == 0:
+            return 0
+        self.mismatch_count += 1
+        self._toggles[toggled] += 1
+        newly = toggled[(self._toggles[toggled] >= self.min_toggles) & (self.unstable_mask[toggled] == 0)]
+        self.unstable_mask[newly] = 1
+        return int(newly.size)
+
+    def unstable_count(self):
+        """
+        :return: 当前被标记为不稳定的边数
+        """
+        return int(np.count_nonzero(self.unstable_mask))
+
+    def stats(self):
+        """
+        :return: 比较次数、不一致次数、不稳定边数等计数器
+        """
+        return {
+            "compare": self.compare_count,
+            "mismatch": self.mismatch_count,
+            "unstable": self.unstable_count(),
+            "loaded": self.loaded_count,
+        }
+
+    def save(self, state_path, top_n=100):
+        """
+        将不稳定边及统计信息原子写入 instability.json（供 ChiloDisco 展示和下一次运行继承）
+        :param state_path: 文件路径
+        :param top_n: 额外导出翻转次数最多的前多少条边
+        :return: 无返回值
+        """
+        toggled = np.flatnonzero(self._toggles)
+        top = toggled[np.argsort(self._toggles[toggled])[::-1][:top_n]]
+        state = dict(self.stats())
+        state.update({
+            "map_size": self.map_size,
+            "min_toggles": self.min_toggles,
+            "stability": 1.0 - self.mismatch_count / self.compare_count if self.compare_count else 1.0,
+            "unstable_edges": np.flatnonzero(self.unstable_mask).tolist(),
+            "top_toggles": [[int(i), int(self._toggles[i])] for i in top],
+        })
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
@@ -0,0 +1,109 @@
+"""
+变异器生成调控器
+
+原来每次 fuzz_count 都会把种子放入解析队列，解析后每次选中都会触发一次新的 LLM 变异器生成和一次修复，
+一个被 AFL++ 选中 40 次的种子会得到 40 个大多互相重复的变异器，这是 token 的最大开销。
+调控器位于解析器和变异器生成队列之间，对每次选中做出决定：
+    generate：放入生成队列（第一次选中；上一次生成的变异器已经到位，且该种子的变异器之后又发现了新边或重复率较低；
+              上一次生成超过 RETRY_INTERVAL 秒仍未到位时重试）
+    reuse：不生成，把该种子现有变异器中后验均值最高的一个直接放入待执行队列（达到上限、没有新证据、上一次生成还未到位）
+    wait：和 reuse 相同的情况下该种子还没有可用的变异器，什么都不做
+每个 reuse/wait 都省下一次生成和修复，按平均每个变异器的生成+修复 token 数估算节省的 token。
+"""
+import threading
+
+GENERATE = "generate"
+REUSE = "reuse"
+WAIT = "wait"
+
+
+class GenerationGovernor:
+    """
+    按种子限制变异器生成的次数，并要求有收益的证据才继续生成
+    """
+    def __init__(self, max_per_seed, similarity_threshold, retry_interval):
+        """
+        :param max_per_seed: 每个种子最多生成多少次变异器
+        :param similarity_threshold: 该种子变异器的平均重复率低于该值时视为还值得继续生成
+        :param retry_interval: 上一次生成超过多少秒还没有得到变异器（生成或修复失败）时允许重试
+        """
+        self.max_per_seed = max_per_seed
+        self.similarity_threshold = similarity_threshold
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._issued = {}           # 种子编号 -> 已放入生成队列的次数
+        self._last_issue = {}       # 种子编号 -> (放入时间, 当时的变异器个数, 当时累计的新边数)
+
+        self.decision_count = {GENERATE: 0, REUSE: 0, WAIT: 0}
+        self.generation_count = 0   # 完成的生成次数（写入生成器CSV的行数）
+        self.generation_tokens = 0  # 生成与修复消耗的 token 总数
+
+    def decide(self, seed_id, evidence, now):
+        """
+        对一次选中做出决定
+        :param seed_id: 种子编号
+        :param evidence: ChiloMutatorPool.seed_generation_evidence 的返回值
+        :param now: 当前时间
+        :return: (决定, 原因)
+        """
+        members, best, new_edges, similarity = evidence
+        with self._lock:
+            issued = self._issued.get(seed_id, 0)
+            decision, reason = self._decide(seed_id, issued, members, new_edges, similarity, now)
+            if decision == GENERATE:
+                self._issued[seed_id] = issued + 1
+                self._last_issue[seed_id] = (now, members, new_edges)
+            elif best is None:
+                decision = WAIT
+            self.decision_count[decision] += 1
+            return decision, reason
+
+    def _decide(self, seed_id, issued, members, new_edges, similarity, now):
+        if issued == 0:
+            return GENERATE, "first"
+        if issued >= self.max_per_seed:
+            return REUSE, "cap"
+        issue_time, members_at_issue, edges_at_issue = self._last_issue[seed_id]
+        if members <= members_at_issue:
+            # 上一次生成的变异器还没有到位（仍在生成/修复，或已失败）
+            if now - issue_time >= self.retry_interval:
+                return GENERATE, "retry"
+            return REUSE, "in_flight"
+        if new_edges > edges_at_issue:
+            return GENERATE, "new_edges"
+        if similarity < self.similarity_threshold:
+            return GENERATE, "low_similarity"
+        return REUSE, "no_evidence"
+
+    def record_tokens(self, tokens, is_generation):
+        """
+        记录一次生成或修复消耗的 token
+        :param tokens: 上传与补全 token 之和
+        :param is_generation: 是否为一次生成（修复时为 False，只累加 token）
+        :return: 无返回值
+        """
+        with self._lock:
+            self.generation_tokens += tokens
+            if is_generation:
+                self.generation_count += 1
+
+    def saved_tokens(self):
+        """
+        :return: 估算节省的 token 数（reuse/wait 的次数 x 平均每次生成+修复的 token 数）
+        """
+        if self.generation_count == 0:
+            return 0
+        saved = self.decision_count[REUSE] + self.decision_count[WAIT]
+        return int(saved * self.generation_tokens / self.generation_count)
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        return {
+            "decisions": dict(self.decision_count),
+            "seeds": len(self._issued),
+            "generations": self.generation_count,
+            "tokens": self.generation_tokens,
+            "saved_tokens": self.saved_tokens(),
+        }
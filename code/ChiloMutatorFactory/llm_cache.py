@@ -0,0 +1,150 @@
+"""
+LLM 回复的持久化缓存（SQLite）
+
+每次重启 FUZZ、以及之前的 FUZZ 中已经见过的种子，都要为完全相同的提示词再付一次解析和变异器生成的费用。
+这里在 LLMTool.chat_llm 前面加一层按内容寻址的缓存：键为 hash(模型, 系统提示词, 提示词)，
+其中的模型为该阶段所有端点模型名的组合（查缓存时还没有选出端点，换掉任何一个端点的模型都会让旧回复失效），
+只缓存包含该阶段所需代码块的回复（格式错误的回复不缓存，否则命中后会一直格式错误）。
+各阶段的使用方式不同：
+    always：总是查找、总是写入（解析器：同一条 SQL 的解析结果没有必要多样）；
+    sample：按 SAMPLE_RATE 的概率使用缓存中的回复，其余照常调用 LLM 并写入（生成类阶段需要多样性）；
+            每个提示词只保存一条回复，新的回复覆盖旧的，因此命中的总是最近一次写入的回复，而不是从历史回复中抽样；
+    off：不使用缓存。
+缓存总大小超过上限时按最近使用时间淘汰；只读模式下不写入也不更新使用时间，用于可复现的基准测试。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+ALWAYS = "always"
+SAMPLE = "sample"
+OFF = "off"
+MODES = (ALWAYS, SAMPLE, OFF)
+
+
+def cache_key(model, system_prompt, prompt):
+    """
+    :return: 缓存键（各字段带长度前缀后的 SHA-256）
+    """
+    digest = hashlib.sha256()
+    for field in (model, system_prompt, prompt):
+        data = field.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite 实现的 LLM 回复缓存，所有阶段共享一个，线程安全
+    """
+    def __init__(self, cache_file, max_bytes, read_only=False):
+        """
+        :param cache_file: SQLite 文件路径
+        :param max_bytes: 缓存内容的总字节数上限，超过后按最近使用时间淘汰到上限的 90%
+        :param read_only: 只读模式，文件不存在时所有查找都不命中
+        """
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._conn = None
+        self.total_bytes = 0
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.store_count = 0
+        self.evict_count = 0
+        self.saved_tokens = 0       # 命中时省下的 token（该回复当初消耗的上传+补全 token）
+
+        if read_only:
+            if os.path.exists(cache_file):
+                self._conn = sqlite3.connect(f"file:{cache_file}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_file, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                               "key TEXT PRIMARY KEY, model TEXT, content TEXT, up_token INTEGER, "
+                               "down_token INTEGER, size INTEGER, created REAL, last_used REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        if self._conn is not None:
+            self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """
+        :param key: cache_key 的返回值
+        :return: (回复内容, 上传token, 补全token)，未命中时为 None
+        """
+        with self._lock:
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute("SELECT content, up_token, down_token FROM responses WHERE key = ?",
+                                         (key,)).fetchone()
+            if row is None:
+                self.miss_count += 1
+                return None
+            self.hit_count += 1
+            self.saved_tokens += row[1] + row[2]
+            if not self.read_only:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row
+
+    def put(self, key, model, content, up_token, down_token):
+        """
+        写入一条回复，只读模式下不写入
+        :return: 无返回值
+        """
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            if self.read_only or self._conn is None:
+                return
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, model, content, up_token, down_token, size, now, now))
+            self.total_bytes += size - (old[0] if old is not None else 0)
+            self.store_count += 1
+            if self.total_bytes > self.max_bytes:
+                self._evict(self.total_bytes - int(self.max_bytes * 0.9))
+
+    def _evict(self, need_bytes):
+        freed = 0
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            keys.append((key,))
+            freed += size
+            if freed >= need_bytes:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.total_bytes -= freed
+        self.evict_count += len(keys)
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        with self._lock:
+            total = self.hit_count + self.miss_count
+            return {
+                "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+                "hits": self.hit_count,
+                "misses": self.miss_count,
+                "hit_rate": round(self.hit_count / total, 4) if total else 0.0,
+                "stores": self.store_count,
+                "evictions": self.evict_count,
+                "saved_tokens": self.saved_tokens,
+                "read_only": self.read_only,
+            }
+
+    def close(self):
+        """
+        :return: 无返回值
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
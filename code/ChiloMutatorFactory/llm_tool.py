@@ -1,64 +1,329 @@
 """
 LLM调用相关的封装好的函数
+
+一个 LLMTool 可以配置多个带权重的端点（不同的 BASE_URL / API_KEY / 模型），每次调用按权重随机选择一个熔断器未打开的端点。
+启用对冲时，调用耗时超过该阶段最近调用耗时的分位数（默认 p90）仍未返回，就向另一个端点再发一个相同的请求，
+先返回有效结果的一方胜出，另一方被取消（不再重试；流式请求立即关闭连接，非流式的同步 HTTP 请求无法中断，只能丢弃其结果）。
+录制/回放模式见 llm_trace。
 """
-import re
+import collections
+import random
 import time
 import threading
 
-from openai import OpenAI
 import logging
+from typing import NamedTuple
+
+from . import llm_cache
+from . import llm_transport
+
+SQL_BLOCK_PATTERN = llm_transport.fence_pattern("sql")
+PYTHON_BLOCK_PATTERN = llm_transport.fence_pattern("python")
+
+
+class LLMEndpoint(NamedTuple):
+    """LLMTool 的一个端点"""
+    transport: llm_transport.LLMTransport  # 该端点共享的传输层
+    model: str                             # 模型名
+    weight: float                          # 负载均衡权重
+
+
+class HedgePolicy:
+    """
+    对冲请求的触发时间：该阶段最近若干次成功调用耗时的分位数（对冲过的调用按原请求的耗时计）
+    """
+    def __init__(self, percentile=0.9, min_samples=20, window=200, min_delay=5.0):
+        """
+        :param percentile: 取最近调用耗时的哪个分位数作为对冲时间
+        :param min_samples: 样本数不足时不对冲
+        :param window: 保留最近多少次调用的耗时
+        :param min_delay: 对冲时间的下限（秒）
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """
+        :param latency: 一次成功调用的耗时（秒）
+        :return: 无返回值
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self):
+        """
+        :return: 调用开始后多少秒发出对冲请求，样本不足时为 None
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return max(self.min_delay, ordered[index])
+
+
+class _Attempt:
+    """对冲调用中的一个请求，在独立的线程中执行"""
+    def __init__(self, endpoint, messages, request_number, done, stream_language):
+        self.endpoint = endpoint
+        self.metrics = llm_transport.LLMCallMetrics()
+        self.cancel = threading.Event()
+        self.result = None
+        self.error = None       # 传输层抛出的非传输层异常（程序错误），由发起对冲的线程重新抛出
+        self.finished = False
+        self.start_time = time.time()
+        self.latency = None     # 从发出到完成（或被取消）的耗时
+        self._done = done
+        self._on_late_finish = None
+        self._lock = threading.Lock()
+        self._args = (endpoint.model, messages, request_number, self.metrics, self.cancel, stream_language)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            self.result = self.endpoint.transport.chat(*self._args)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.latency = time.time() - self.start_time
+            with self._lock:
+                self.finished = True
+                on_late_finish = self._on_late_finish
+            self._done.release()
+            if on_late_finish is not None:
+                on_late_finish(self)
+
+    def abandon(self, on_late_finish):
+        """
+        取消该请求（不再重试）
+        :param on_late_finish: 请求之后才完成（或被取消）时以该 _Attempt 调用
+        :return: 请求是否已经完成（已完成时不会调用 on_late_finish）
+        """
+        self.cancel.set()
+        with self._lock:
+            if self.finished:
+                return True
+            self._on_late_finish = on_late_finish
+            return False
+
+
 class LLMTool:
     # 类级别的共享计数器（所有实例共享）
     _global_request_count = 0
     _global_count_lock = threading.Lock()
     
-    def __init__(self, llm_api_key, llm_model, base_url, logger:logging.Logger):
+    def __init__(self, llm_api_key, llm_model, base_url, logger:logging.Logger, transport=None, endpoints=None,
+                 hedge_policy=None, stream_language=None, cache=None, cache_mode=llm_cache.OFF, cache_sample_rate=0.0,
+                 stage="", trace_recorder=None, trace_replayer=None):
         """
         初始化函数
         :param llm_api_key: LLM的APIKey
         :param llm_model: 选择的LLM模型
         :param base_url: LLM的baseURL
+        :param transport: 共享的 LLMTransport（同一端点的多个实例共用连接池、限流和熔断），为 None 时按默认配置单独创建
+        :param endpoints: LLMEndpoint 列表，给出时忽略前面的单端点参数
+        :param hedge_policy: HedgePolicy，为 None 时不对冲
+        :param stream_language: 该阶段需要的代码块语言（sql / python），传输层启用流式模式时该代码块结束后立即结束请求；
+                                同时只有包含该代码块的回复才会写入回复缓存
+        :param cache: 共享的 LLMResponseCache，为 None 时不使用缓存
+        :param cache_mode: 该阶段的缓存方式（always / sample / off）
+        :param cache_sample_rate: sample 方式下使用缓存中回复的概率
+        :param stage: 阶段名，录制/回放 trace 时使用
+        :param trace_recorder: llm_trace.TraceRecorder，不为 None 时录制每次成功的调用
+        :param trace_replayer: llm_trace.TraceReplayer，不为 None 时不访问网络，从 trace 中回放回复
         """
         self.llm_api_key = llm_api_key
         self.llm_model = llm_model
         self.base_url = base_url
         self.logger = logger
         
-        # 复用 OpenAI client 实例，提高性能
-        self.client = OpenAI(
-            api_key=self.llm_api_key,
-            base_url=self.base_url,
-        )
-        self.logger.info(f"LLM工具已实例化 (模型: {llm_model})")
+        if not endpoints:
+            if transport is None:
+                transport = llm_transport.LLMTransport(self.base_url, self.llm_api_key, self.logger)
+            endpoints = [LLMEndpoint(transport, llm_model, 1.0)]
+        self.endpoints = endpoints
+        # 缓存键中的模型：查缓存时还没有选出端点，用该阶段所有端点的模型名
+        self.cache_model = "+".join(sorted({endpoint.model for endpoint in endpoints}))
+        self.hedge_policy = hedge_policy
+        self.stream_language = stream_language
+        self.cache = cache if cache_mode != llm_cache.OFF else None
+        self.cache_mode = cache_mode
+        self.cache_sample_rate = cache_sample_rate
+        self.stage = stage
+        self.trace_recorder = trace_recorder
+        self.trace_replayer = trace_replayer
+
+        self._stats_lock = threading.Lock()
+        self.hedge_count = 0            # 发出的对冲请求数
+        self.hedge_win_count = 0        # 对冲请求先返回的次数
+        self.hedge_late_tokens = 0      # 落败请求在返回结果之后才完成时消耗的补全 token
+        self.logger.info("LLM工具已实例化 (模型: %s，端点数: %s，对冲: %s)", llm_model, len(endpoints),
+                         '启用' if hedge_policy is not None else '未启用')
+
+    def _pick_endpoint(self, exclude=None):
+        """
+        按权重随机选择一个端点，优先选择熔断器未打开的端点
+        :param exclude: 尽量不选的端点（对冲时为原请求的端点）
+        :return: LLMEndpoint
+        """
+        candidates = [e for e in self.endpoints if e is not exclude] or self.endpoints
+        healthy = [e for e in candidates if e.transport.breaker.state != llm_transport.CircuitBreaker.OPEN]
+        candidates = healthy or candidates
+        return random.choices(candidates, weights=[e.weight for e in candidates])[0]
 
     def chat_llm(self, prompt: str, system_prompt = "You are a DBMS fuzzing expert. Carefully reason step-by-step following the user's instructions, then provide the result."):
         """
         :param prompt:      提示词字典，需要按照{role}
-        :return:                  调用LLM后LLM返回的结果
+        :return:                  调用LLM后LLM返回的结果；重试后仍失败时返回空内容，由调用方按格式错误处理
         """
         # 使用类级别的全局计数器，所有LLM实例共享
         with LLMTool._global_count_lock:
             LLMTool._global_request_count += 1
             count_now = LLMTool._global_request_count
         
-        self.logger.info(f"LLM 第{count_now}次请求准备开始 (模型: {self.llm_model})")
+        self.logger.info("LLM 第%s次请求准备开始 (模型: %s)", count_now, self.llm_model)
         start_time = time.time()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        key = None
+        if self.cache is not None:
+            key = llm_cache.cache_key(self.cache_model, system_prompt, prompt)
+            if self.cache_mode == llm_cache.ALWAYS or random.random() < self.cache_sample_rate:
+                cached = self.cache.get(key)
+                cache_metrics = llm_transport.LLMCallMetrics()
+                if cached is not None:
+                    cache_metrics.cache_hits = 1
+                    llm_transport.record_thread_metrics(cache_metrics)
+                    self.logger.info("第%s次请求命中回复缓存", count_now)
+                    return cached[0], 0, 0
+                cache_metrics.cache_misses = 1
+                llm_transport.record_thread_metrics(cache_metrics)
+        hedge_delay = self.hedge_policy.delay() if self.hedge_policy is not None else None
+        if self.trace_replayer is not None:
+            result = self.trace_replayer.replay(self.stage, self.llm_model, system_prompt, prompt,
+                                                self.stream_language)
+            replay_metrics = llm_transport.LLMCallMetrics()
+            replay_metrics.calls = 1
+            replay_metrics.service_time = time.time() - start_time
+            llm_transport.record_thread_metrics(replay_metrics)
+            if result is None:
+                self.logger.warning("第%s次请求：trace 中没有阶段 %s 的录制记录，无法回放", count_now, self.stage)
+                return "", 0, 0
+            # 回退命中的回复并不对应当前提示词，回放的回复既不写入缓存，也不计入对冲的延迟统计
+            self.logger.info("第%s次请求回放结束，用时：%.2fs", count_now, time.time() - start_time)
+            return result
+        if hedge_delay is None:
+            endpoint = self._pick_endpoint()
+            result = endpoint.transport.chat(endpoint.model, messages, count_now,
+                                             stream_language=self.stream_language)
+            if result is not None and self.hedge_policy is not None:
+                self.hedge_policy.record(time.time() - start_time)
+        else:
+            result = self._hedged_chat(messages, count_now, hedge_delay)
+        if result is None:
+            return "", 0, 0
+        if key is not None and self._is_cacheable(result[0]):
+            self.cache.put(key, self.cache_model, *result)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(self.stage, self.llm_model, system_prompt, prompt, result,
+                                       time.time() - start_time)
+        self.logger.info("第%s次请求成功并结束，用时：%.2fs", count_now, time.time() - start_time)
+        return result
+
+    def _is_cacheable(self, content):
+        """
+        :param content: 回复内容
+        :return: 是否可以写入缓存（包含该阶段需要的代码块；没有指定代码块语言时只要求非空）
+        """
+        if not content:
+            return False
+        if self.stream_language is None:
+            return True
+        pattern = SQL_BLOCK_PATTERN if self.stream_language == "sql" else PYTHON_BLOCK_PATTERN
+        return pattern.search(content) is not None
+
+    def _hedged_chat(self, messages, request_number, hedge_delay):
+        """
+        先向一个端点发出请求，超过 hedge_delay 秒仍未返回时向另一个端点发出相同的请求，取先返回的有效结果
+        两个请求的 token 都计入返回值：落败请求的提示词已经完整发出，按胜出请求的上传 token 计；
+        落败请求之后才完成时，它的补全 token 记入 hedge_late_tokens
+        对冲时间的样本总是原请求的耗时（胜出请求的耗时会让分位数越来越小）：原请求落败且尚未完成时，
+        等它完成后再记；被取消的流式请求只知道耗时的下限，按取消时的耗时记
+        :return: (回复内容, 上传token, 补全token)，两个请求都失败时为 None
+        """
+        done = threading.Semaphore(0)
+        primary = _Attempt(self._pick_endpoint(), messages, request_number, done, self.stream_language)
+        attempts = [primary]
+        if not done.acquire(timeout=hedge_delay):
+            self.logger.info("第%s次请求超过 %.1fs 未返回，发出对冲请求", request_number, hedge_delay)
+            attempts.append(_Attempt(self._pick_endpoint(exclude=primary.endpoint), messages, request_number, done,
+                                     self.stream_language))
+            done.acquire()
+        winner = None
         while True:
-            try:
-                # 复用 client 实例（OpenAI SDK 内部已做线程安全处理）
-                response = self.client.chat.completions.create(
-                    model=self.llm_model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                self.logger.info(f"第{count_now}次请求成功并结束，用时：{time.time()-start_time:.2f}s")
-                return response.choices[0].message.content, response.usage.prompt_tokens, response.usage.completion_tokens
-            except Exception as e:
-                self.logger.info(f"第{count_now}次请求失败！错误信息：{e}")
-                self.logger.info(f"正在重试第{count_now}次请求")
-                continue
+            finished = [a for a in attempts if a.finished]
+            winner = next((a for a in finished if a.result is not None and a.result[0]), None)
+            if winner is not None or len(finished) == len(attempts):
+                break
+            done.acquire()
+
+        def on_late_finish(attempt):
+            self._count_late_tokens(attempt)
+            if attempt is primary:
+                self.hedge_policy.record(attempt.latency)
+
+        losers = [a for a in attempts if a is not winner]
+        finished_losers = [loser for loser in losers if loser.abandon(on_late_finish)]
+        if winner is not None and (winner is primary or primary in finished_losers):
+            self.hedge_policy.record(primary.latency)
+        metrics = winner.metrics if winner is not None else primary.metrics
+        metrics.hedges = len(attempts) - 1
+        llm_transport.record_thread_metrics(metrics)
+        with self._stats_lock:
+            self.hedge_count += len(attempts) - 1
+            if winner is not None and winner is not primary:
+                self.hedge_win_count += 1
+        if winner is None:
+            error = next((a.error for a in attempts if a.error is not None), None)
+            if error is not None:
+                raise error
+            return next((a.result for a in attempts if a.result is not None), None)
+
+        content, up_token, down_token = winner.result
+        for loser in losers:
+            if loser not in finished_losers:
+                up_token += winner.result[1]
+            elif loser.result is not None:
+                up_token += loser.result[1]
+                down_token += loser.result[2]
+        return content, up_token, down_token
+
+    def _count_late_tokens(self, attempt):
+        if attempt.result is None:
+            return
+        with self._stats_lock:
+            self.hedge_late_tokens += attempt.result[2]
+
+    @staticmethod
+    def take_call_metrics():
+        """
+        取出当前线程自上次取出以来所有 LLM 调用的排队/服务/退避时间（各阶段写 CSV 时调用）
+        :return: llm_transport.LLMCallMetrics
+        """
+        return llm_transport.take_thread_metrics()
+
+    def hedge_stats(self):
+        """
+        :return: 对冲计数器字典
+        """
+        with self._stats_lock:
+            return {"hedges": self.hedge_count, "hedge_wins": self.hedge_win_count,
+                    "hedge_late_tokens": self.hedge_late_tokens}
 
     def get_sql_block_content(self, all_content: str):
         """
@@ -78,13 +343,8 @@ class LLMTool:
         """
         # 匹配格式：开头若干反引号（3 个或更多），可有空格，语言标识 sql（大小写不敏感），可跟换行或空格，
         # 然后捕获任意内容，直到出现同样数量的反引号结束。
-        pattern = re.compile(
-            r'(?P<fence>`{3,})\s*sql(?:\r?\n)?(?P<code>[\s\S]*?)(?P=fence)',
-            flags=re.IGNORECASE
-        )
-
         results = []
-        for m in pattern.finditer(all_content):
+        for m in SQL_BLOCK_PATTERN.finditer(all_content):
             code = m.group('code')
             # 去掉开头和结尾的多余空行，但保留内部缩进和换行
             code = code.strip('\n')
@@ -108,13 +368,8 @@ class LLMTool:
         返回:
             List[str] - 每个匹配到的 python 代码块内容
         """
-        pattern = re.compile(
-            r'(?P<fence>`{3,})\s*python(?:\r?\n)?(?P<code>[\s\S]*?)(?P=fence)',
-            flags=re.IGNORECASE
-        )
-
         results = []
-        for m in pattern.finditer(all_content):
+        for m in PYTHON_BLOCK_PATTERN.finditer(all_content):
             code = m.group('code')
             # 去掉开头和结尾的多余空行，但保留内部缩进和换行
             code = code.strip('\n')
@@ -0,0 +1,146 @@
+"""
+LLM 调用的录制与回放
+
+录制模式下每次成功的 LLM 调用（阶段、模型、系统提示词、提示词、回复、用量、耗时）追加为 trace 文件的一行 JSON；
+回放模式下不访问网络，按提示词从 trace 中确定性地取出回复：
+    同一提示词录制过多次时按录制顺序轮流返回；
+    没有录制过的提示词（结构化变异的 crash 案例是随机抽取的、修复的报错信息也各不相同）
+    从同一阶段（不知道阶段时为同一系统提示词）录制的回复中按提示词的哈希选一条，保证同一提示词每次回放的结果相同；
+    给出需要的代码块语言时只从包含该语言代码块的回复中选（解析器、生成器和语义修复器共用默认的系统提示词，
+    不限制语言时解析器可能拿到一个 python 变异器）。
+回放时可以按录制的耗时（乘以系数）、固定耗时或不等待来模拟 LLM 的延迟，
+这样在没有网络的机器上也能测量解析器/生成器/修复器的吞吐和 init() -> fuzz() 的整个流程。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from . import llm_cache
+
+
+class TraceRecorder:
+    """
+    把 LLM 调用追加写入 trace 文件，线程安全
+    """
+    def __init__(self, trace_file):
+        """
+        :param trace_file: trace 文件路径（JSON Lines），已存在时追加
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._file = open(trace_file, "a", encoding="utf-8")
+        self.record_count = 0
+
+    def record(self, stage, model, system_prompt, prompt, result, latency):
+        """
+        :param stage: 阶段名（parser / mutator_generator / structural_mutator / fixer）
+        :param model: 模型名
+        :param system_prompt: 系统提示词
+        :param prompt: 提示词
+        :param result: (回复内容, 上传token, 补全token)
+        :param latency: 调用耗时（秒）
+        :return: 无返回值
+        """
+        line = json.dumps({"stage": stage, "model": model, "system_prompt": system_prompt, "prompt": prompt,
+                           "content": result[0], "up_token": result[1], "down_token": result[2],
+                           "latency": round(latency, 4)}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.record_count += 1
+
+    def close(self):
+        """
+        :return: 无返回值
+        """
+        with self._lock:
+            self._file.close()
+
+
+class TraceReplayer:
+    """
+    从 trace 文件确定性地回放 LLM 回复
+    """
+    def __init__(self, trace_file, latency_mode="recorded", latency_scale=1.0):
+        """
+        :param trace_file: 录制模式写出的 trace 文件
+        :param latency_mode: recorded：按录制的耗时乘以 latency_scale 等待；none：不等待；数字：每次固定等待的秒数
+        :param latency_scale: recorded 模式下耗时的系数
+        """
+        self.latency_mode = latency_mode
+        self.latency_scale = latency_scale
+        self._by_key = {}       # cache_key -> [录制记录]
+        self._by_stage = {}     # 阶段名 -> [录制记录]
+        self._by_system = {}    # 系统提示词 -> [录制记录]（不知道阶段时回退使用，例如本地桩服务器）
+        self._next = {}         # cache_key -> 下一次返回第几条
+        self._by_language = {}  # (回退分组, 代码块语言) -> [包含该语言代码块的录制记录]
+        self._lock = threading.Lock()
+        self.exact_count = 0    # 按提示词精确回放的次数
+        self.fallback_count = 0 # 按阶段回退回放的次数
+        self.miss_count = 0     # 该阶段没有任何录制记录的次数
+        with open(trace_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = llm_cache.cache_key(entry["model"], entry["system_prompt"], entry["prompt"])
+                self._by_key.setdefault(key, []).append(entry)
+                self._by_stage.setdefault(entry["stage"], []).append(entry)
+                self._by_system.setdefault(entry["system_prompt"], []).append(entry)
+
+    def replay(self, stage, model, system_prompt, prompt, language=None):
+        """
+        :param stage: 阶段名，为 None 时按系统提示词回退
+        :param model: 模型名
+        :param system_prompt: 系统提示词
+        :param prompt: 提示词
+        :param language: 需要的代码块语言（sql / python），回退时只选包含该语言代码块的回复，为 None 时不限制
+        :return: (回复内容, 上传token, 补全token)，该阶段没有任何录制记录时为 None
+        """
+        key = llm_cache.cache_key(model, system_prompt, prompt)
+        with self._lock:
+            entries = self._by_key.get(key)
+            if entries is not None:
+                index = self._next.get(key, 0)
+                self._next[key] = index + 1
+                entry = entries[index % len(entries)]
+                self.exact_count += 1
+            else:
+                group = ("stage", stage) if stage is not None else ("system", system_prompt)
+                entries = self._fallback_entries(group, language)
+                if not entries:
+                    self.miss_count += 1
+                    return None
+                entry = entries[int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "little")
+                                % len(entries)]
+                self.fallback_count += 1
+        delay = self._delay(entry)
+        if delay > 0:
+            time.sleep(delay)
+        return entry["content"], entry["up_token"], entry["down_token"]
+
+    def _fallback_entries(self, group, language):
+        entries = (self._by_stage if group[0] == "stage" else self._by_system).get(group[1], [])
+        if language is None:
+            return entries
+        if (group, language) not in self._by_language:
+            fence = f"```{language}"
+            self._by_language[(group, language)] = [e for e in entries if fence in e["content"]]
+        return self._by_language[(group, language)]
+
+    def _delay(self, entry):
+        if self.latency_mode == "none":
+            return 0.0
+        if self.latency_mode == "recorded":
+            return entry["latency"] * self.latency_scale
+        return float(self.latency_mode)
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        with self._lock:
+            return {"exact": self.exact_count, "fallback": self.fallback_count, "miss": self.miss_count}
@@ -0,0 +1,596 @@
+"""
+LLM 调用的共享传输层
+
+原来 LLMTool.chat_llm 在 while True 中无延迟、无超时地重试，不区分 429、5xx 和请求本身的错误，
+服务商限流时解析器、变异器生成器、结构化变异器、修复器的所有线程全速重试，整条流水线停滞数分钟。
+这里每个端点（BASE_URL + API_KEY）一个 LLMTransport，由使用该端点的所有 LLMTool 共享：
+    连接池：httpx 连接池 + 信号量限制同时进行的请求数；
+    限流：每分钟请求数、每分钟 token 数两个令牌桶（预扣估算的 token，返回后按实际用量补差）；
+    超时：每个请求的连接/读取超时，超时按可重试错误处理；
+    退避：按错误类别取基准时间的指数退避（full jitter），429 时遵守 Retry-After；
+    熔断：连续失败达到阈值后熔断一段时间，期间使用该端点的所有阶段线程在发出请求前阻塞（即暂停该阶段），
+          冷却结束后只放行一个探测请求，成功则恢复，失败则加倍冷却时间再次熔断。
+每次调用的排队时间（令牌桶、连接池、熔断等待）、服务时间（请求耗时，含失败的请求）和退避时间分开记录，
+按线程累计，各阶段写 CSV 时用 take_thread_metrics() 取出。
+
+流式模式（LLM_TRANSPORT.STREAM）：以 stream=True 请求，边接收边用 FenceScanner 查找代码块，
+第一个完整的 ```sql / ```python 代码块结束时立即关闭连接，不再接收推理模型在代码块之后的长尾输出。
+首个 token 的时间和代码块结束的时间分开记录。提前关闭时服务端不会返回用量，
+上传 token 按提示词字符数估算，补全 token 按收到的内容片段数计（通常每个片段一个 token）。
+"""
+import random
+import re
+import threading
+import time
+
+import httpx
+import openai
+from openai import OpenAI
+
+# 错误类别
+RATE_LIMIT = "rate_limit"   # 429
+SERVER = "server"           # 5xx、408、409
+TIMEOUT = "timeout"         # 请求超时
+CONNECTION = "connection"   # 连接失败
+BAD_REQUEST = "bad_request" # 其余 4xx：请求本身有问题，重试基本没有意义
+UNKNOWN = "unknown"         # SDK 无法解析返回内容等，其余非传输层的异常（程序错误）不重试，直接抛出
+
+# 各错误类别的退避基准倍数（乘以 BACKOFF_BASE）
+BACKOFF_FACTOR = {RATE_LIMIT: 4.0, SERVER: 1.0, TIMEOUT: 1.0, CONNECTION: 2.0, BAD_REQUEST: 1.0, UNKNOWN: 1.0}
+
+_thread_metrics = threading.local()
+
+
+def classify_error(error):
+    """
+    :param error: 调用 OpenAI SDK 抛出的异常
+    :return: 错误类别
+    """
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code >= 500 or error.status_code in (408, 409):
+            return SERVER
+        return BAD_REQUEST
+    # 流式读取过程中的网络错误不会被 SDK 包装
+    if isinstance(error, httpx.TimeoutException):
+        return TIMEOUT
+    if isinstance(error, httpx.TransportError):
+        return CONNECTION
+    return UNKNOWN
+
+
+def is_transport_error(error):
+    """
+    :param error: 一次请求中抛出的异常
+    :return: 是否为 SDK 或 HTTP 层的异常；其余异常（例如 TypeError、AttributeError 等程序错误）重试也不会成功，
+             也不说明端点不健康
+    """
+    return isinstance(error, (openai.OpenAIError, httpx.HTTPError))
+
+
+def retry_after_of(error):
+    """
+    :param error: 异常
+    :return: 响应头 Retry-After 给出的秒数，没有或无法解析时为 None
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMCallMetrics:
+    """
+    一个阶段一段时间内 LLM 调用的时间拆分
+    """
+    __slots__ = ("calls", "queue_wait", "service_time", "backoff_time", "retries", "failures", "hedges",
+                 "first_token_time", "block_time", "early_stops", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.calls = 0              # chat 调用次数
+        self.queue_wait = 0.0       # 等待令牌桶、连接池和熔断恢复的时间
+        self.service_time = 0.0     # 请求耗时（含失败的请求）
+        self.backoff_time = 0.0     # 失败后退避等待的时间
+        self.retries = 0            # 重试次数
+        self.failures = 0           # 重试后仍放弃的调用次数
+        self.hedges = 0             # 发出的对冲请求数
+        self.first_token_time = 0.0 # 流式模式：从发出请求到收到第一个内容片段的时间
+        self.block_time = 0.0       # 流式模式：从发出请求到第一个完整代码块结束的时间（没有提前结束时为 0）
+        self.early_stops = 0        # 流式模式：代码块结束后提前关闭连接的次数
+        self.cache_hits = 0         # 回复缓存命中次数
+        self.cache_misses = 0       # 查找了回复缓存但未命中的次数
+
+    def add(self, other):
+        """
+        :param other: 另一个 LLMCallMetrics，累加到自身
+        :return: 无返回值
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def csv_fields(self):
+        """
+        :return: 写入各阶段 CSV 的列（排队时间、服务时间、退避时间、重试次数、对冲请求数、首 token 时间、代码块结束时间、
+                 缓存命中数、缓存未命中数）
+        """
+        return [round(self.queue_wait, 4), round(self.service_time, 4), round(self.backoff_time, 4), self.retries,
+                self.hedges, round(self.first_token_time, 4), round(self.block_time, 4),
+                self.cache_hits, self.cache_misses]
+
+
+CSV_COLUMNS = ["llm_queue_wait", "llm_service_time", "llm_backoff_time", "llm_retry_count", "llm_hedge_count",
+               "llm_ttft", "llm_time_to_block", "llm_cache_hit", "llm_cache_miss"]
+
+
+def fence_pattern(language):
+    """
+    :param language: 代码块的语言标识（sql / python）
+    :return: 匹配一个完整代码块的正则：开头若干反引号（3 个或更多）、语言标识（大小写不敏感），直到同样数量的反引号结束
+    """
+    return re.compile(r'(?P<fence>`{3,})\s*' + language + r'(?:\r?\n)?(?P<code>[\s\S]*?)(?P=fence)',
+                      flags=re.IGNORECASE)
+
+
+class FenceScanner:
+    """
+    在流式输出中增量查找第一个完整的代码块，匹配规则与 LLMTool.get_*_block_content 相同
+    """
+    def __init__(self, language):
+        """
+        :param language: 代码块的语言标识（sql / python）
+        """
+        self.pattern = fence_pattern(language)
+        self.opening = re.compile(r'`{3,}\s*' + language, flags=re.IGNORECASE)
+        self._parts = []
+        self._search_from = 0   # 之前的内容中没有开始标记，下一次从这里开始查找
+
+    def feed(self, text):
+        """
+        :param text: 新收到的内容片段
+        :return: 第一个完整代码块结束的位置（到此为止的内容足够提取代码块），还没有结束时为 None
+        """
+        self._parts.append(text)
+        if "`" not in text:
+            return None
+        buffer = "".join(self._parts)
+        match = self.pattern.search(buffer, self._search_from)
+        if match is not None:
+            return match.end()
+        open_match = self.opening.search(buffer, self._search_from)
+        if open_match is not None:
+            self._search_from = open_match.start()
+        else:
+            # 末尾可能是还没有接收完的开始标记
+            self._search_from = max(self._search_from, len(buffer) - 32)
+        return None
+
+    def text(self):
+        """
+        :return: 到目前为止收到的全部内容
+        """
+        return "".join(self._parts)
+
+
+def take_thread_metrics():
+    """
+    取出并清零当前线程累计的 LLM 调用时间拆分
+    :return: LLMCallMetrics
+    """
+    metrics = getattr(_thread_metrics, "value", None)
+    _thread_metrics.value = LLMCallMetrics()
+    return metrics if metrics is not None else LLMCallMetrics()
+
+
+def record_thread_metrics(metrics):
+    """
+    把一次调用的时间拆分累计到当前线程
+    :param metrics: LLMCallMetrics
+    :return: 无返回值
+    """
+    if getattr(_thread_metrics, "value", None) is None:
+        _thread_metrics.value = LLMCallMetrics()
+    _thread_metrics.value.add(metrics)
+
+
+class TokenBucket:
+    """
+    预约式令牌桶：先扣除，余额为负时返回需要等待的时间，线程按预约顺序依次放行
+    """
+    def __init__(self, per_minute):
+        """
+        :param per_minute: 每分钟补充的数量，同时也是桶的容量
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """
+        :param amount: 需要的数量，超过容量时按容量计
+        :return: 需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount):
+        """
+        按实际用量补差
+        :param amount: 正数为归还，负数为追加扣除
+        :return: 无返回值
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """
+    端点熔断器：closed -> open（阻塞所有请求）-> half_open（只放行一个探测请求）-> closed / open
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, cooldown, max_cooldown, probe_timeout=300.0):
+        """
+        :param failure_threshold: 连续多少次可重试的失败后熔断，0 表示不熔断
+        :param cooldown: 第一次熔断的冷却时间（秒）
+        :param max_cooldown: 探测失败时冷却时间加倍的上限
+        :param probe_timeout: 探测请求超过该时间仍未结束时，视为已丢失，允许其他请求接替探测
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.open_count = 0
+        self.probe_timeout = probe_timeout
+        self._probe_in_flight = False
+        self._probe_start = 0.0
+        self._cond = threading.Condition()
+
+    def wait_ready(self):
+        """
+        熔断期间阻塞，直到可以发出请求
+        :return: 该请求是否为半开状态下的探测请求
+        """
+        with self._cond:
+            while True:
+                if self.state == self.CLOSED:
+                    return False
+                if self.state == self.OPEN:
+                    remaining = self.open_until - time.monotonic()
+                    if remaining > 0:
+                        self._cond.wait(remaining)
+                        continue
+                    self.state = self.HALF_OPEN
+                now = time.monotonic()
+                probe_remaining = self._probe_start + self.probe_timeout - now
+                if not self._probe_in_flight or probe_remaining <= 0:
+                    self._probe_in_flight = True
+                    self._probe_start = now
+                    return True
+                self._cond.wait(probe_remaining)
+
+    def release_probe(self):
+        """
+        探测请求既没有成功也没有失败就结束（被取消）时调用，让其他请求接替探测
+        :return: 无返回值
+        """
+        with self._cond:
+            if self.state == self.HALF_OPEN and self._probe_in_flight:
+                self._probe_in_flight = False
+                self._cond.notify_all()
+
+    def record_success(self):
+        """
+        :return: 是否由此从熔断中恢复
+        """
+        with self._cond:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+            self._cond.notify_all()
+            return recovered
+
+    def record_failure(self):
+        """
+        记录一次可重试的失败
+        :return: 是否由此进入熔断
+        """
+        if self.failure_threshold <= 0:
+            return False
+        with self._cond:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.state == self.OPEN or self.consecutive_failures < self.failure_threshold:
+                return False
+            self.state = self.OPEN
+            self.open_until = time.monotonic() + self.cooldown
+            self.open_count += 1
+            self._probe_in_flight = False
+            self._cond.notify_all()
+            return True
+
+
+class LLMTransport:
+    """
+    一个 LLM 端点的共享传输层
+    """
+    def __init__(self, base_url, api_key, logger, max_connections=8, request_timeout=300.0, connect_timeout=10.0,
+                 requests_per_minute=0, tokens_per_minute=0, completion_token_estimate=1024,
+                 max_attempts=0, bad_request_max_attempts=2, backoff_base=1.0, backoff_max=60.0,
+                 breaker_failure_threshold=5, breaker_cooldown=30.0, breaker_max_cooldown=300.0,
+                 stream=False, stream_include_usage=True):
+        """
+        :param base_url: 端点的 BASE_URL
+        :param api_key: 端点的 API_KEY
+        :param logger: LLM 日志
+        :param max_connections: 连接池大小，也是同时进行的请求数上限
+        :param request_timeout: 单个请求的超时时间（秒）
+        :param connect_timeout: 建立连接的超时时间（秒）
+        :param requests_per_minute: 每分钟请求数上限，0 表示不限
+        :param tokens_per_minute: 每分钟 token 数上限，0 表示不限
+        :param completion_token_estimate: 预扣 token 时对补全 token 数的估计
+        :param max_attempts: 可重试错误的最多尝试次数，0 表示一直重试
+        :param bad_request_max_attempts: 请求错误（4xx）的最多尝试次数
+        :param backoff_base: 退避基准时间（秒）
+        :param backoff_max: 单次退避的上限（秒）
+        :param breaker_failure_threshold: 连续多少次可重试的失败后熔断，0 表示不熔断
+        :param breaker_cooldown: 熔断的冷却时间（秒）
+        :param breaker_max_cooldown: 冷却时间加倍的上限（秒）
+        :param stream: 是否以流式模式请求
+        :param stream_include_usage: 流式请求是否要求服务端在最后返回用量（部分兼容接口不支持 stream_options）
+        """
+        self.base_url = base_url
+        self.logger = logger
+        self.request_timeout = request_timeout
+        self.completion_token_estimate = completion_token_estimate
+        self.max_attempts = max_attempts
+        self.bad_request_max_attempts = bad_request_max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stream = stream
+        self.stream_include_usage = stream_include_usage
+
+        timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout)
+        # 重试由这里负责，关闭 SDK 自带的重试
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client,
+                             timeout=timeout, max_retries=0)
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.breaker = CircuitBreaker(breaker_failure_threshold, breaker_cooldown, breaker_max_cooldown,
+                                      request_timeout + connect_timeout)
+
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = {}       # 错误类别 -> 次数
+        self.total = LLMCallMetrics()
+
+    def chat(self, model, messages, request_number, metrics=None, cancel=None, stream_language=None):
+        """
+        发出一次对话请求，按错误类别退避重试
+        :param model: 模型名
+        :param messages: 消息列表
+        :param request_number: 全局请求编号，只用于日志
+        :param metrics: 记录本次调用时间拆分的 LLMCallMetrics，为 None 时累计到当前线程
+        :param cancel: threading.Event，被设置后不再重试（对冲请求中落败的一方），流式请求会立即关闭连接
+        :param stream_language: 流式模式下要提前提取的代码块语言（sql / python），为 None 时不提前结束；
+                                未启用 STREAM 时忽略
+        :return: (回复内容, 上传token, 补全token)，放弃或被取消时为 None
+        """
+        record_thread = metrics is None
+        if record_thread:
+            metrics = LLMCallMetrics()
+        metrics.calls += 1
+        prompt_estimate = sum(len(message["content"]) for message in messages) // 4
+        estimate = prompt_estimate + self.completion_token_estimate
+        attempt = 0
+        probe_pending = False   # 本次尝试是探测请求且还没有记录结果
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return None
+                attempt += 1
+                queue_start = time.monotonic()
+                probe_pending = self.breaker.wait_ready()
+                self._throttle(estimate)
+                self.slots.acquire()
+                service_start = time.monotonic()
+                metrics.queue_wait += service_start - queue_start
+                try:
+                    if self.stream:
+                        result = self._stream_completion(model, messages, metrics, cancel, stream_language,
+                                                         service_start, prompt_estimate)
+                        if result is None:
+                            return None
+                        content, up_token, down_token = result
+                    else:
+                        response = self.client.chat.completions.create(model=model, messages=messages,
+                                                                       timeout=self.request_timeout)
+                        content = response.choices[0].message.content
+                        usage = response.usage
+                        up_token = usage.prompt_tokens if usage is not None else prompt_estimate
+                        down_token = usage.completion_tokens if usage is not None else 0
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                finally:
+                    self.slots.release()
+                    metrics.service_time += time.monotonic() - service_start
+
+                if error is not None and not is_transport_error(error):
+                    # 程序错误：不重试、不计入熔断（探测请求由 finally 释放）
+                    metrics.failures += 1
+                    self.logger.error("第%s次请求出现非传输层异常，不再重试：%r", request_number, error)
+                    raise error
+                probe_pending = False
+                if error is None:
+                    if self.token_bucket is not None:
+                        self.token_bucket.adjust(estimate - up_token - down_token)
+                    if self.breaker.record_success():
+                        self.logger.warning("LLM端点 %s 熔断恢复", self.base_url)
+                    self._count(None)
+                    return content, up_token, down_token
+
+                error_class = classify_error(error)
+                self._count(error_class)
+                if error_class == BAD_REQUEST:
+                    # 端点有响应，只是请求本身有问题，不计入熔断
+                    self.breaker.record_success()
+                    limit = self.bad_request_max_attempts
+                else:
+                    if self.breaker.record_failure():
+                        self.logger.warning("LLM端点 %s 连续失败 %s 次，熔断 %.1fs，使用该端点的阶段暂停",
+                                            self.base_url, self.breaker.consecutive_failures, self.breaker.cooldown)
+                    limit = self.max_attempts
+                if limit and attempt >= limit:
+                    self.logger.error("第%s次请求失败 %s 次（%s），放弃！错误信息：%s", request_number, attempt, error_class, error)
+                    metrics.failures += 1
+                    return None
+                delay = self._backoff_delay(error_class, attempt, error)
+                self.logger.info("第%s次请求失败（%s），%.2fs 后重试！错误信息：%s", request_number, error_class, delay, error)
+                metrics.retries += 1
+                metrics.backoff_time += delay
+                if cancel is not None:
+                    cancel.wait(delay)
+                else:
+                    time.sleep(delay)
+        finally:
+            if probe_pending:
+                # 探测请求被取消（或异常退出），没有得到结果，让其他请求接替探测，否则半开状态会一直阻塞
+                self.breaker.release_probe()
+            if record_thread:
+                record_thread_metrics(metrics)
+            with self._stats_lock:
+                self.total.add(metrics)
+
+    def _stream_completion(self, model, messages, metrics, cancel, stream_language, request_start, prompt_estimate):
+        """
+        流式接收一次回复，第一个完整的代码块结束时立即关闭连接
+        :return: (回复内容, 上传token, 补全token)，被取消时为 None
+        """
+        extra = {"stream_options": {"include_usage": True}} if self.stream_include_usage else {}
+        stream = self.client.chat.completions.create(model=model, messages=messages, stream=True,
+                                                     timeout=self.request_timeout, **extra)
+        scanner = FenceScanner(stream_language) if stream_language else None
+        parts = []
+        usage = None
+        block_end = None
+        finished = threading.Event()
+        if cancel is not None:
+            # 等待下一个分片时也能响应取消：另起一个线程在取消时关闭连接，使阻塞的读取立即返回
+            threading.Thread(target=self._close_on_cancel, args=(stream, cancel, finished), daemon=True).start()
+        try:
+            for chunk in stream:
+                if cancel is not None and cancel.is_set():
+                    return None
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not parts:
+                    metrics.first_token_time += time.monotonic() - request_start
+                parts.append(text)
+                if scanner is not None:
+                    block_end = scanner.feed(text)
+                    if block_end is not None:
+                        metrics.block_time += time.monotonic() - request_start
+                        metrics.early_stops += 1
+                        break
+        except Exception:
+            if cancel is not None and cancel.is_set():
+                return None     # 连接被取消线程关闭
+            raise
+        finally:
+            finished.set()
+            # 提前结束时关闭连接，服务端不再继续生成
+            stream.close()
+        received = "".join(parts)
+        content = received[:block_end] if block_end is not None else received
+        if usage is not None:
+            return content, usage.prompt_tokens, usage.completion_tokens
+        # 提前结束时收不到用量，按收到的字符数估算（与提示词相同，4 个字符一个 token）
+        return content, prompt_estimate, len(received) // 4
+
+    @staticmethod
+    def _close_on_cancel(stream, cancel, finished):
+        while not finished.is_set():
+            if cancel.wait(0.1):
+                if not finished.is_set():
+                    stream.close()
+                return
+
+    def _throttle(self, estimate):
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = self.request_bucket.reserve(1)
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.reserve(estimate))
+        if wait > 0:
+            time.sleep(wait)
+
+    def _backoff_delay(self, error_class, attempt, error):
+        cap = min(self.backoff_max, self.backoff_base * BACKOFF_FACTOR[error_class] * 2 ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        if error_class == RATE_LIMIT:
+            retry_after = retry_after_of(error)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _count(self, error_class):
+        with self._stats_lock:
+            self.request_count += 1
+            if error_class is not None:
+                self.error_count[error_class] = self.error_count.get(error_class, 0) + 1
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        with self._stats_lock:
+            return {
+                "requests": self.request_count,
+                "errors": dict(self.error_count),
+                "calls": self.total.calls,
+                "failures": self.total.failures,
+                "retries": self.total.retries,
+                "queue_wait": round(self.total.queue_wait, 2),
+                "service_time": round(self.total.service_time, 2),
+                "backoff_time": round(self.total.backoff_time, 2),
+                "early_stops": self.total.early_stops,
+                "breaker": self.breaker.state,
+                "breaker_opens": self.breaker.open_count,
+            }
+
+    def close(self):
+        """
+        关闭连接池
+        :return: 无返回值
+        """
+        self.http_client.close()
@@ -1,22 +1,103 @@
+import gzip
+import itertools
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 
-def setup_thread_logger(thread_name, file_path):
+HOT = {"hot": True}     # 热路径（每次执行都会打印）的日志使用 extra=HOT 标记，按采样率输出
+
+_listeners = []     # 所有后台写日志的监听器，FUZZ结束时统一停止
+
+
+class SamplingFilter(logging.Filter):
     """
-    为每个线程创建独立日志文件
+    对标记为 hot 的 INFO 及以下级别日志按 1/sample_rate 采样，其余日志全部保留
+    """
+    def __init__(self, sample_rate):
+        """
+        :param sample_rate: 每 sample_rate 条热路径日志保留 1 条，1为不采样
+        """
+        super().__init__()
+        self.sample_rate = sample_rate
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if self.sample_rate <= 1 or record.levelno >= logging.WARNING or not getattr(record, "hot", False):
+            return True
+        return next(self._counter) % self.sample_rate == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    只把日志记录放入队列，消息的 % 格式化留给后台监听线程完成
+    """
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)   # 异常信息需要在当前线程格式化
+        return record
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _build_file_handler(file_path, max_bytes, backup_count, compress):
+    if max_bytes <= 0:
+        return logging.FileHandler(file_path, mode='a', encoding='utf-8')
+    # 轮转时当前文件被改名为 xxx.1(.gz)，并重新创建同名文件，ChiloDisco 按路径读取的始终是当前文件
+    handler = logging.handlers.RotatingFileHandler(file_path, mode='a', maxBytes=max_bytes,
+                                                   backupCount=backup_count, encoding='utf-8')
+    if compress:
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def setup_thread_logger(thread_name, file_path, level=logging.INFO, sample_rate=1,
+                        max_bytes=0, backup_count=5, compress=True):
+    """
+    为每个线程创建独立日志文件，写文件由后台监听线程完成
     :param file_path: 文件保存地址
     :param thread_name: 线程名或标识
+    :param level: 日志级别
+    :param sample_rate: 热路径日志（extra=HOT）每多少条保留 1 条，1为不采样
+    :param max_bytes: 单个日志文件的最大字节数，超过后轮转，0为不轮转
+    :param backup_count: 轮转后保留的历史文件个数
+    :param compress: 轮转后的历史文件是否用 gzip 压缩
     """
     logger = logging.getLogger(thread_name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(level)
 
     # 防止重复添加 handler（尤其是线程重复启动）
     if logger.hasHandlers():
         return logger
 
     # 每个线程一个独立日志文件
-    file_handler = logging.FileHandler(file_path, mode='a', encoding='utf-8')
+    file_handler = _build_file_handler(file_path, max_bytes, backup_count, compress)
     formatter = logging.Formatter('%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    _listeners.append(listener)
+
+    logger.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(LazyQueueHandler(log_queue))
+    return logger
+
+
+def shutdown_loggers():
+    """
+    写完所有队列中剩余的日志并停止后台监听线程（在 deinit 中调用）
+    :return: 无返回值
+    """
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,114 @@
+"""
+退役变异器归档
+
+被变异器池退役的变异器文件从生成目录移入归档目录，每个变异器单独压缩为一个 <文件名>.gz（DEFLATE 压缩），
+需要复活时再解压回原路径，复活后的 mutator_index 不变。
+每个归档文件先写入临时文件再 os.replace 到最终路径，写入过程中崩溃只会留下一个临时文件，不会损坏已归档的变异器。
+"""
+import gzip
+import os
+import shutil
+import threading
+import zipfile
+
+ARCHIVE_SUFFIX = ".gz"
+TMP_SUFFIX = ".tmp"
+LEGACY_ARCHIVE_NAME = "mutators.zip"   # 旧版本的单个 zip 归档，启动时拆分为每个变异器一个文件
+
+
+class MutatorArchive:
+    """
+    每个变异器一个压缩文件的归档，线程安全
+    """
+    def __init__(self, archive_path):
+        """
+        :param archive_path: 归档目录
+        """
+        os.makedirs(archive_path, exist_ok=True)
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        self._names = set()     # 已归档的文件名，同一变异器复活后再次退役时不重复写入
+        for entry in os.listdir(archive_path):
+            if entry.endswith(TMP_SUFFIX):
+                os.remove(os.path.join(archive_path, entry))    # 上次运行写入到一半的临时文件
+            elif entry.endswith(ARCHIVE_SUFFIX):
+                self._names.add(entry[:-len(ARCHIVE_SUFFIX)])
+        self._migrate_legacy_archive()
+
+    def _archive_file(self, name):
+        return os.path.join(self.archive_path, name + ARCHIVE_SUFFIX)
+
+    def _write_atomic(self, name, src):
+        """
+        将 src 中的内容压缩写入 name 对应的归档文件：先写临时文件，再 os.replace
+        :param name: 变异器文件名
+        :param src: 可读的二进制文件对象
+        :return: 无返回值
+        """
+        archive_file = self._archive_file(name)
+        tmp_file = archive_file + TMP_SUFFIX
+        with open(tmp_file, "wb") as raw:
+            with gzip.GzipFile(filename=name, mode="wb", fileobj=raw, mtime=0) as gz:
+                shutil.copyfileobj(src, gz)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_file, archive_file)
+
+    def _migrate_legacy_archive(self):
+        """
+        把旧版本的 mutators.zip 拆分为每个变异器一个文件，全部写完后删除 zip
+        :return: 无返回值
+        """
+        legacy_file = os.path.join(self.archive_path, LEGACY_ARCHIVE_NAME)
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with zipfile.ZipFile(legacy_file, "r") as zf:
+                for name in zf.namelist():
+                    if name not in self._names:
+                        with zf.open(name) as src:
+                            self._write_atomic(name, src)
+                        self._names.add(name)
+        except zipfile.BadZipFile:
+            return      # 旧归档已损坏，保留原文件以便手动恢复
+        os.remove(legacy_file)
+
+    def archive(self, file_path):
+        """
+        将变异器文件移入归档
+        :param file_path: 变异器文件路径
+        :return: 是否成功归档（文件不存在时返回 False）
+        """
+        name = os.path.basename(file_path)
+        with self._lock:
+            if not os.path.exists(file_path):
+                return False
+            if name not in self._names:
+                with open(file_path, "rb") as src:
+                    self._write_atomic(name, src)
+                self._names.add(name)
+            os.remove(file_path)
+            return True
+
+    def restore(self, file_path):
+        """
+        将变异器文件从归档中恢复到原路径
+        :param file_path: 变异器文件路径
+        :return: 是否成功恢复（归档中不存在时返回 False）
+        """
+        name = os.path.basename(file_path)
+        with self._lock:
+            if name not in self._names:
+                return False
+            tmp_file = f"{file_path}.restore"
+            with gzip.open(self._archive_file(name), "rb") as src, open(tmp_file, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_file, file_path)
+            return True
+
+    def size(self):
+        """
+        :return: 归档中的变异器个数
+        """
+        with self._lock:
+            return len(self._names)
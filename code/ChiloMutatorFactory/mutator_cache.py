@@ -0,0 +1,167 @@
+"""
+变异器模块缓存
+
+fuzz() 的每一次调用都会执行一次变异器的 mutate()，如果每次都重新 import 生成的变异器文件，
+同一个变异器在一个能量批次中会被重复读取、编译、执行上百次。
+这里维护一个有界的 LRU 缓存，缓存已加载模块的 mutate 函数（以 文件路径 + mtime + 文件大小 作为键），
+并将编译后的字节码按源码内容哈希以 marshal 格式落盘，重启后内容相同的变异器可以跳过编译。
+变异器中的 print 会干扰 AFL++ 界面：加载模块时在模块的全局变量中放入一个什么都不做的 print，
+而不是替换全局的 sys.stdout/sys.stderr（预渲染线程与 AFL 主线程会同时调用 mutate()，替换会影响其他线程的输出）。
+"""
+import hashlib
+import importlib.util
+import marshal
+import os
+import threading
+import types
+from collections import OrderedDict
+
+# 字节码文件头，与当前解释器版本绑定，版本不一致时自动重新编译
+BYTECODE_MAGIC = importlib.util.MAGIC_NUMBER + b"CHILO"
+
+
+def _silent_print(*args, **kwargs):
+    """变异器模块中的 print，什么都不输出"""
+
+
+class MutatorCache:
+    """
+    已加载变异器的有界 LRU 缓存，线程安全
+    """
+    def __init__(self, max_size=256, bytecode_path=None):
+        """
+        :param max_size: 内存中最多缓存的变异器模块个数
+        :param bytecode_path: marshal 字节码的落盘目录，为 None 时不落盘
+        """
+        self.max_size = max_size
+        self.bytecode_path = bytecode_path
+        self._entries = OrderedDict()   # 绝对路径 -> (mtime_ns, size, mutate函数)
+        self._lock = threading.Lock()
+
+        self.hit_count = 0          # 命中内存缓存的次数
+        self.miss_count = 0         # 未命中、需要加载模块的次数
+        self.eviction_count = 0     # 因容量不足被淘汰的次数
+        self.invalidation_count = 0     # 因文件被改写或显式失效而丢弃的次数
+        self.bytecode_hit_count = 0     # 未命中内存但命中落盘字节码（跳过编译）的次数
+
+        if self.bytecode_path:
+            os.makedirs(self.bytecode_path, exist_ok=True)
+
+    def get_mutate(self, filepath):
+        """
+        获得指定变异器文件的 mutate 函数，命中缓存时不会重新加载模块
+        :param filepath: 变异器文件路径
+        :return: 变异器模块中的 mutate 函数
+        """
+        filepath = os.path.abspath(filepath)
+        st = os.stat(filepath)
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is not None:
+                if entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                    self._entries.move_to_end(filepath)
+                    self.hit_count += 1
+                    return entry[2]
+                # 文件已被改写，旧模块作废
+                del self._entries[filepath]
+                self.invalidation_count += 1
+            self.miss_count += 1
+
+        # 加载模块时会执行变异器的顶层代码，放在锁外进行
+        mutate_func = self._load_mutate(filepath)
+
+        with self._lock:
+            self._entries[filepath] = (st.st_mtime_ns, st.st_size, mutate_func)
+            self._entries.move_to_end(filepath)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.eviction_count += 1
+        return mutate_func
+
+    def call_mutate(self, filepath):
+        """
+        调用指定变异器文件中的 mutate() 并返回结果
+        :param filepath: 变异器文件路径
+        :return: mutate() 的返回值
+        """
+        return self.get_mutate(filepath)()
+
+    def invalidate(self, filepath):
+        """
+        显式使某个变异器文件的缓存失效（修复器改写文件后调用）
+        :param filepath: 变异器文件路径
+        :return: 是否确实移除了一个缓存项
+        """
+        filepath = os.path.abspath(filepath)
+        with self._lock:
+            if self._entries.pop(filepath, None) is not None:
+                self.invalidation_count += 1
+                return True
+            return False
+
+    def clear(self):
+        """清空内存中的全部缓存（不删除落盘字节码）"""
+        with self._lock:
+            self.invalidation_count += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """
+        读取缓存计数器
+        :return: 包含 size/hit/miss/eviction/invalidation/bytecode_hit 的字典
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hit": self.hit_count,
+                "miss": self.miss_count,
+                "eviction": self.eviction_count,
+                "invalidation": self.invalidation_count,
+                "bytecode_hit": self.bytecode_hit_count,
+            }
+
+    def _load_mutate(self, filepath):
+        """加载变异器文件为模块对象，返回其中的 mutate 函数"""
+        with open(filepath, "rb") as f:
+            source = f.read()
+        code = self._load_code(filepath, source)
+
+        module_name = os.path.splitext(os.path.basename(filepath))[0]  # 例如 1_2
+        module = types.ModuleType(module_name)
+        module.__file__ = filepath
+        module.print = _silent_print    # 屏蔽变异器中的 print（包括顶层代码中的），防止干扰 AFL++ 界面
+        exec(code, module.__dict__)  # 执行文件内容，加载为模块对象
+
+        mutate_func = getattr(module, "mutate", None)
+        if mutate_func is None:
+            raise AttributeError(f"错误码：1203 {filepath} 中未找到 mutate() 函数")
+        return mutate_func
+
+    def _load_code(self, filepath, source):
+        """优先从落盘的 marshal 字节码中读取代码对象，不存在时编译并落盘"""
+        if not self.bytecode_path:
+            return compile(source, filepath, "exec")
+
+        digest = hashlib.sha1(source).hexdigest()
+        bytecode_file = os.path.join(self.bytecode_path, f"{digest}.bin")
+        try:
+            with open(bytecode_file, "rb") as f:
+                data = f.read()
+            if data.startswith(BYTECODE_MAGIC):
+                code = marshal.loads(data[len(BYTECODE_MAGIC):])
+                with self._lock:
+                    self.bytecode_hit_count += 1
+                return code
+        except (OSError, ValueError, EOFError, TypeError):
+            pass    # 字节码不存在或已损坏，重新编译
+
+        code = compile(source, filepath, "exec")
+        tmp_file = f"{bytecode_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(BYTECODE_MAGIC)
+                f.write(marshal.dumps(code))
+            os.replace(tmp_file, bytecode_file)  # 原子替换，避免读到写了一半的文件
+        except OSError:
+            pass    # 落盘失败不影响本次调用
+        return code
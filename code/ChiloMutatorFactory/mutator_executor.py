@@ -0,0 +1,262 @@
+"""
+变异器执行后端
+
+变异器是LLM生成的任意Python代码，提供两种执行方式（由配置 MUTATOR_EXEC.MODE 选择）：
+1. inprocess：在AFL++内嵌的解释器中直接调用（通过 MutatorCache 缓存模块），开销最小
+2. isolated：在一组常驻的工作进程中调用，每个工作进程只加载一次变异器，
+   每次调用有墙钟超时与内存 rlimit，一批请求只需发送一次，结果逐个通过管道返回；
+   死循环或内存爆炸的变异器只会拖垮工作进程，不会影响整个模糊测试
+"""
+import multiprocessing
+import os
+import pickle
+import queue
+import resource
+import threading
+import traceback
+
+from .mutator_cache import MutatorCache
+
+
+class MutatorExecutionError(Exception):
+    """
+    变异器执行出错
+    is_fatal 为 True 表示超时、内存超限或导致工作进程崩溃，这类变异器应当被隔离
+    """
+    def __init__(self, message, is_fatal=False):
+        super().__init__(message)
+        self.is_fatal = is_fatal
+
+
+def _normalize_result(result):
+    """
+    工作进程中把 mutate() 的返回值转换为可以跨进程传递的类型
+    None、str 以及可序列化的返回值保持不变，修复器需要据此判断返回值类型是否正确
+    """
+    if result is None or isinstance(result, str):
+        return result
+    try:
+        pickle.dumps(result)
+        return result
+    except Exception:
+        return str(result)
+
+
+def _set_memory_limit(memory_limit_mb):
+    """在当前虚拟内存的基础上，为工作进程额外设置 memory_limit_mb 的地址空间上限"""
+    if not memory_limit_mb:
+        return
+    try:
+        with open("/proc/self/statm", "r") as f:
+            current_bytes = int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        current_bytes = 0
+    limit = current_bytes + int(memory_limit_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_limit_mb, cache_size, bytecode_path):
+    """
+    工作进程主循环：接收 (变异器文件路径, 调用次数, 文件版本)，每次调用返回一个 ("ok", 结果)，
+    出错时返回 ("error" / "fatal", 错误信息) 并结束该批次
+    文件版本与上次不同时说明文件被改写过，丢弃缓存的模块（mtime 精度内同样大小的改写无法靠 mtime + 大小发现）
+    """
+    _set_memory_limit(memory_limit_mb)
+    cache = MutatorCache(cache_size, bytecode_path)
+    versions = {}   # 变异器文件路径 -> 已加载的文件版本
+    while True:
+        try:
+            file_path, count, version = conn.recv()
+        except (EOFError, OSError):
+            break   # 父进程已关闭管道
+        if versions.get(file_path, 0) != version:
+            cache.invalidate(file_path)
+            versions[file_path] = version
+        try:
+            for _ in range(count):
+                conn.send(("ok", _normalize_result(cache.call_mutate(file_path))))
+        except MemoryError:
+            cache.clear()
+            conn.send(("fatal", "MemoryError: 变异器超出工作进程内存上限"))
+        except BaseException:
+            conn.send(("error", traceback.format_exc()))
+
+
+class InProcessMutatorExecutor:
+    """
+    在当前进程中执行变异器
+    """
+    mode = "inprocess"
+
+    def __init__(self, cache: MutatorCache):
+        """
+        :param cache: 变异器模块缓存
+        """
+        self.cache = cache
+
+    def call_mutate_batch(self, file_path, count):
+        """
+        连续调用 count 次指定变异器的 mutate()
+        :param file_path: 变异器文件路径
+        :param count: 调用次数
+        :return: mutate() 返回值的列表
+        """
+        return [self.cache.call_mutate(file_path) for _ in range(count)]
+
+    def invalidate(self, file_path):
+        """
+        变异器文件被(重新)写入后调用，旧的缓存模块作废
+        :param file_path: 变异器文件路径
+        :return: 无返回值
+        """
+        self.cache.invalidate(file_path)
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        pass
+
+
+class _Worker:
+    """一个常驻的变异器工作进程"""
+    def __init__(self, ctx, memory_limit_mb, cache_size, bytecode_path):
+        self._args = (memory_limit_mb, cache_size, bytecode_path)
+        self._ctx = ctx
+        self.conn = None
+        self.process = None
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(target=_worker_main, args=(child_conn, *self._args),
+                                         name="ChiloMutatorWorker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+
+class IsolatedMutatorExecutor:
+    """
+    基于工作进程池执行变异器
+    """
+    mode = "isolated"
+
+    def __init__(self, worker_count, call_timeout, memory_limit_mb, cache_size, bytecode_path=None, logger=None):
+        """
+        :param worker_count: 工作进程个数
+        :param call_timeout: 单次 mutate() 调用的墙钟超时（秒），一批调用中的每一次分别计时
+        :param memory_limit_mb: 每个工作进程在启动时内存基础上允许额外使用的内存（MB），0 表示不限制
+        :param cache_size: 每个工作进程内变异器模块缓存的大小
+        :param bytecode_path: marshal 字节码的落盘目录
+        :param logger: 日志对象
+        """
+        self.call_timeout = call_timeout
+        self.logger = logger
+        # 使用 fork：AFL++ 内嵌解释器中 sys.executable 并不是 python，无法使用 spawn
+        ctx = multiprocessing.get_context("fork")
+        self._workers = [_Worker(ctx, memory_limit_mb, cache_size, bytecode_path) for _ in range(worker_count)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+        self._versions = {}     # 变异器文件绝对路径 -> 文件版本，每次 invalidate 加1
+
+        self._stats_lock = threading.Lock()
+        self.call_count = 0     # 请求批次数
+        self.timeout_count = 0  # 超时次数
+        self.crash_count = 0    # 工作进程崩溃次数
+        self.error_count = 0    # 变异器抛出异常的次数
+        self.restart_count = 0  # 工作进程重启次数
+
+    def call_mutate_batch(self, file_path, count):
+        """
+        在工作进程中连续调用 count 次指定变异器的 mutate()
+        :param file_path: 变异器文件路径
+        :param count: 调用次数
+        :return: mutate() 返回值的列表
+        :exception MutatorExecutionError: 变异器出错；超时、内存超限、工作进程崩溃时 is_fatal 为 True
+        """
+        file_path = os.path.abspath(file_path)
+        worker = self._idle.get()
+        try:
+            with self._stats_lock:
+                self.call_count += 1
+                version = self._versions.get(file_path, 0)
+            results = []
+            try:
+                worker.conn.send((file_path, count, version))
+                while len(results) < count:
+                    if not worker.conn.poll(self.call_timeout):
+                        self._restart(worker, "timeout")
+                        raise MutatorExecutionError(
+                            f"变异器 {file_path} 执行超时（第{len(results) + 1}次调用超过 {self.call_timeout:.2f}s）",
+                            is_fatal=True)
+                    status, payload = worker.conn.recv()
+                    if status != "ok":
+                        break
+                    results.append(payload)
+                else:
+                    return results
+            except (EOFError, OSError, BrokenPipeError):
+                self._restart(worker, "crash")
+                raise MutatorExecutionError(f"变异器 {file_path} 导致工作进程崩溃", is_fatal=True)
+
+            with self._stats_lock:
+                self.error_count += 1
+            raise MutatorExecutionError(f"变异器 {file_path} 执行出错：{payload}", is_fatal=(status == "fatal"))
+        finally:
+            self._idle.put(worker)
+
+    def invalidate(self, file_path):
+        """
+        变异器文件被(重新)写入后调用：文件版本加1，工作进程下次调用该文件时丢弃缓存的模块
+        :param file_path: 变异器文件路径
+        :return: 无返回值
+        """
+        file_path = os.path.abspath(file_path)
+        with self._stats_lock:
+            self._versions[file_path] = self._versions.get(file_path, 0) + 1
+
+    def _restart(self, worker, reason):
+        with self._stats_lock:
+            if reason == "timeout":
+                self.timeout_count += 1
+            else:
+                self.crash_count += 1
+            self.restart_count += 1
+        if self.logger is not None:
+            self.logger.warning("变异器工作进程(pid=%s)因%s被重启", worker.process.pid, reason)
+        worker.restart()
+
+    def stats(self):
+        """
+        读取执行池计数器
+        :return: 包含 call/timeout/crash/error/restart 的字典
+        """
+        with self._stats_lock:
+            return {
+                "call": self.call_count,
+                "timeout": self.timeout_count,
+                "crash": self.crash_count,
+                "error": self.error_count,
+                "restart": self.restart_count,
+            }
+
+    def close(self):
+        """关闭全部工作进程"""
+        for worker in self._workers:
+            worker.kill()
@@ -1,8 +1,6 @@
-import importlib.util
 import os
 import time
 import traceback
-import contextlib
 from typing import List
 
 from . import chilo_factory
@@ -91,23 +89,6 @@ Do not include explanations, comments, or any non-code text inside the code bloc
 Do not rewrite the entire program — fix only the semantic errors while keeping the existing structure.
 """
     return prompt
-def call_mutate_from_file(filepath):
-    """动态加载指定的Python文件并调用 mutate() 函数"""
-    filepath = os.path.abspath(filepath)
-    module_name = os.path.splitext(os.path.basename(filepath))[0]  # 例如 mu_1_1
-
-    spec = importlib.util.spec_from_file_location(module_name, filepath)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)  # 执行文件内容，加载为模块对象
-
-    if hasattr(module, "mutate"):
-        # 使用 contextlib 屏蔽 stdout 和 stderr，防止变异器中的 print 干扰 AFL++ 界面
-        with open(os.devnull, "w") as fnull:
-            with contextlib.redirect_stdout(fnull), contextlib.redirect_stderr(fnull):
-                return module.mutate()  # 调用 mutate 函数并返回结果
-    else:
-        raise AttributeError(f"错误码：1203 该变异器中未找到 mutate() 函数")
-
 def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
     """
     用于修复变异器的线程方法
@@ -161,6 +142,7 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
                 f"[线程{thread_id}]seed_id：{fix_seed_id}，等待写入临时文件")
             with open(thread_tmp_path, "w", encoding="utf-8") as f:
                 f.write(fix_mutator_code)  # 保存到文件
+            my_chilo_factory.mutator_executor.invalidate(thread_tmp_path)  # 临时文件被改写，旧的缓存模块作废（包括工作进程中的）
             my_chilo_factory.mutator_fixer_logger.info(
                 f"[线程{thread_id}]seed_id：{fix_seed_id}，已写入至临时文件")
             # 准备调用运行一下
@@ -168,7 +150,9 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
             try:
                 my_chilo_factory.mutator_fixer_logger.info(
                     f"[线程{thread_id}]seed_id：{fix_seed_id}，准备试运行")
-                mutate_result = [call_mutate_from_file(thread_tmp_path) for _ in range(my_chilo_factory.fix_mutator_try_time)]
+                # 通过执行后端试运行，isolated 模式下死循环/内存爆炸的变异器会以超时错误的形式交给语法修复
+                mutate_result = my_chilo_factory.mutator_executor.call_mutate_batch(
+                    thread_tmp_path, my_chilo_factory.fix_mutator_try_time)
                 # 这里证明至少语法没问题，那就检测并修复修复语义
                 sematic_fix_start_time = time.time()
                 my_chilo_factory.mutator_fixer_logger.info(
@@ -296,7 +280,8 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
                                                       semantic_error_count, semantic_error_llm_use_time, semantic_error_llm_count,
                                                       semantic_llm_format_error, semantic_up_token_all, semantic_down_token_all, 
                                                       my_chilo_factory.fix_mutator_list.qsize(), False,
-                                                      my_chilo_factory.all_seed_list.seed_list[fix_seed_id].mask_count, calculated_similarity, 0, 0)
+                                                      my_chilo_factory.all_seed_list.seed_list[fix_seed_id].mask_count, calculated_similarity, 0, 0,
+                                                      my_chilo_factory.llm_tool_fixer.take_call_metrics())
                     break  # 跳出内层循环，外层循环会处理下一个变异器
                 
                 my_chilo_factory.mutator_fixer_logger.info(
@@ -359,6 +344,7 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
                                          f"{fix_seed_id}_{now_mutator_id}.py")
         with open(save_mutator_path, "w", encoding="utf-8") as f:
             f.write(fix_mutator_code)  # 保存到文件
+        my_chilo_factory.mutator_executor.invalidate(save_mutator_path)  # 文件被(重新)写入，旧的缓存模块作废
         my_chilo_factory.mutator_fixer_logger.info(
             f"[线程{thread_id}]seed_id：{fix_seed_id}，mutator_id：{now_mutator_id} 已保存到文件")
 
@@ -372,8 +358,7 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
         my_chilo_factory.mutator_fixer_logger.info(
             f"[线程{thread_id}]seed_id：{fix_seed_id}，mutator_id：{now_mutator_id} 变异器构造完成")
 
-        for i in range(fix_mutate_time):
-            my_chilo_factory.wait_exec_mutator_list.put(mutator_add_in_exec)    #构建待执行任务
+        my_chilo_factory.wait_exec_mutator_list.put(mutator_add_in_exec, fix_mutate_time)    #构建待执行任务
         my_chilo_factory.mutator_fixer_logger.info(
             f"[线程{thread_id}]seed_id：{fix_seed_id}，mutator_id：{now_mutator_id} 任务发布成功，变异次数：{fix_mutate_time}")
         my_chilo_factory.mutator_fixer_logger.info(
@@ -388,4 +373,6 @@ def fix_mutator(my_chilo_factory: chilo_factory.ChiloFactory, thread_id=0):
                                           sematic_return_type_error_count,
                                           semantic_error_count, semantic_error_llm_use_time, semantic_error_llm_count,
                                           semantic_llm_format_error, semantic_up_token_all, semantic_down_token_all, left_fix_queue_size,
-                                          at_last_is_all_correct,mask_count, calculated_similarity, unique_count, total_count)
+                                          at_last_is_all_correct,mask_count, calculated_similarity, unique_count, total_count,
+                                          my_chilo_factory.llm_tool_fixer.take_call_metrics())
+        my_chilo_factory.finish_seed_work(fix_seed_id)
@@ -0,0 +1,127 @@
+"""
+变异结果预渲染
+
+fuzz_count 确定了接下来要执行的变异器以及能量后，由后台线程提前调用该变异器的 mutate()，
+把已经编码好的测试用例放入一个有界的环形缓冲区中，fuzz() 只需要从缓冲区中弹出即可。
+缓冲区为空（下溢）时由调用方同步渲染作为兜底。
+后台渲染遇到致命错误（超时、内存超限、工作进程崩溃）时立即通知调用方隔离该变异器，不必等同步路径再失败一次。
+"""
+import threading
+from collections import deque
+
+
+class MutatorPrefetcher:
+    """
+    单变异器的预渲染环形缓冲区
+    """
+    def __init__(self, render_func, max_size, batch_size=1, logger=None, fatal_func=None):
+        """
+        :param render_func: 批量渲染函数，输入 (变异器对象, 个数)，返回编码好的测试用例（bytearray）列表，出错时抛出异常
+        :param max_size: 缓冲区的最大容量
+        :param batch_size: 每次调用渲染函数最多渲染的个数（隔离执行时一批结果只需一次进程间往返）
+        :param logger: 日志对象
+        :param fatal_func: 后台渲染出现致命错误（异常的 is_fatal 为真）时调用，输入 (变异器对象, 异常)
+        """
+        self._render = render_func
+        self._on_fatal = fatal_func
+        self.max_size = max_size
+        self.batch_size = max(int(batch_size), 1)
+        self.logger = logger
+
+        self._cond = threading.Condition()
+        self._buffer = deque()
+        self._mutator = None    # 当前正在预渲染的变异器
+        self._remaining = 0     # 当前批次还需要多少个测试用例（随 fuzz_count 返回的能量设置）
+        self._generation = 0    # 每切换一次变异器加1，用于丢弃过期的渲染结果
+        self._failed = False    # 当前变异器在后台渲染时出错，停止预渲染交给同步路径处理
+
+        self.hit_count = 0          # 直接从缓冲区取到结果的次数
+        self.underrun_count = 0     # 缓冲区下溢、需要同步渲染的次数
+        self.discard_count = 0      # 切换变异器时被丢弃的已渲染结果个数
+        self.render_error_count = 0     # 后台渲染出错的次数
+
+        self._thread = threading.Thread(target=self._run, name="MutatorPrefetcher", daemon=True)
+        self._thread.start()
+
+    def schedule(self, mutator, count):
+        """
+        设置接下来要执行的变异器及其执行次数，后台线程会开始填充缓冲区
+        :param mutator: fuzz_count 选中的变异器
+        :param count: 该变异器接下来要执行的次数（能量）
+        :return: 无返回值
+        """
+        with self._cond:
+            if mutator is not self._mutator:
+                self.discard_count += len(self._buffer)
+                self._buffer.clear()
+                self._mutator = mutator
+                self._generation += 1
+                self._failed = False
+            self._remaining = max(int(count), 0)
+            self._cond.notify()
+
+    def pop(self, mutator):
+        """
+        取出一个指定变异器的预渲染结果
+        :param mutator: 本次要执行的变异器
+        :return: 编码好的测试用例；缓冲区下溢或变异器不匹配时返回 None，由调用方同步渲染
+        """
+        with self._cond:
+            if mutator is not self._mutator:
+                self.underrun_count += 1
+                return None
+            if self._remaining > 0:
+                self._remaining -= 1
+            if self._buffer:
+                self.hit_count += 1
+                item = self._buffer.popleft()
+                self._cond.notify()
+                return item
+            self.underrun_count += 1
+            return None
+
+    def stats(self):
+        """
+        读取预渲染计数器
+        :return: 包含 buffered/hit/underrun/discard/render_error 的字典
+        """
+        with self._cond:
+            return {
+                "buffered": len(self._buffer),
+                "hit": self.hit_count,
+                "underrun": self.underrun_count,
+                "discard": self.discard_count,
+                "render_error": self.render_error_count,
+            }
+
+    def _need_render(self):
+        return (self._mutator is not None and not self._failed
+                and len(self._buffer) < min(self._remaining, self.max_size))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._need_render():
+                    self._cond.wait()
+                mutator = self._mutator
+                generation = self._generation
+                count = min(min(self._remaining, self.max_size) - len(self._buffer), self.batch_size)
+            try:
+                items = self._render(mutator, count)
+            except Exception as e:
+                with self._cond:
+                    self.render_error_count += 1
+                    if generation == self._generation:
+                        self._failed = True
+                if getattr(e, "is_fatal", False) and self._on_fatal is not None:
+                    if self.logger is not None:
+                        self.logger.warning("预渲染变异器%s_%s出现致命错误：%s", mutator.seed_id, mutator.mutator_id, e)
+                    self._on_fatal(mutator, e)
+                elif self.logger is not None:
+                    self.logger.warning("预渲染变异器%s_%s出错，交给同步路径处理：%s", mutator.seed_id, mutator.mutator_id, e)
+                continue
+            with self._cond:
+                # 渲染期间变异器可能已经被切换，过期的结果直接丢弃
+                if generation == self._generation:
+                    room = min(self._remaining, self.max_size) - len(self._buffer)
+                    self._buffer.extend(items[:max(room, 0)])
@@ -0,0 +1,107 @@
+"""
+基于 AFL++ 队列条目的反馈（ENERGY.FEEDBACK_MODE 为 queue 时使用）
+
+AFL++ 每次执行后都会用自己的 virgin map 判断输入是否有新的命中（新边或新的命中次数桶），
+有才保存为队列条目，没有必要在 post_run 中再把整个共享内存位图读一遍、合并一遍。
+保存条目（或崩溃、超时）时 AFL++ 会调用自定义变异器的 describe()，返回值追加在文件名末尾，
+这里把执行编号、变异器、变异策略和种子写进去（称为“戳”）；随后 queue_new_entry() 收到新条目的文件名，
+解析出戳就知道是哪个变异器的哪一次执行产生了这个条目，只在这时给该变异器记奖励。
+崩溃不会触发 queue_new_entry()，由 CrashScanner 定期扫描 crashes 目录中带戳的新文件补上。
+
+戳的格式（不含逗号，不会破坏 AFL++ 文件名中以逗号分隔的字段）：
+    chilo-x<执行编号>-m<mutator_index>-s<策略>-d<种子编号>
+"""
+import os
+import re
+from typing import NamedTuple
+
+STAMP_PATTERN = re.compile(r"chilo-x(\d+)-m(-?\d+)-s(\d+)-d(-?\d+)")
+
+
+class QueueStamp(NamedTuple):
+    """一个 AFL++ 条目文件名中的戳"""
+    exec_number: int    # 产生该条目的执行编号（ChiloMutate.fuzz_number）
+    mutator_index: int  # 变异器在变异器池中的下标，结构化变异为 -1
+    strategy: int       # 变异策略，取值同 ChiloBitMap.STRATEGY_*
+    seed_id: int        # 种子编号
+
+
+def format_stamp(exec_number, mutator_index, strategy, seed_id):
+    """
+    生成 describe() 返回的戳
+    :return: 戳字符串
+    """
+    return f"chilo-x{exec_number}-m{mutator_index}-s{strategy}-d{seed_id}"
+
+
+def parse_stamp(filename):
+    """
+    从 AFL++ 条目的文件名（或路径）中解析戳
+    :param filename: 文件名或路径
+    :return: QueueStamp，没有戳（非 Chilo 产生的条目、或戳被截断）时为 None
+    """
+    match = STAMP_PATTERN.search(os.path.basename(filename))
+    if match is None:
+        return None
+    return QueueStamp(*map(int, match.groups()))
+
+
+class CrashScanner:
+    """
+    增量扫描 AFL++ 的 crashes 目录，只返回上一次扫描之后新出现的文件名
+    """
+    def __init__(self, crashes_dir):
+        """
+        :param crashes_dir: crashes 目录，创建时已有的文件（例如上一次运行留下的）不会被返回
+        """
+        self.crashes_dir = crashes_dir
+        self._seen = set()
+        self._last_mtime = None
+        self.scan()
+
+    def scan(self):
+        """
+        :return: 新出现的崩溃文件名列表；目录的修改时间没有变化时不列目录
+        """
+        try:
+            mtime = os.stat(self.crashes_dir).st_mtime_ns
+        except OSError:
+            return []
+        if mtime == self._last_mtime:
+            return []
+        self._last_mtime = mtime
+        new_names = []
+        with os.scandir(self.crashes_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("id:") and entry.name not in self._seen:
+                    self._seen.add(entry.name)
+                    new_names.append(entry.name)
+        return new_names
+
+
+class QueueFeedbackStats:
+    """
+    队列反馈的计数器，只用于日志
+    """
+    def __init__(self):
+        self.queue_entries = 0      # queue_new_entry() 收到的条目数
+        self.unstamped = 0          # 没有戳的条目（初始语料、同步来的条目等）
+        self.credited = 0           # 记入当前批次的条目数
+        self.stale = 0              # 带戳但不属于当前批次（结构化、待执行变异器或已结算的批次）
+        self.crashes = 0            # 扫描到的带戳崩溃数
+        self.late_crashes = 0       # 批次已结算后才扫描到、直接补记给变异器的崩溃数
+        self.by_strategy = {}       # 各变异策略产生的条目数
+
+    def stats(self):
+        """
+        :return: 计数器字典
+        """
+        return {
+            "queue_entries": self.queue_entries,
+            "unstamped": self.unstamped,
+            "credited": self.credited,
+            "stale": self.stale,
+            "crashes": self.crashes,
+            "late_crashes": self.late_crashes,
+            "by_strategy": dict(self.by_strategy),
+        }
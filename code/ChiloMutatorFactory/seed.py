@@ -19,6 +19,7 @@ class AFLSeed:
         self.parser_content = None  # 该种子的解析结果
         self.next_mutator_id = 0
         self.mask_count = 0     # 该种子解析后的掩码数量 (用于 Ci 计算)
+        self.is_eager = False   # 是否由 queue_new_entry 提前登记（AFL++ 选中之前就放入了提前解析队列）
 
 
 class AFLSeedList:
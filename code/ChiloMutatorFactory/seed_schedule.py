@@ -0,0 +1,145 @@
+"""
+基于种子饱和度的 AFL++ 种子选择（queue_get 钩子）
+
+AFL++ 会反复选中那些已经有几十个变异器、且都已经挖不出新边的种子，每次选中都要走一遍 fuzz_count、
+放入解析队列，并且通常还会触发一次新的 LLM 变异器生成。这里为每个种子维护一个饱和度（0~1），
+queue_get 按文件名 O(1) 查到种子编号（不重新读取文件、不计算 SHA1），饱和的种子直接跳过或按概率跳过。
+
+饱和度由三部分组成：
+    后验：种子臂（该种子全部变异器）的后验均值越低、结算的批次越多，越饱和；
+    待处理的流水线工作：该种子正在解析/生成/修复中的任务数（放入解析队列时加一，复用、生成失败或修复结束时减一），
+                      再次选中只会堆积更多工作；
+    最近奖励：最近结算的批次中该种子的变异器拿到的奖励（按结算批次指数衰减），有奖励时整体饱和度按比例降低，
+             仍在产出的种子不会因为后验或待处理工作而被跳过。
+"""
+import math
+import random
+import threading
+
+
+class SeedSaturationIndex:
+    """
+    种子饱和度索引：文件名 -> 种子编号，以及每个种子最近的奖励
+    """
+    def __init__(self, min_trials=20, success_ref=0.1, recent_decay=0.99, recent_scale=10.0, pending_scale=4.0):
+        """
+        :param min_trials: 后验的证据权重为 trials / (trials + min_trials)，结算批次越多越可信
+        :param success_ref: 后验均值达到该值时视为完全不饱和
+        :param recent_decay: 每结算一个批次，所有种子最近奖励的衰减系数
+        :param recent_scale: 最近奖励为该值时，饱和度降为原来的 1/e
+        :param pending_scale: 正在流水线中的任务数为该值时，贡献一半的饱和度
+        """
+        self.min_trials = min_trials
+        self.success_ref = success_ref
+        self.recent_decay = recent_decay
+        self.recent_scale = recent_scale
+        self.pending_scale = pending_scale
+        self._seed_of_file = {}     # AFL++ 队列条目路径 -> 种子编号
+        self._recent = {}           # 种子编号 -> [最近奖励, 上次更新时的批次编号]
+        self._step = 0              # 已结算的批次总数，用于惰性衰减
+        self._in_flight = {}        # 种子编号 -> 正在解析/生成/修复中的任务数
+        self._in_flight_lock = threading.Lock()
+
+    def bind(self, filename, seed_id):
+        """
+        记录 AFL++ 队列条目与种子编号的对应关系
+        :param filename: 队列条目路径
+        :param seed_id: 种子编号
+        :return: 无返回值
+        """
+        if seed_id >= 0:
+            self._seed_of_file[filename] = seed_id
+
+    def seed_of(self, filename):
+        """
+        :param filename: 队列条目路径
+        :return: 种子编号，未登记过时为 -1
+        """
+        return self._seed_of_file.get(filename, -1)
+
+    def record_batch(self, seed_id, reward):
+        """
+        结算一个批次时调用，累加该种子的最近奖励（其余种子惰性衰减）
+        :param seed_id: 批次所用变异器所属的种子编号
+        :param reward: 批次奖励
+        :return: 无返回值
+        """
+        self._step += 1
+        value = self.recent_reward(seed_id)
+        self._recent[seed_id] = [value + reward, self._step]
+
+    def begin_work(self, seed_id):
+        """
+        该种子的一个任务进入流水线（放入解析队列）
+        :param seed_id: 种子编号
+        :return: 无返回值
+        """
+        with self._in_flight_lock:
+            self._in_flight[seed_id] = self._in_flight.get(seed_id, 0) + 1
+
+    def finish_work(self, seed_id):
+        """
+        该种子的一个任务离开流水线（复用已有变异器、生成失败或修复结束）
+        :param seed_id: 种子编号
+        :return: 无返回值
+        """
+        with self._in_flight_lock:
+            count = self._in_flight.get(seed_id, 0) - 1
+            if count > 0:
+                self._in_flight[seed_id] = count
+            else:
+                self._in_flight.pop(seed_id, None)
+
+    def in_flight(self, seed_id):
+        """
+        :param seed_id: 种子编号
+        :return: 该种子正在流水线中的任务数
+        """
+        return self._in_flight.get(seed_id, 0)
+
+    def recent_reward(self, seed_id):
+        """
+        :param seed_id: 种子编号
+        :return: 衰减到当前批次的最近奖励
+        """
+        entry = self._recent.get(seed_id)
+        if entry is None:
+            return 0.0
+        return entry[0] * self.recent_decay ** (self._step - entry[1])
+
+    def saturation(self, seed, arm_stats):
+        """
+        计算一个种子的饱和度
+        :param seed: AFLSeed 对象
+        :param arm_stats: ChiloMutatorPool.seed_arm_stats 的返回值，没有变异器时为 None
+        :return: (饱和度, 后验均值, 结算批次数, 最近奖励, 正在流水线中的任务数)
+        """
+        if arm_stats is None:
+            mean, trials = 1.0, 0
+            posterior_saturation = 0.0
+        else:
+            alpha, beta, trials, _ = arm_stats
+            mean = alpha / (alpha + beta)
+            evidence = trials / (trials + self.min_trials)
+            posterior_saturation = evidence * max(0.0, 1.0 - mean / self.success_ref)
+        pending = self.in_flight(seed.seed_id)
+        pending_saturation = pending / (pending + self.pending_scale)
+        saturation = 1.0 - (1.0 - posterior_saturation) * (1.0 - pending_saturation)
+        recent = self.recent_reward(seed.seed_id)
+        saturation *= math.exp(-recent / self.recent_scale)
+        return saturation, mean, trials, recent, pending
+
+
+def decide(saturation, mode, skip_threshold, max_skip_prob, rng=random):
+    """
+    根据饱和度决定是否跳过该种子
+    :param saturation: 饱和度
+    :param mode: skip：饱和度达到阈值时跳过；weighted：以饱和度为概率跳过
+    :param skip_threshold: skip 模式的阈值
+    :param max_skip_prob: 跳过的最大概率，保证饱和的种子偶尔仍会被执行
+    :param rng: 随机数发生器
+    :return: 是否跳过
+    """
+    if mode == 'skip':
+        return saturation >= skip_threshold and rng.random() < max_skip_prob
+    return rng.random() < min(saturation, max_skip_prob)
@@ -0,0 +1,112 @@
+"""
+异步批量遥测写入
+
+fuzz/post_run 每次执行都要写一行主CSV，原来的做法是 加锁 -> 以追加模式打开文件 -> 写一行 -> 关闭，
+在AFL++的热路径上每秒产生上千次 open/close，并且与解析器/修复器等线程争用同一把锁。
+这里每个CSV文件对应一个 CsvSink：调用方只把一行数据追加到有界队列中（deque.append 无需加锁），
+由该文件独占的后台线程在积累到一定行数或超过时间间隔时批量写入，文件句柄常驻。
+"""
+import csv
+import threading
+from collections import deque
+
+
+class CsvSink:
+    """
+    单个CSV文件的后台批量写入器
+    """
+    def __init__(self, path, flush_rows=256, flush_interval=1.0, max_queue=100000, logger=None):
+        """
+        :param path: CSV文件路径（表头已由调用方写入，这里以追加模式打开）
+        :param flush_rows: 队列中积累到多少行时立即唤醒写线程
+        :param flush_interval: 写线程最长多久写一次（秒）
+        :param max_queue: 队列最大行数，超过后新行被丢弃并计入 dropped
+        :param logger: 日志对象
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.logger = logger
+
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._closed = False
+        self._drop_lock = threading.Lock()  # 只在丢弃时使用，保证计数准确
+
+        self.written_count = 0      # 已写入文件的行数
+        self.dropped_count = 0      # 因队列已满或已关闭而丢弃的行数
+        self.flush_count = 0        # 批量写入的次数
+        self.error_count = 0        # 写入出错的次数
+
+        self._file = open(path, mode='a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._thread = threading.Thread(target=self._run, name=f"CsvSink-{path}", daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        """
+        追加一行数据，不阻塞
+        :param row: 与该CSV表头对应的一行数据
+        :return: 是否成功进入队列
+        """
+        if self._closed or len(self._queue) >= self.max_queue:
+            with self._drop_lock:
+                self.dropped_count += 1
+            return False
+        self._queue.append(row)
+        if len(self._queue) >= self.flush_rows:
+            self._wake.set()
+        return True
+
+    def close(self, timeout=5.0):
+        """
+        停止接收新数据，写完队列中剩余的数据后关闭文件（在 deinit 中调用）
+        :param timeout: 等待写线程结束的最长时间（秒）
+        :return: 无返回值
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """
+        读取写入计数器
+        :return: 包含 pending/written/dropped/flush/error 的字典
+        """
+        return {
+            "pending": len(self._queue),
+            "written": self.written_count,
+            "dropped": self.dropped_count,
+            "flush": self.flush_count,
+            "error": self.error_count,
+        }
+
+    def _drain(self):
+        rows = []
+        try:
+            while True:
+                rows.append(self._queue.popleft())
+        except IndexError:
+            pass
+        if not rows:
+            return
+        try:
+            self._writer.writerows(rows)
+            self._file.flush()
+            self.written_count += len(rows)
+            self.flush_count += 1
+        except (OSError, csv.Error) as e:
+            self.error_count += 1
+            if self.logger is not None:
+                self.logger.error("写入 %s 失败，丢失 %s 行：%s", self.path, len(rows), e)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()   # 关闭前写完剩余数据
+        self._file.close()
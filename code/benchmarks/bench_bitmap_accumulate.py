@@ -0,0 +1,88 @@
+"""
+覆盖率合并基准测试：比较旧的全位图 NumPy 多趟扫描与按非零下标稀疏更新（含命中次数分桶）的单次执行耗时
+
+合成的轨迹接近真实SQL执行：每次执行命中一个公共热点集合（解析器/执行器的主干）的大部分，
+再加上少量随机槽位；命中次数服从几何分布。
+在 code 目录下运行：python -m benchmarks.bench_bitmap_accumulate [--sizes 65536 262144] [--density 0.01 0.05]
+"""
+import argparse
+import array
+import time
+
+import numpy as np
+
+from ChiloMutatorFactory.ChiloBitMap import BitMap
+
+
+class LegacyBitMap:
+    """旧实现：每次执行对整个位图做 data > 0、两次带掩码的 np.add 和新边掩码"""
+    def __init__(self, mapsize):
+        self.map_size = mapsize
+        self._sum_bitmap = array.array('Q', [0] * mapsize)
+        self._cumulative_bitmap = array.array('I', [0] * mapsize)
+        self._bool_bitmap = array.array('B', [0] * mapsize)
+        self.hit_count = 0
+
+    def add_bitmap(self, bitmap):
+        data = np.frombuffer(bitmap, dtype=np.uint8)
+        sum_arr = np.frombuffer(self._sum_bitmap, dtype=np.uint64)
+        cum_arr = np.frombuffer(self._cumulative_bitmap, dtype=np.uint32)
+        bool_arr = np.frombuffer(self._bool_bitmap, dtype=np.uint8)
+        nonzero = data > 0
+        np.add(sum_arr, data, out=sum_arr, where=nonzero, casting='unsafe')
+        np.add(cum_arr, nonzero, out=cum_arr, where=nonzero, casting='unsafe')
+        new_edges_mask = nonzero & (bool_arr == 0)
+        new_edges = np.count_nonzero(new_edges_mask)
+        if new_edges > 0:
+            bool_arr[new_edges_mask] = 1
+            self.hit_count += new_edges
+        return new_edges
+
+
+def make_traces(map_size, density, count, seed=0):
+    rng = np.random.default_rng(seed)
+    hot = rng.choice(map_size, int(map_size * density), replace=False)
+    traces = []
+    for _ in range(count):
+        trace = np.zeros(map_size, dtype=np.uint8)
+        hit = np.concatenate((hot[rng.random(hot.size) < 0.8],
+                              rng.integers(0, map_size, max(1, hot.size // 50))))
+        trace[hit] = np.minimum(rng.geometric(0.3, hit.size), 255)
+        traces.append(trace)
+    return traces
+
+
+def run(bitmap, traces):
+    start = time.perf_counter()
+    for trace in traces:
+        bitmap.add_bitmap(trace)
+    return (time.perf_counter() - start) / len(traces) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="覆盖率合并基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[65536, 262144], help="位图大小")
+    parser.add_argument("--density", type=float, nargs="+", default=[0.01, 0.05], help="热点集合占位图的比例")
+    parser.add_argument("--execs", type=int, default=2000, help="每组合成的执行次数")
+    args = parser.parse_args()
+
+    print(f"{'map_size':>9} {'density':>8} {'legacy(us)':>11} {'sparse(us)':>11} {'speedup':>8} "
+          f"{'edges':>7} {'buckets':>8}")
+    for map_size in args.sizes:
+        for density in args.density:
+            traces = make_traces(map_size, density, args.execs)
+            legacy, sparse = LegacyBitMap(map_size), BitMap(map_size)
+            # 两种实现的新边数应完全一致
+            for trace in traces[:50]:
+                assert legacy.add_bitmap(trace) == sparse.add_bitmap(trace).new_edges
+            assert np.array_equal(np.frombuffer(legacy._sum_bitmap, np.uint64), sparse._sum_arr)
+            assert np.array_equal(np.frombuffer(legacy._cumulative_bitmap, np.uint32), sparse._cum_arr)
+            legacy, sparse = LegacyBitMap(map_size), BitMap(map_size)
+            legacy_us, sparse_us = run(legacy, traces), run(sparse, traces)
+            buckets = int(np.count_nonzero(np.unpackbits(sparse._bucket_arr)))
+            print(f"{map_size:>9} {density:>8} {legacy_us:>11.2f} {sparse_us:>11.2f} {legacy_us / sparse_us:>7.1f}x "
+                  f"{sparse.hit_count:>7} {buckets:>8}")
+
+
+if __name__ == "__main__":
+    main()
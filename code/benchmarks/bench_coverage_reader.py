@@ -0,0 +1,125 @@
+"""
+覆盖率读取基准测试：比较旧的每次调用都构造 ctypes 数组 + memoryview、纯 Python 循环统计，
+与挂载时创建的常驻 NumPy 视图、向量化统计 的单次耗时
+
+创建一块真实的 System V 共享内存作为 AFL++ 的覆盖率位图（写入稀疏的轨迹），由 AFLCoverageReader 以只读方式挂载。
+在 code 目录下运行：python -m benchmarks.bench_coverage_reader [--sizes 65536 262144] [--density 0.01]
+"""
+import argparse
+import ctypes
+import os
+import tempfile
+import timeit
+from ctypes import POINTER, c_int, c_size_t, c_uint8, c_void_p
+
+import numpy as np
+
+os.environ.setdefault("AFL_MAP_SIZE", "65536")
+from ChiloMutatorFactory.ChiloBitMap import BitMap
+from ChiloMutatorFactory.ChiloCoverage import AFLCoverageReader
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+libc = ctypes.CDLL("libc.so.6", use_errno=True)
+libc.shmget.argtypes = [c_int, c_size_t, c_int]
+libc.shmget.restype = c_int
+libc.shmat.argtypes = [c_int, c_void_p, c_int]
+libc.shmat.restype = c_void_p
+libc.shmdt.argtypes = [c_void_p]
+libc.shmctl.argtypes = [c_int, c_int, c_void_p]
+
+
+def legacy_bitmap(reader):
+    """旧实现：每次调用都新建数组类型、cast 指针并包装 memoryview"""
+    array_type = c_uint8 * reader.map_size
+    return memoryview(ctypes.cast(reader.map_ptr, POINTER(array_type)).contents)
+
+
+def legacy_count(reader):
+    # ctypes 数组的 memoryview 格式为 "<B"，不能直接迭代（旧实现会抛出 NotImplementedError），这里先 cast 为 "B"
+    return sum(1 for b in legacy_bitmap(reader).cast("B") if b > 0)
+
+
+def legacy_compare(reader, previous_bitmap):
+    current = legacy_bitmap(reader).cast("B")
+    new_edges, total_edges = 0, 0
+    for i in range(len(current)):
+        if current[i] > 0:
+            total_edges += 1
+            if previous_bitmap[i] == 0:
+                new_edges += 1
+    return new_edges, total_edges
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def bench(map_size, density, tmp_dir):
+    shm_id = libc.shmget(IPC_PRIVATE, map_size, IPC_CREAT | 0o600)
+    if shm_id < 0:
+        raise RuntimeError(f"shmget() failed with errno {ctypes.get_errno()}")
+    writer_ptr = libc.shmat(shm_id, None, 0)
+    try:
+        # 稀疏轨迹：约 density 比例的槽位被命中
+        rng = np.random.default_rng(0)
+        trace = np.zeros(map_size, dtype=np.uint8)
+        hit = rng.choice(map_size, int(map_size * density), replace=False)
+        trace[hit] = rng.integers(1, 255, hit.size, dtype=np.uint8)
+        ctypes.memmove(writer_ptr, trace.ctypes.data, map_size)
+        previous = bytes(np.where(rng.random(map_size) < 0.5, trace, 0).astype(np.uint8))
+
+        shm_id_path = os.path.join(tmp_dir, f"shm_{map_size}")
+        with open(shm_id_path, "w", encoding="utf-8") as f:
+            f.write(f"{shm_id}\n")
+        reader = AFLCoverageReader(shm_id_path)
+        reader.map_size = map_size
+        reader.get_coverage_bitmap()
+        assert reader.get_coverage_count() == legacy_count(reader)
+        assert reader.compare_coverage(previous) == legacy_compare(reader, previous)
+        assert np.array_equal(reader.nonzero_indices(), np.flatnonzero(trace))
+
+        legacy_bitmap_map, new_bitmap_map = BitMap(map_size), BitMap(map_size)
+        rows = [
+            ("get_coverage_bitmap", per_call_us(lambda: legacy_bitmap(reader), 2000),
+             per_call_us(reader.get_coverage_bitmap, 2000)),
+            ("bitmap + add_bitmap", per_call_us(lambda: legacy_bitmap_map.add_bitmap(legacy_bitmap(reader)), 200),
+             per_call_us(lambda: new_bitmap_map.add_bitmap(reader.get_coverage_bitmap()), 200)),
+            ("get_coverage_count", per_call_us(lambda: legacy_count(reader), 3),
+             per_call_us(reader.get_coverage_count, 200)),
+            ("compare_coverage", per_call_us(lambda: legacy_compare(reader, previous), 3),
+             per_call_us(lambda: reader.compare_coverage(previous), 200)),
+            ("nonzero_indices", per_call_us(lambda: np.flatnonzero(reader.get_coverage_bitmap()), 200),
+             per_call_us(reader.nonzero_indices, 200)),
+        ]
+        # 判断是否有命中：最坏情况为全零轨迹（需要扫描整个位图）
+        ctypes.memset(writer_ptr, 0, map_size)
+        assert not reader.has_any_nonzero()
+        rows.append(("has_any_nonzero(zero)", per_call_us(lambda: any(legacy_bitmap(reader).cast("B")), 20),
+                     per_call_us(reader.has_any_nonzero, 2000)))
+        rows.append(("  vs uint8 np.any(zero)", per_call_us(lambda: reader.get_coverage_bitmap().any(), 2000),
+                     per_call_us(reader.has_any_nonzero, 2000)))
+        print(f"map_size={map_size} density={density}")
+        print(f"{'op':>22} {'legacy(us)':>11} {'new(us)':>9} {'speedup':>8}")
+        for name, old, new in rows:
+            print(f"{name:>22} {old:>11.2f} {new:>9.2f} {old / new:>7.1f}x")
+        reader.cleanup()
+    finally:
+        libc.shmdt(writer_ptr)
+        libc.shmctl(shm_id, IPC_RMID, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="覆盖率读取基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[65536, 262144], help="位图大小")
+    parser.add_argument("--density", type=float, default=0.01, help="被命中槽位的比例")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for map_size in args.sizes:
+            bench(map_size, args.density, tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
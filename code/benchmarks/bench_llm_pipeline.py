@@ -0,0 +1,197 @@
+"""
+LLM 流水线离线基准测试：不依赖网络和 AFL++，测量解析器/变异器生成器/修复器的吞吐和 init() -> fuzz() 的整个流程
+
+在临时目录中生成 config.yaml（四个阶段的 BASE_URL 都指向进程内启动的本地桩服务器 llm_stub_server），
+创建一块 System V 共享内存作为 AFL++ 的覆盖率位图，然后像 AFL++ 一样反复调用
+ChiloMutate.fuzz_count / fuzz / post_run（每次执行后向位图写入稀疏的随机轨迹），最后统计：
+    第一次有变异器可执行的时间、执行次数与每秒执行次数、各阶段 CSV 的行数与每秒行数、LLM 传输层统计。
+--trace-mode record 时把本次的 LLM 调用录制到 --trace；replay 时不访问桩服务器，从 --trace 回放。
+
+在 code 目录下运行：
+    python -m benchmarks.bench_llm_pipeline [--duration 30] [--latency 0.5] [--stream]
+    python -m benchmarks.bench_llm_pipeline --trace /tmp/trace.jsonl --trace-mode record
+    python -m benchmarks.bench_llm_pipeline --trace /tmp/trace.jsonl --trace-mode replay --replay-latency none
+"""
+import argparse
+import csv
+import ctypes
+import os
+import tempfile
+import time
+from ctypes import c_int, c_size_t, c_void_p
+
+import numpy as np
+import yaml
+
+os.environ.setdefault("AFL_MAP_SIZE", "65536")
+import ChiloMutate
+import llm_stub_server
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+libc = ctypes.CDLL("libc.so.6", use_errno=True)
+libc.shmget.argtypes = [c_int, c_size_t, c_int]
+libc.shmget.restype = c_int
+libc.shmat.argtypes = [c_int, c_void_p, c_int]
+libc.shmat.restype = c_void_p
+libc.shmdt.argtypes = [c_void_p]
+libc.shmctl.argtypes = [c_int, c_int, c_void_p]
+
+SEED_SQLS = [
+    "CREATE TABLE t1(a INTEGER, b TEXT);\nINSERT INTO t1 VALUES(1, 'x'), (2, 'y');\nSELECT a + 10 FROM t1 WHERE a > 1;",
+    "CREATE TABLE t2(c REAL);\nINSERT INTO t2 VALUES(3.5);\nSELECT c * 2, ABS(-7) FROM t2 LIMIT 5;",
+    "SELECT 1, 2 + 3, SUBSTR('abc', 2, 1);",
+    "CREATE TABLE t3(x INT PRIMARY KEY);\nINSERT INTO t3 VALUES(42);\nUPDATE t3 SET x = x - 1 WHERE x = 42;",
+]
+
+STAGE_CSVS = [
+    ("parser", "PARSER_CSV_PATH"),
+    ("mutator_generator", "MUTATOR_GENERATOR_CSV_PATH"),
+    ("structural_mutator", "STRUCTURAL_MUTATOR_CSV_PATH"),
+    ("fixer", "MUTATOR_FIXER_CSV_PATH"),
+    ("main", "MAIN_CSV_PATH"),
+]
+
+
+def write_config(work_dir, base_url, args, extra=None):
+    """
+    在 work_dir 中生成 config.yaml 并创建用到的目录
+    :param extra: 追加或覆盖的配置项，{段名: {键: 值}}，其他基准测试复用时使用
+    :return: 配置字典
+    """
+    def path(*parts):
+        return os.path.join(work_dir, *parts)
+
+    stage = {"API_KEY": "stub", "MODEL": "chilo-stub", "BASE_URL": base_url}
+    config = {
+        "TARGET": {"DBMS": "SQLite", "DBMS_VERSION": "3"},
+        "OTHERS": {
+            "FUZZ_COUNT_TIME": 20, "MUTATOR_GENERATOR_QUEUE_MAX_SIZE": 64, "PARSER_STACK_MAX_SIZE": 64,
+            "WAIT_EXEC_STRUCTURAL_QUEUE_MAX_SIZE": 16, "FIX_MUTATOR_QUEUE_MAX_SIZE": 64,
+            "FIX_MUTATOR_TRY_TIME": 20, "SEMANTIC_FIX_MAX_TIME": 3, "TIMES_TO_STRUCTURAL_MUTATOR": 50,
+        },
+        "FILE_PATH": {
+            "BITMAP": path("bitmap"), "GENERATED_MUTATOR_PATH": path("mutators") + "/",
+            "MUTATOR_FIX_TMP_PATH": path("fix_tmp", "mutator_fix_tmp.py"), "PARSED_SQL_PATH": path("parsed") + "/",
+            "SHMID": path("shmid"), "STRUCTURAL_MUTATE_PATH": path("structural") + "/",
+            "CVE_CASES_PATH": path("cve_cases") + "/", "LLM_TRACE_PATH": args.trace or path("trace.jsonl"),
+        },
+        "LOG": {key: path("log", name) for key, name in [
+            ("MAIN_LOG_PATH", "main.log"), ("PARSER_LOG_PATH", "parser.log"),
+            ("MUTATOR_GENERATOR_LOG_PATH", "generator.log"), ("STRUCTURAL_MUTATOR_LOG_PATH", "structural.log"),
+            ("MUTATOR_FIXER_LOG_PATH", "fixer.log"), ("LLM_LOG_PATH", "llm.log")]},
+        "CSV": {key: path("csv", f"{name}.csv") for name, key in STAGE_CSVS},
+        "LLM": {name: dict(stage) for name in
+                ("LLM_PARSER", "LLM_MUTATOR_GENERATOR", "LLM_STRUCTURAL_MUTATOR", "LLM_FIXER")},
+        "LLM_TRANSPORT": {"STREAM": args.stream},
+        "LLM_TRACE": {"MODE": args.trace_mode, "REPLAY_LATENCY": args.replay_latency},
+    }
+    for section, values in (extra or {}).items():
+        config.setdefault(section, {}).update(values)
+    for directory in ("bitmap", "mutators", "fix_tmp", "parsed", "structural", "cve_cases", "log", "csv"):
+        os.makedirs(path(directory), exist_ok=True)
+    with open(path("config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return config
+
+
+def count_rows(csv_path):
+    if not os.path.exists(csv_path):
+        return 0
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def run(args, writer_ptr, map_size):
+    rng = np.random.default_rng(0)
+    seeds = [bytearray(sql, "utf-8") for sql in SEED_SQLS]
+    init_start = time.time()
+    ChiloMutate.init(0)
+    factory = ChiloMutate.chilo_factory
+    start = time.time()
+    first_exec_time = None
+    exec_count = 0
+    round_count = 0
+    while time.time() - start < args.duration:
+        buf = seeds[round_count % len(seeds)]
+        round_count += 1
+        energy = ChiloMutate.fuzz_count(buf)
+        if energy == 0:
+            time.sleep(0.01)    # 还没有可执行的变异器，AFL++ 会跳过该种子
+            continue
+        if first_exec_time is None:
+            first_exec_time = time.time() - init_start
+        for _ in range(energy):
+            ChiloMutate.fuzz(buf, None, 1 << 20)
+            # 模拟目标程序的一次执行：写入稀疏的随机轨迹
+            trace = np.zeros(map_size, dtype=np.uint8)
+            hit = rng.integers(0, map_size, 64)
+            trace[hit] = 1
+            ctypes.memmove(writer_ptr, trace.ctypes.data, map_size)
+            ChiloMutate.post_run()
+            exec_count += 1
+    elapsed = time.time() - start
+    pool_size = len(factory.mutator_pool.mutator_list)
+    transport_stats = factory.llm_transport_stats()
+    ChiloMutate.deinit()    # 写完 CSV 队列中剩余的行
+    return elapsed, first_exec_time, exec_count, round_count, pool_size, transport_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 流水线离线基准测试")
+    parser.add_argument("--duration", type=float, default=30.0, help="调用 fuzz_count/fuzz/post_run 的秒数")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务器每个请求的延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="桩服务器流式输出的速度，0 为不限速")
+    parser.add_argument("--stream", action="store_true", help="传输层使用流式模式")
+    parser.add_argument("--trace", default=None, help="trace 文件路径")
+    parser.add_argument("--trace-mode", default="off", choices=["off", "record", "replay"])
+    parser.add_argument("--replay-latency", default="recorded", help="回放延迟：recorded / none / 固定秒数")
+    args = parser.parse_args()
+    if args.trace_mode != "off" and not args.trace:
+        parser.error("--trace-mode 为 record 或 replay 时必须指定 --trace")
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+    if args.replay_latency not in ("recorded", "none"):
+        try:
+            args.replay_latency = float(args.replay_latency)     # 写入 YAML 时必须是数字而不是字符串
+        except ValueError:
+            parser.error("--replay-latency 必须为 recorded、none 或秒数")
+
+    map_size = int(os.environ["AFL_MAP_SIZE"])
+    server = llm_stub_server.start_server(port=0, latency=args.latency, tokens_per_second=args.tokens_per_second)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    work_dir = tempfile.mkdtemp(prefix="chilo_bench_")
+    config = write_config(work_dir, base_url, args)
+
+    shm_id = libc.shmget(IPC_PRIVATE, map_size, IPC_CREAT | 0o600)
+    if shm_id < 0:
+        raise RuntimeError(f"shmget() failed with errno {ctypes.get_errno()}")
+    writer_ptr = libc.shmat(shm_id, None, 0)
+    with open(config["FILE_PATH"]["SHMID"], "w", encoding="utf-8") as f:
+        f.write(f"{shm_id}\n")
+    os.chdir(work_dir)
+    try:
+        elapsed, first_exec_time, exec_count, round_count, pool_size, transport_stats = run(args, writer_ptr, map_size)
+        print(f"工作目录: {work_dir}")
+        print(f"mode={args.trace_mode} stream={args.stream} latency={args.latency}s duration={elapsed:.1f}s")
+        print(f"第一次有变异器可执行: {first_exec_time:.2f}s" if first_exec_time is not None
+              else "第一次有变异器可执行: 未发生")
+        print(f"fuzz_count 调用: {round_count}, 执行: {exec_count} ({exec_count / elapsed:.1f} execs/s)")
+        print(f"变异器池: {pool_size}")
+        print(f"{'stage':>20} {'rows':>6} {'rows/s':>8}")
+        for name, key in STAGE_CSVS:
+            rows = count_rows(config["CSV"][key])
+            print(f"{name:>20} {rows:>6} {rows / elapsed:>8.2f}")
+        print(f"桩服务器请求: {server.state.request_count} (流式 {server.state.stream_count})")
+        print(f"LLM 传输层统计: {transport_stats}")
+    finally:
+        libc.shmdt(writer_ptr)
+        libc.shmctl(shm_id, IPC_RMID, None)
+    # 流水线的各阶段线程不是守护线程，也没有退出信号
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
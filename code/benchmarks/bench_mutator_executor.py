@@ -0,0 +1,56 @@
+"""
+变异器执行后端基准测试：比较 inprocess 与 isolated 两种模式下每次 mutate() 调用的平均开销
+
+在 code 目录下运行：python -m benchmarks.bench_mutator_executor
+"""
+import os
+import tempfile
+import time
+
+from ChiloMutatorFactory.mutator_cache import MutatorCache
+from ChiloMutatorFactory.mutator_executor import InProcessMutatorExecutor, IsolatedMutatorExecutor
+
+SAMPLE_MUTATOR = '''
+import random
+import re
+
+SEED = "SELECT [CONSTANT, 1] FROM t1 WHERE c1 [OPERATOR, =] [CONSTANT, 2];"
+
+def mutate():
+    return re.sub(r"\\[CONSTANT, \\d+\\]", lambda m: str(random.randint(-1000, 1000)),
+                  SEED.replace("[OPERATOR, =]", random.choice(["=", "<", ">", "<>"])))
+'''
+
+TOTAL_CALLS = 20000
+BATCH_SIZES = [1, 8, 32, 128]
+
+
+def bench(executor, file_path, batch_size):
+    """返回每次 mutate() 调用的平均耗时（微秒）"""
+    executor.call_mutate_batch(file_path, batch_size)  # 预热，完成模块加载
+    rounds = max(TOTAL_CALLS // batch_size, 1)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        executor.call_mutate_batch(file_path, batch_size)
+    return (time.perf_counter() - start) / (rounds * batch_size) * 1e6
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "1_1.py")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(SAMPLE_MUTATOR)
+
+        inprocess = InProcessMutatorExecutor(MutatorCache(16))
+        isolated = IsolatedMutatorExecutor(worker_count=1, call_timeout=1.0, memory_limit_mb=512, cache_size=16)
+        try:
+            print(f"{'batch':>6} {'inprocess(us)':>14} {'isolated(us)':>13}")
+            for batch_size in BATCH_SIZES:
+                print(f"{batch_size:>6} {bench(inprocess, file_path, batch_size):>14.2f} "
+                      f"{bench(isolated, file_path, batch_size):>13.2f}")
+        finally:
+            isolated.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+反馈模式基准测试：比较 ENERGY.FEEDBACK_MODE 为 bitmap（每次执行后在 post_run 中合并整个位图）
+与 queue（只在 AFL++ 保存新条目时按戳记奖励，post_run 只做计数和抽样合并）时反馈路径的单次耗时和 execs/sec，
+并比较两种模式给出的批次奖励是否一致。
+
+queue 模式走真实的 ChiloFactory（在临时目录中按 queue 反馈模式构造，不启动流水线线程、不访问 LLM）：
+批次由 begin_thompson_batch 开始，保存条目时调用 ChiloMutate.describe() 生成戳、ChiloMutate.queue_new_entry() 记奖励，
+批次由 ChiloMutate.settle_thompson_batch() 结算。
+AFL++ 的 has_new_bits 用 virgin map 模拟（按 count_class_lookup8 分桶），它在两种模式下都会执行，不计入反馈耗时。
+execs/sec 按“目标程序单次执行耗时 + 反馈耗时”换算，--target-us 为 0 时只反映反馈路径本身的上限。
+在 code 目录下运行：python -m benchmarks.bench_queue_feedback [--sizes 65536 262144] [--energy 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("AFL_MAP_SIZE", "65536")
+import ChiloMutate
+from ChiloMutatorFactory import chilo_factory, queue_feedback
+from ChiloMutatorFactory.ChiloBitMap import COUNT_CLASS_LOOKUP, STRATEGY_POOL, BitMap
+from benchmarks import bench_llm_pipeline
+
+DESCRIPTION_MAX_LENGTH = 200
+
+
+class AFLVirginMap:
+    """模拟 AFL++ 判断输入是否有新覆盖：分桶后的命中与 virgin map 有交集则保存为新条目"""
+    def __init__(self, map_size):
+        self.virgin = np.full(map_size, 0xFF, dtype=np.uint8)
+
+    def has_new_bits(self, trace):
+        classified = COUNT_CLASS_LOOKUP[trace]
+        if not np.any(classified & self.virgin):
+            return False
+        self.virgin &= ~classified
+        return True
+
+
+def make_traces(map_size, density, count, seed=0):
+    """
+    合成的轨迹：命中公共热点集合的大部分（每个槽位的命中次数基本固定，偶尔变化），
+    再从一个有限的冷门集合中命中少量槽位；随着执行次数增加，新覆盖越来越少（接近真实 fuzz 的饱和过程）
+    """
+    rng = np.random.default_rng(seed)
+    hot_size = int(map_size * density)
+    slots = rng.choice(map_size, hot_size + hot_size // 4, replace=False)
+    hot, cold = slots[:hot_size], slots[hot_size:]
+    hot_counts = np.minimum(rng.geometric(0.3, hot.size), 255).astype(np.uint8)
+    traces = []
+    for _ in range(count):
+        trace = np.zeros(map_size, dtype=np.uint8)
+        trace[hot[rng.random(hot.size) < 0.8]] = 1
+        trace[hot] *= np.where(rng.random(hot.size) < 0.02 / hot.size, rng.integers(1, 64, hot.size), hot_counts).astype(np.uint8)
+        hit_cold = cold[rng.random(cold.size) < 0.5 / cold.size]
+        trace[hit_cold] = np.minimum(rng.geometric(0.3, hit_cold.size), 255)
+        traces.append(trace)
+    return traces
+
+
+def afl_saves(map_size, traces):
+    """两种模式共用：AFL++ 对每次执行的保存决定"""
+    virgin = AFLVirginMap(map_size)
+    return [virgin.has_new_bits(trace) for trace in traces]
+
+
+def run_bitmap_mode(map_size, traces, energy):
+    """每次执行都合并整个位图；返回 (单次反馈耗时us, 每个批次的新边奖励, 每个批次的新桶奖励)"""
+    bitmap = BitMap(map_size)
+    edges, buckets = [], []
+    start = time.perf_counter()
+    for i, trace in enumerate(traces):
+        if i % energy == 0:
+            edges.append(0)
+            buckets.append(0)
+        if trace.any():
+            delta = bitmap.add_bitmap(trace, i + 1, 0, 0, STRATEGY_POOL)
+            edges[-1] += delta.new_edges
+            buckets[-1] += delta.new_buckets
+    return (time.perf_counter() - start) / len(traces) * 1e6, edges, buckets
+
+
+def make_factory(sample_interval):
+    """
+    在临时目录中按 queue 反馈模式构造真实的 ChiloFactory，并让 ChiloMutate 的钩子使用它
+    :param sample_interval: ENERGY.FEEDBACK_SAMPLE_INTERVAL
+    :return: ChiloFactory
+    """
+    work_dir = tempfile.mkdtemp(prefix="chilo_queue_bench_")
+    args = SimpleNamespace(trace=None, stream=False, trace_mode="off", replay_latency="recorded")
+    bench_llm_pipeline.write_config(work_dir, "http://127.0.0.1:9/v1", args, {
+        "ENERGY": {"FEEDBACK_MODE": "queue", "FEEDBACK_SAMPLE_INTERVAL": sample_interval}})
+    os.chdir(work_dir)
+    factory = chilo_factory.ChiloFactory()
+    ChiloMutate.chilo_factory = factory
+    return factory
+
+
+def run_queue_mode(factory, map_size, traces, saves, energy):
+    """
+    post_run 只计数（抽样的执行才合并位图），AFL++ 保存的条目经 describe() / queue_new_entry() 按戳记奖励，
+    批次经 settle_thompson_batch() 结算；返回 (单次反馈耗时us, 每个批次结算时的奖励)
+    """
+    factory.bitmap = BitMap(map_size)
+    factory.queue_feedback_stats = queue_feedback.QueueFeedbackStats()
+    index = factory.mutator_pool.add_mutator(0, map_size)
+    mutator = factory.mutator_pool.mutator_list[index]
+    factory.next_fuzz_strategy = STRATEGY_POOL
+    factory.current_exec_seed_id, factory.current_exec_mutator_index = mutator.seed_id, index
+    rewards = []
+
+    def settle():
+        ChiloMutate.settle_thompson_batch()
+        rewards.append(factory.current_batch_reward)
+
+    start = time.perf_counter()
+    for i, trace in enumerate(traces):
+        exec_number = i + 1
+        if i % energy == 0:
+            if i:
+                settle()
+            factory.begin_thompson_batch(mutator, exec_number)
+        # fuzz()
+        ChiloMutate.fuzz_number = exec_number
+        # post_run()
+        factory.current_batch_exec_count += 1
+        if factory.should_scan_trace(exec_number) and trace.any():
+            factory.bitmap.add_bitmap(trace, exec_number, mutator.seed_id, index, STRATEGY_POOL)
+        if saves[i]:
+            # AFL++ 保存条目：describe() 的返回值追加在文件名末尾，随后调用 queue_new_entry()
+            filename = (f"queue/id:{i:06d},src:000000,time:0,execs:{exec_number},"
+                        f"{ChiloMutate.describe(DESCRIPTION_MAX_LENGTH)}")
+            ChiloMutate.queue_new_entry(filename, "queue/id:000000")
+    settle()
+    return (time.perf_counter() - start) / len(traces) * 1e6, rewards
+
+
+def agreement(a, b):
+    """两个奖励序列中“批次是否成功”判定一致的比例"""
+    return float(np.mean((np.asarray(a) > 0) == (np.asarray(b) > 0)))
+
+
+def correlation(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    if a.std() == 0 or b.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反馈模式基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[65536, 262144], help="位图大小")
+    parser.add_argument("--density", type=float, default=0.02, help="热点集合占位图的比例")
+    parser.add_argument("--execs", type=int, default=5000, help="合成的执行次数")
+    parser.add_argument("--energy", type=int, default=50, help="每个批次的执行次数")
+    parser.add_argument("--sample-interval", type=int, default=100, help="queue 模式下每隔多少次执行合并一次位图")
+    parser.add_argument("--target-us", type=float, nargs="+", default=[0, 200, 1000],
+                        help="目标程序单次执行耗时（us），用于换算 execs/sec")
+    args = parser.parse_args()
+
+    factory = make_factory(args.sample_interval)
+    for map_size in args.sizes:
+        traces = make_traces(map_size, args.density, args.execs)
+        saves = afl_saves(map_size, traces)
+        bitmap_us, edges, buckets = run_bitmap_mode(map_size, traces, args.energy)
+        queue_us, rewards = run_queue_mode(factory, map_size, traces, saves, args.energy)
+        # 每个保存的条目都应带有可解析的戳，并记入产生它的批次
+        stats = factory.queue_feedback_stats.stats()
+        assert stats["unstamped"] == 0 and stats["stale"] == 0 and stats["credited"] == sum(saves), stats
+
+        print(f"map_size={map_size} execs={args.execs} energy={args.energy} saves={sum(saves)}")
+        print(f"{'mode':>8} {'feedback(us)':>13} " + " ".join(f"{f'execs/s@{t:g}us':>16}" for t in args.target_us))
+        for mode, us in (("bitmap", bitmap_us), ("queue", queue_us)):
+            print(f"{mode:>8} {us:>13.2f} " + " ".join(f"{1e6 / (t + us):>16.0f}" for t in args.target_us))
+        print(f"批次成功判定一致率：queue vs bitmap(edges) {agreement(edges, rewards):.3f}，"
+              f"queue vs bitmap(buckets) {agreement(buckets, rewards):.3f}")
+        print(f"批次奖励相关系数：queue vs bitmap(edges) {correlation(edges, rewards):.3f}，"
+              f"queue vs bitmap(buckets) {correlation(buckets, rewards):.3f}")
+    factory.close()
+
+
+if __name__ == "__main__":
+    main()
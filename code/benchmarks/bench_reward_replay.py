@@ -0,0 +1,116 @@
+"""
+奖励模型离线回放：在记录的主CSV轨迹上比较 stationary / discounted / window 三种奖励模型
+
+两个指标：
+1. Brier 分数：按时间顺序，在每个批次结算前用变异器当前的后验均值预测"本批次是否发现新边"，
+   越小说明后验越能跟上变异器的真实产出（不受记录策略影响）
+2. 回放奖励（rejection sampling replay）：每个批次让变异器池按该奖励模型选择一次，
+   与记录的变异器一致时才计入奖励并更新，统计每个匹配批次的平均新边数。
+   记录策略不是均匀随机时该估计有偏，仅作参考
+
+在 code 目录下运行：
+python -m benchmarks.bench_reward_replay main.csv [main2.csv ...] [--discount 0.999] [--window 50]
+不提供CSV时使用合成的、变异器会逐渐饱和的轨迹（记录策略为均匀随机）
+"""
+import argparse
+import csv
+from collections import OrderedDict
+
+import numpy as np
+
+from ChiloMutatorFactory.ChiloMutator import ChiloMutatorPool
+
+
+def load_batches(csv_path):
+    """
+    从主CSV中还原变异器池批次：同一个 fuzz_count_seed_number 下、由变异器池选择（is_by_ramdom 为 True）的行为一个批次
+    :param csv_path: 主CSV路径（需要包含 new_edges 列）
+    :return: [((seed_id, mutator_id), 批次新边数), ...]
+    """
+    batches = OrderedDict()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get("is_by_ramdom") != "True" or row.get("new_edges") in (None, ""):
+                continue
+            batch = batches.setdefault(row["fuzz_count_seed_number"],
+                                       [(row["real_fuzz_seed_id"], row["real_mutator_id"]), 0])
+            batch[1] += int(row["new_edges"])
+    return [(key, edges) for key, edges in batches.values()]
+
+
+def synthetic_batches(num_mutators=300, num_batches=30000, seed=0):
+    """
+    合成轨迹：变异器陆续加入，每个变异器的成功率随自身被执行的次数指数衰减（饱和），记录策略为均匀随机
+    """
+    rng = np.random.default_rng(seed)
+    p0 = rng.uniform(0.05, 0.8, num_mutators)
+    half_life = rng.uniform(20, 200, num_mutators)
+    arrive = np.sort(rng.integers(0, num_batches // 2, num_mutators))
+    arrive[0] = 0
+    plays = np.zeros(num_mutators, dtype=np.int64)
+    batches = []
+    for step in range(num_batches):
+        available = np.searchsorted(arrive, step, side="right")
+        i = int(rng.integers(0, available))
+        success = rng.random() < p0[i] * 0.5 ** (plays[i] / half_life[i])
+        plays[i] += 1
+        batches.append(((i // 10, i), int(rng.poisson(3)) + 1 if success else 0))
+    return batches
+
+
+def evaluate(batches, **pool_kwargs):
+    """
+    :return: (Brier 分数, 匹配批次数, 每个匹配批次的平均新边数, 匹配批次成功率)
+    """
+    brier_pool = ChiloMutatorPool("", **pool_kwargs)
+    replay_pool = ChiloMutatorPool("", **pool_kwargs)
+    brier_index, replay_index = {}, {}
+    brier = 0.0
+    matched, matched_edges, matched_success = 0, 0, 0
+    for (seed_id, mutator_id), edges in batches:
+        success = edges > 0
+        if (seed_id, mutator_id) not in brier_index:
+            brier_index[(seed_id, mutator_id)] = brier_pool.add_mutator(seed_id, mutator_id)
+            replay_index[(seed_id, mutator_id)] = replay_pool.add_mutator(seed_id, mutator_id)
+
+        index = brier_index[(seed_id, mutator_id)]
+        alpha, beta, _ = brier_pool.posterior(index)
+        brier += (alpha / (alpha + beta) - success) ** 2
+        brier_pool.update_stats(index, success, edges)
+
+        chosen = replay_pool.thompson_select_mutator()[0]
+        replay_pool.total_select_count += 1
+        if chosen is not None and chosen.mutator_index == replay_index[(seed_id, mutator_id)]:
+            matched += 1
+            matched_edges += edges
+            matched_success += success
+            replay_pool.update_stats(chosen.mutator_index, success, edges)
+    return (brier / max(len(batches), 1), matched, matched_edges / max(matched, 1),
+            matched_success / max(matched, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="奖励模型离线回放")
+    parser.add_argument("csv_paths", nargs="*", help="主CSV路径，不提供时使用合成轨迹")
+    parser.add_argument("--discount", type=float, default=0.999, help="discounted 模式的衰减系数")
+    parser.add_argument("--window", type=int, default=50, help="window 模式的窗口大小")
+    args = parser.parse_args()
+
+    batches = []
+    for path in args.csv_paths:
+        batches.extend(load_batches(path))
+    if not args.csv_paths:
+        batches = synthetic_batches()
+    print(f"批次数：{len(batches)}，变异器数：{len(set(key for key, _ in batches))}")
+
+    models = [("stationary", {}),
+              (f"discounted({args.discount})", {"discount_factor": args.discount}),
+              (f"window({args.window})", {"window_size": args.window})]
+    print(f"{'model':>18} {'brier':>8} {'matched':>8} {'edges/batch':>12} {'success':>8}")
+    for name, kwargs in models:
+        brier, matched, edges, success = evaluate(batches, history_mode=name.split("(")[0], **kwargs)
+        print(f"{name:>18} {brier:>8.4f} {matched:>8} {edges:>12.3f} {success:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+汤普森采样选择延迟基准测试：比较逐个变异器循环打分（旧实现）、数组化批量打分（flat）
+与两级选择（hierarchical，每个种子 MUTATORS_PER_SEED 个变异器）的单次选择耗时
+
+在 code 目录下运行：python -m benchmarks.bench_thompson_select
+"""
+import math
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from ChiloMutatorFactory.ChiloMutator import ChiloMutatorPool
+
+POOL_SIZES = [1000, 10000, 100000]
+MUTATORS_PER_SEED = 20
+
+
+def legacy_select(mutator_list, total_select_count):
+    """旧实现：对每个变异器调用 random.betavariate 与 math.log"""
+    N = len(mutator_list)
+    avg_mask_count = sum(m.mask_count for m in mutator_list) / N
+    best, best_score = None, -1.0
+    for m in mutator_list:
+        sample_val = random.betavariate(m.alpha, m.beta)
+        Bi = math.log(total_select_count / N + 1) * math.log(
+            (m.total_new_edges + 1) / (m.success_count + m.failure_count + 1) + 1)
+        denominator_ci = avg_mask_count if avg_mask_count > 1e-9 else 1.0
+        Ci = math.log(m.mask_count * (1 - m.similarity) / denominator_ci + 1)
+        score = sample_val * (1 + Bi) * (1 + Ci)
+        if score > best_score:
+            best, best_score = m, score
+    return best, best_score
+
+
+def build(n, rng):
+    pool = ChiloMutatorPool("./")
+    legacy = []
+    for i in range(n):
+        mask, sim = int(rng.integers(1, 30)), float(rng.random())
+        pool.add_mutator(i // MUTATORS_PER_SEED, i, mask, sim)
+        su, fa, ne = int(rng.integers(0, 20)), int(rng.integers(0, 200)), int(rng.integers(0, 50))
+        for _ in range(su):
+            pool.update_stats(i, True, 0)
+        for _ in range(fa):
+            pool.update_stats(i, False, 0)
+        pool.update_stats(i, False, ne)
+        legacy.append(SimpleNamespace(alpha=1.0 + su, beta=2.0 + fa, success_count=su, failure_count=fa + 1,
+                                      total_new_edges=ne, mask_count=mask, similarity=sim))
+    pool.total_select_count = 10 * n
+    return pool, legacy
+
+
+def timed(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e3
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'mutators':>9} {'legacy(ms)':>11} {'flat(ms)':>9} {'hierarchical(ms)':>17}")
+    for n in POOL_SIZES:
+        pool, legacy = build(n, rng)
+        rounds = max(200000 // n, 3)
+        flat_ms = timed(pool.thompson_select_mutator, rounds)
+        pool.selection_mode = "hierarchical"
+        hierarchical_ms = timed(pool.thompson_select_mutator, rounds)
+        legacy_ms = timed(lambda: legacy_select(legacy, pool.total_select_count), max(rounds // 10, 3))
+        print(f"{n:>9} {legacy_ms:>11.3f} {flat_ms:>9.3f} {hierarchical_ms:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+本地 OpenAI 兼容的 LLM 桩服务器
+
+把各阶段配置中的 BASE_URL 指向 http://127.0.0.1:<端口>/v1，就能在没有网络、没有 API 费用的机器上跑完整个
+init() -> fuzz() 流程，测量解析器/生成器/修复器的吞吐。支持 POST /v1/chat/completions（含 stream=true 的 SSE）
+与 GET /v1/models。
+
+回复的来源：
+    指定 --trace 时按 llm_trace.TraceReplayer 从录制的 trace 中回放（按系统提示词回退，保证确定性；
+    回退时只选包含提示词所要求语言的代码块的回复）；
+    否则按提示词返回固定的回复：
+        变异器生成/修复（提示词要求 python 代码块）：一个只用标准库的 mutate()，把 CONSTANT 掩码替换为随机整数、
+        其余掩码还原为 ori 的值，并附加随机注释，保证通过修复器的掩码与随机性检查；
+        解析（提示词要求 annotate）：把输入 SQL 中的整数常量标注为 CONSTANT 掩码；
+        其余（结构化变异）：原样返回输入 SQL。
+用量按 4 个字符一个 token 估算。
+
+在 code 目录下运行：python llm_stub_server.py [--port 8000] [--trace trace.jsonl] [--latency 0.5]
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SQL_BLOCK = re.compile(r"```sql\s*\n(.*?)```", re.S)
+INTEGER_LITERAL = re.compile(r"(?<![\w.\[:])(-?\d+)(?![\w.])")
+
+MUTATOR_TEMPLATE = '''import random
+import re
+
+SQL_TEMPLATE = {template!r}
+MASK_PATTERN = re.compile(r"\\[(CONSTANT|OPERATOR|FUNCTION|KEYWORD|FRAME|CAST_TYPE), number:\\d+[^\\]]*?ori:([^\\]]*)\\]")
+
+
+def _replace(match):
+    if match.group(1) == "CONSTANT" and random.random() < 0.5:
+        return str(random.choice([0, -1, 1, 2147483647, -2147483648, random.randint(-10 ** 6, 10 ** 6)]))
+    return match.group(2)
+
+
+def mutate() -> str:
+    return MASK_PATTERN.sub(_replace, SQL_TEMPLATE) + f"\\n-- {{random.getrandbits(32)}}"
+'''
+
+
+def estimate_tokens(text):
+    """
+    :return: 按 4 个字符一个 token 估算的 token 数
+    """
+    return max(1, len(text) // 4)
+
+
+def requested_language(prompt):
+    """
+    按提示词推断需要的代码块语言：变异器生成/修复要求 python 代码块，其余阶段要求 sql 代码块
+    :param prompt: 用户提示词
+    :return: "python" 或 "sql"
+    """
+    return "python" if "```python" in prompt or "mutate()" in prompt else "sql"
+
+
+def canned_response(prompt):
+    """
+    没有 trace 时的固定回复
+    :param prompt: 用户提示词
+    :return: 回复内容
+    """
+    blocks = SQL_BLOCK.findall(prompt)
+    sql = blocks[-1].strip() if blocks else "SELECT 1;"
+    if requested_language(prompt) == "python":
+        return "```python\n" + MUTATOR_TEMPLATE.format(template=sql) + "```"
+    if "annotate" in prompt.lower():
+        counter = iter(range(1, 1 << 30))
+        sql = INTEGER_LITERAL.sub(
+            lambda m: f"[CONSTANT, number:{next(counter)}, type:integer, ori:{m.group(1)}]", sql)
+    return f"```sql\n{sql}\n```"
+
+
+class StubState:
+    """
+    桩服务器的配置与计数器，所有请求线程共享
+    """
+    def __init__(self, replayer=None, latency=0.0, tokens_per_second=0.0, model="chilo-stub"):
+        """
+        :param replayer: llm_trace.TraceReplayer，为 None 时使用固定回复
+        :param latency: 每个请求返回第一个字节前等待的秒数
+        :param tokens_per_second: 流式输出的速度，0 为不限速
+        :param model: /v1/models 返回的模型名
+        """
+        self.replayer = replayer
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.model = model
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.stream_count = 0
+
+    def respond(self, model, messages):
+        """
+        :return: (回复内容, 上传token, 补全token)
+        """
+        system_prompt = "".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        prompt = "".join(m.get("content", "") for m in messages if m.get("role") != "system")
+        result = None
+        if self.replayer is not None:
+            result = self.replayer.replay(None, model, system_prompt, prompt, requested_language(prompt))
+        if result is None:
+            content = canned_response(prompt)
+            result = (content, estimate_tokens(system_prompt + prompt), estimate_tokens(content))
+        return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ChiloLLMStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": state.model, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        state = self.server.state
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            model = request.get("model", state.model)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": {"message": "invalid request body"}})
+            return
+        content, up_token, down_token = state.respond(model, messages)
+        with state._lock:
+            state.request_count += 1
+            request_id = f"chatcmpl-stub-{state.request_count}"
+        if state.latency > 0:
+            time.sleep(state.latency)
+        usage = {"prompt_tokens": up_token, "completion_tokens": down_token,
+                 "total_tokens": up_token + down_token}
+        if not request.get("stream"):
+            self._send_json(200, {"id": request_id, "object": "chat.completion", "created": int(time.time()),
+                                  "model": model, "usage": usage,
+                                  "choices": [{"index": 0, "finish_reason": "stop",
+                                               "message": {"role": "assistant", "content": content}}]})
+            return
+        with state._lock:
+            state.stream_count += 1
+        self._stream(request_id, model, content, usage, request.get("stream_options", {}).get("include_usage"))
+
+    def _stream(self, request_id, model, content, usage, include_usage):
+        state = self.server.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(choices, extra=None):
+            chunk = {"id": request_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices}
+            if extra:
+                chunk.update(extra)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        piece_size = 16     # 约 4 个 token 一个分片
+        delay = piece_size / 4 / state.tokens_per_second if state.tokens_per_second > 0 else 0.0
+        try:
+            for start in range(0, len(content), piece_size):
+                send([{"index": 0, "delta": {"content": content[start:start + piece_size]}, "finish_reason": None}])
+                if delay > 0:
+                    time.sleep(delay)
+            send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                send([], {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # 客户端拿到完整代码块后提前断开
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):   # 客户端关闭连接池时断开的保活连接
+            super().handle_error(request, client_address)
+
+
+def start_server(host="127.0.0.1", port=8000, trace_file=None, latency=0.0, tokens_per_second=0.0):
+    """
+    在后台线程中启动桩服务器
+    :param host: 监听地址
+    :param port: 监听端口，0 为随机端口
+    :param trace_file: 回放用的 trace 文件，为 None 时使用固定回复
+    :param latency: 每个请求返回第一个字节前等待的秒数
+    :param tokens_per_second: 流式输出的速度，0 为不限速
+    :return: StubServer，server.server_address 为实际监听的地址，server.state 为 StubState
+    """
+    replayer = None
+    if trace_file:
+        from ChiloMutatorFactory import llm_trace
+        replayer = llm_trace.TraceReplayer(trace_file, latency_mode="none")
+    server = StubServer((host, port), StubHandler)
+    server.state = StubState(replayer, latency, tokens_per_second)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容的 LLM 桩服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--trace", default=None, help="录制模式写出的 trace 文件，指定时按 trace 回放")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求返回第一个字节前等待的秒数")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="流式输出的速度，0 为不限速")
+    args = parser.parse_args()
+    server = start_server(args.host, args.port, args.trace, args.latency, args.tokens_per_second)
+    host, port = server.server_address[:2]
+    print(f"LLM 桩服务器已启动：BASE_URL = http://{host}:{port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()